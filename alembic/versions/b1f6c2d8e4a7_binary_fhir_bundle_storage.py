@@ -0,0 +1,39 @@
+"""binary_fhir_bundle_storage
+
+Revision ID: b1f6c2d8e4a7
+Revises: b7d2e4f1a9c3
+Create Date: 2026-10-17 13:40:02.118734
+
+Existing rows keep their legacy bytes (the base64 text, now as bytea) and stay
+readable; run `python -m src.db.maintenance reencode-bundles` to compress them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1f6c2d8e4a7'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e4f1a9c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('jobs', 'fhir_bundle_input',
+               existing_type=sa.Text(),
+               type_=sa.LargeBinary(),
+               existing_nullable=False,
+               postgresql_using="convert_to(fhir_bundle_input, 'UTF8')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Only legacy-format rows survive this; re-encode with `reencode-bundles --legacy` first
+    op.alter_column('jobs', 'fhir_bundle_input',
+               existing_type=sa.LargeBinary(),
+               type_=sa.Text(),
+               existing_nullable=False,
+               postgresql_using="convert_from(fhir_bundle_input, 'UTF8')")
@@ -0,0 +1,99 @@
+"""partition_jobs_and_audit_logs
+
+Revision ID: c4e8a1d5f2b6
+Revises: b1f6c2d8e4a7
+Create Date: 2026-10-17 16:05:47.530912
+
+jobs (by created_at) and audit_logs (by timestamp) become monthly range-partitioned
+tables. Existing rows are not copied: the old table is attached as the {table}_legacy
+partition, covering everything before next month. Attaching scans it once to check
+the bound, so run this in a quiet window on big tables.
+
+Partitioned tables can't have a unique key without the partition column, so the primary
+keys become (id, created_at) / (id, timestamp), and nothing can reference jobs.id
+anymore: the audit_logs and webhook_deliveries foreign keys are dropped.
+
+Afterwards, run `python -m src.db.maintenance partitions` daily to keep future months
+created and expire old ones.
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d5f2b6'
+down_revision: Union[str, Sequence[str], None] = 'b1f6c2d8e4a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> (partition column, secondary indexes)
+TABLES = {
+    'jobs': ('created_at', {'ix_jobs_client_id': 'client_id', 'ix_jobs_status': 'status'}),
+    'audit_logs': ('timestamp', {'ix_audit_logs_event_type': 'event_type'}),
+}
+MONTHS_AHEAD = 3
+
+def _month(year: int, month: int) -> datetime.datetime:
+    return datetime.datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('audit_logs_job_id_fkey', 'audit_logs', type_='foreignkey')
+    op.drop_constraint('webhook_deliveries_job_id_fkey', 'webhook_deliveries', type_='foreignkey')
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    boundary = _month(now.year, now.month + 1)
+
+    for table, (column, indexes) in TABLES.items():
+        # 1. Move the heap table (and its index names) out of the way
+        op.rename_table(table, f'{table}_legacy')
+        op.execute(f'ALTER TABLE {table}_legacy RENAME CONSTRAINT {table}_pkey TO {table}_legacy_pkey')
+        for index in indexes:
+            op.execute(f'ALTER INDEX {index} RENAME TO {index}_legacy')
+
+        # 2. Same columns and defaults, partitioned
+        op.execute(f'CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS) PARTITION BY RANGE ("{column}")')
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, "{column}")')
+        for index, indexed_column in indexes.items():
+            op.create_index(index, table, [indexed_column], unique=False)
+
+        # 3. History becomes one partition, new rows go to monthly ones
+        op.execute(
+            f"ALTER TABLE {table} ATTACH PARTITION {table}_legacy "
+            f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+        )
+        for offset in range(MONTHS_AHEAD):
+            start = _month(boundary.year, boundary.month + offset)
+            end = _month(start.year, start.month + 1)
+            op.execute(
+                f"CREATE TABLE {table}_y{start.year}m{start.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Copies every live row back into plain tables (detached/archived partitions are not included)
+    for table, (column, indexes) in TABLES.items():
+        op.execute(f'CREATE TABLE {table}_unpartitioned (LIKE {table} INCLUDING DEFAULTS)')
+        op.execute(f'INSERT INTO {table}_unpartitioned SELECT * FROM {table}')
+        op.drop_table(table)
+        op.rename_table(f'{table}_unpartitioned', table)
+        op.create_primary_key(f'{table}_pkey', table, ['id'])
+        for index, indexed_column in indexes.items():
+            op.create_index(index, table, [indexed_column], unique=False)
+
+    # NOT VALID: rows of jobs removed by retention would otherwise block the downgrade
+    op.execute(
+        'ALTER TABLE audit_logs ADD CONSTRAINT audit_logs_job_id_fkey '
+        'FOREIGN KEY (job_id) REFERENCES jobs (id) NOT VALID'
+    )
+    op.execute(
+        'ALTER TABLE webhook_deliveries ADD CONSTRAINT webhook_deliveries_job_id_fkey '
+        'FOREIGN KEY (job_id) REFERENCES jobs (id) NOT VALID'
+    )
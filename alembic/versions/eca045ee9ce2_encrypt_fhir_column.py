@@ -10,7 +10,6 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 from sqlalchemy.dialects import postgresql
-import src.db.types
 
 # revision identifiers, used by Alembic.
 revision: str = 'eca045ee9ce2'
@@ -24,7 +23,8 @@ def upgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
     op.alter_column('jobs', 'fhir_bundle_input',
                existing_type=postgresql.JSONB(astext_type=sa.Text()),
-               type_=src.db.types.EncryptedJSON(),
+               # EncryptedJSON stored base64 text at this revision (binary since b1f6c2d8e4a7)
+               type_=sa.Text(),
                existing_nullable=False)
     # ### end Alembic commands ###
 
@@ -33,7 +33,7 @@ def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
     op.alter_column('jobs', 'fhir_bundle_input',
-               existing_type=src.db.types.EncryptedJSON(),
+               existing_type=sa.Text(),
                type_=postgresql.JSONB(astext_type=sa.Text()),
                existing_nullable=False)
     # ### end Alembic commands ###
@@ -0,0 +1,39 @@
+"""
+EncryptedJSON storage: bytes on disk and encode/decode time per bundle size,
+legacy (JSON -> Fernet -> base64 text) vs the compressed binary format.
+
+Usage:
+    python -m benchmarks.bench_bundle_storage
+"""
+import json
+import timeit
+
+from benchmarks.bench_gap_analysis import build_bundle
+from src.core.security import DataEncryption
+from src.db.types import CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD, decode_bundle, encode_bundle, zstandard
+
+def legacy_encode(bundle: dict) -> bytes:
+    return DataEncryption.encrypt(json.dumps(bundle)).encode("ascii")
+
+def bench(n_entries: int, repeat: int = 5):
+    bundle = build_bundle(n_entries)
+    number = max(1, 2000 // n_entries)
+    json_bytes = len(json.dumps(bundle))
+
+    formats = [("legacy", legacy_encode), ("raw", lambda b: encode_bundle(b, CODEC_NONE)), ("zlib", lambda b: encode_bundle(b, CODEC_ZLIB))]
+    if zstandard is not None:
+        formats.append(("zstd", lambda b: encode_bundle(b, CODEC_ZSTD)))
+
+    for name, encode in formats:
+        stored = encode(bundle)
+        encode_s = min(timeit.Timer(lambda: encode(bundle)).repeat(repeat=repeat, number=number)) / number
+        decode_s = min(timeit.Timer(lambda: decode_bundle(stored)).repeat(repeat=repeat, number=number)) / number
+        print(
+            f"{n_entries:>6} | {name:>6} | {json_bytes:>10} | {len(stored):>10} | "
+            f"{len(stored) / json_bytes:>5.2f}x | {encode_s * 1000:>9.3f} | {decode_s * 1000:>9.3f}"
+        )
+
+if __name__ == "__main__":
+    print(f"{'entries':>6} | {'format':>6} | {'json B':>10} | {'stored B':>10} | {'ratio':>6} | {'encode ms':>9} | {'decode ms':>9}")
+    for size in (10, 100, 1000, 10000):
+        bench(size)
@@ -0,0 +1,57 @@
+"""
+Accept-path latency of POST /v1/diagnose against a running stack
+(API + Postgres + Redis, e.g. `docker-compose up`). Compare two builds by
+running it against each one.
+
+Usage:
+    python -m benchmarks.bench_diagnose_endpoint [--url http://localhost:8000] [--requests 500] [--concurrency 10] [--entries 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.bench_gap_analysis import build_bundle
+
+async def run(url: str, total: int, concurrency: int, warmup: int, entries: int):
+    # Contains the sepsis model's mandatory LOINC codes, so every request is accepted
+    payload = {"client_id": "bench", "target_diagnosis": "sepsis", "fhir_bundle": build_bundle(entries)}
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(total + warmup))
+
+    async with httpx.AsyncClient(base_url=url, timeout=30.0) as client:
+        async def one_client():
+            nonlocal errors
+            for i in remaining:
+                start_time = time.perf_counter()
+                response = await client.post("/v1/diagnose", json=payload)
+                elapsed = time.perf_counter() - start_time
+                if response.status_code != 202:
+                    errors += 1
+                elif i >= warmup:
+                    latencies.append(elapsed)
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one_client() for _ in range(concurrency)))
+        wall_s = time.perf_counter() - wall_start
+
+    if not latencies:
+        print(f"No successful requests ({errors} errors)")
+        return
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    print(f"requests: {len(latencies)}  errors: {errors}  concurrency: {concurrency}  throughput: {len(latencies) / wall_s:.0f} req/s")
+    print(f"p50: {pct(50):.2f} ms  p95: {pct(95):.2f} ms  p99: {pct(99):.2f} ms  mean: {statistics.mean(latencies) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--entries", type=int, default=20, help="FHIR bundle size")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency, args.warmup, args.entries))
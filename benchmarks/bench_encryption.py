@@ -0,0 +1,35 @@
+"""
+DataEncryption: legacy Fernet (AES-128-CBC + HMAC, base64) vs the AES-256-GCM key ring.
+Throughput and per-row overhead (stored bytes - plaintext bytes) per payload size.
+
+Usage:
+    python -m benchmarks.bench_encryption
+"""
+import os
+import timeit
+
+from src.core.security import DataEncryption
+
+def bench(size: int, repeat: int = 5):
+    data = os.urandom(size)
+    number = max(1, 20_000_000 // (size * 50))
+    fernet = DataEncryption.get_cipher()
+    fernet_token = fernet.encrypt(data)
+    envelope = DataEncryption.encrypt_bytes(data)
+
+    cases = [
+        ("fernet", lambda: fernet.encrypt(data), lambda: fernet.decrypt(fernet_token), len(fernet_token)),
+        ("aesgcm", lambda: DataEncryption.encrypt_bytes(data), lambda: DataEncryption.decrypt_bytes(envelope), len(envelope)),
+    ]
+    for name, encrypt, decrypt, stored in cases:
+        encrypt_s = min(timeit.Timer(encrypt).repeat(repeat=repeat, number=number)) / number
+        decrypt_s = min(timeit.Timer(decrypt).repeat(repeat=repeat, number=number)) / number
+        print(
+            f"{size:>9} | {name:>6} | {stored - size:>10} | "
+            f"{size / encrypt_s / 1e6:>12.1f} | {size / decrypt_s / 1e6:>12.1f}"
+        )
+
+if __name__ == "__main__":
+    print(f"{'bytes':>9} | {'cipher':>6} | {'overhead B':>10} | {'enc MB/s':>12} | {'dec MB/s':>12}")
+    for size in (1_024, 65_536, 1_048_576, 8_388_608):
+        bench(size)
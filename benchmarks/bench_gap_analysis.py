@@ -0,0 +1,69 @@
+"""
+Gap analysis: strict fhir.resources parsing vs the raw-dict fast path.
+
+Usage:
+    python -m benchmarks.bench_gap_analysis
+"""
+import timeit
+
+from src.schemas.manifest import ModelManifest, LOINCRequirement
+from src.services.decision_engine import DecisionEngine
+
+MANIFEST = ModelManifest(
+    target_diagnosis="sepsis",
+    minimum_accuracy=0.95,
+    required_observations=[
+        LOINCRequirement(code="8310-5", display="Body Temp", mandatory=True),
+        LOINCRequirement(code="8867-4", display="Heart Rate", mandatory=True),
+        LOINCRequirement(code="6690-2", display="WBC", mandatory=True),
+    ]
+)
+
+LOINC_CODES = ["8310-5", "8867-4", "6690-2", "2160-0", "718-7"]
+
+def build_bundle(n_entries: int) -> dict:
+    """
+    A realistic mix: mostly Observations, plus Patient/Encounter/MedicationRequest noise.
+    """
+    entries = [{"resource": {"resourceType": "Patient", "id": "pat-1", "gender": "female", "birthDate": "1970-01-01"}}]
+    for i in range(1, n_entries):
+        if i % 5 == 0:
+            entries.append({"resource": {
+                "resourceType": "Encounter", "id": f"enc-{i}", "status": "finished",
+                "class": [{"coding": [{"system": "http://terminology.hl7.org/CodeSystem/v3-ActCode", "code": "EMER"}]}],
+                "subject": {"reference": "Patient/pat-1"}
+            }})
+        elif i % 7 == 0:
+            entries.append({"resource": {
+                "resourceType": "MedicationRequest", "id": f"med-{i}", "status": "active", "intent": "order",
+                "subject": {"reference": "Patient/pat-1"},
+                "medication": {"concept": {"coding": [{"system": "http://www.nlm.nih.gov/research/umls/rxnorm", "code": "1049502"}]}}
+            }})
+        else:
+            entries.append({"resource": {
+                "resourceType": "Observation", "id": f"obs-{i}", "status": "final",
+                "code": {"coding": [{"system": "http://loinc.org", "code": LOINC_CODES[i % len(LOINC_CODES)]}]},
+                "subject": {"reference": "Patient/pat-1"},
+                "valueQuantity": {"value": 37.5, "unit": "C"}
+            }})
+    return {"resourceType": "Bundle", "type": "collection", "entry": entries}
+
+def bench(n_entries: int, repeat: int = 5):
+    bundle = build_bundle(n_entries)
+    number = max(1, 2000 // n_entries)
+
+    def per_call(strict: bool) -> float:
+        timer = timeit.Timer(lambda: DecisionEngine.analyze_gap(bundle, MANIFEST, strict=strict))
+        return min(timer.repeat(repeat=repeat, number=number)) / number
+
+    strict_s, fast_s = per_call(True), per_call(False)
+    print(f"{n_entries:>6} | {strict_s * 1000:>10.3f} | {fast_s * 1000:>8.3f} | {strict_s / fast_s:>7.0f}x")
+
+if __name__ == "__main__":
+    import structlog
+    import logging
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    print(f"{'entries':>6} | {'strict ms':>10} | {'fast ms':>8} | speedup")
+    for size in (10, 100, 1000):
+        bench(size)
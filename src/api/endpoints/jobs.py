@@ -1,91 +1,209 @@
+import asyncio
+import json
+import time
 import uuid
 import structlog
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
 
-from src.db.session import get_db
-from src.db.models import Job, DiagnosticModel
-from src.schemas.job import JobCreateRequest, JobResponse, JobStatusResponse
-from src.services.queue import enqueue_job
-from src.services.decision_engine import DecisionEngine
-from src.schemas.manifest import ModelManifest, LOINCRequirement
-from src.services.audit import record_audit_event
+from src.db.session import AsyncSessionLocal, get_db
+from src.db.models import Job
+from src.schemas.job import (
+    BatchItemResult,
+    BatchJobCreateRequest,
+    BatchJobResponse,
+    JobCreateRequest,
+    JobResponse,
+    JobStatusResponse,
+)
+from src.schemas.manifest import LOINCRequirement
+from src.services.queue import enqueue_job, enqueue_jobs
+from src.services.executor import run_fhir_validation, run_gap_analysis
+from src.services.audit import emit_audit_event
+from src.services.idempotency import (
+    IdempotencyConflict,
+    IdempotencyInProgress,
+    claim_idempotency_key,
+    complete_idempotency_key,
+    release_idempotency_key,
+    request_fingerprint,
+)
+from src.services.outbox import add_webhook_delivery
+from src.services.result_cache import cache_key, get_cached_result
+from src.services.registry import model_registry, ManifestError
+from src.services.job_status import (
+    TERMINAL_STATUSES,
+    fill_job_status_cache,
+    get_cached_job_status,
+    job_status_hub,
+    publish_job_status,
+    queue_status_writes,
+    status_event,
+)
+from src.core.config import settings
 
 router = APIRouter()
 logger = structlog.get_logger()
 
-@router.post("/diagnose", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
-async def request_diagnosis(
-    payload: JobCreateRequest,
-    db: AsyncSession = Depends(get_db)
-):
-    logger.info("diagnosis_request_received", client_id=payload.client_id, target=payload.target_diagnosis)
+def check_lane_allowed(payload: JobCreateRequest):
+    """
+    Raises 403 if this client may not submit to the requested lane (QUEUE_RESTRICTED_LANES).
+    """
+    allowed = settings.QUEUE_RESTRICTED_LANES.get(payload.priority)
+    if allowed is not None and payload.client_id not in allowed:
+        logger.warning("queue_lane_denied", client_id=payload.client_id, lane=payload.priority)
+        raise HTTPException(
+            status_code=403,
+            detail=f"Client '{payload.client_id}' may not submit to the '{payload.priority}' lane."
+        )
 
-    # 1. Select Manifest (Dynamic DB Lookup)
-    # We look for the model with the highest accuracy for this target
-    stmt = (
-        select(DiagnosticModel)
-        .where(DiagnosticModel.key == payload.target_diagnosis)
-        .order_by(DiagnosticModel.accuracy.desc())
-    )
-    result = await db.execute(stmt)
-    model_record = result.scalars().first()
+async def find_missing_requirements(db: AsyncSession, payload: JobCreateRequest) -> List[LOINCRequirement]:
+    """
+    Manifest lookup + gap analysis for one request.
+    Returns the missing mandatory requirements (empty = ready to run).
+    Raises HTTPException for unknown models, corrupt manifests and invalid bundles.
+    """
+    # 1. Select Manifest (cached registry lookup, highest accuracy model for this target)
+    try:
+        target_manifest = await model_registry.get_manifest(db, payload.target_diagnosis)
+    except ManifestError:
+        raise HTTPException(status_code=500, detail="Internal Registry Error: Model Manifest is corrupt.")
 
-    if not model_record:
+    if target_manifest is None:
         logger.warning("unknown_model_requested", target=payload.target_diagnosis)
         raise HTTPException(
             status_code=400, 
             detail=f"Unknown target diagnosis '{payload.target_diagnosis}'. No models registered."
         )
 
-    # Convert DB JSONB to Pydantic Manifest
-    # We construct the Manifest object dynamically
-    try:
-        reqs = [LOINCRequirement(**req) for req in model_record.required_fhir_resources.get("required_observations", [])]
-        
-        target_manifest = ModelManifest(
-            target_diagnosis=model_record.key,
-            minimum_accuracy=model_record.accuracy,
-            required_observations=reqs
-        )
-    except Exception as e:
-        logger.error("corrupt_model_manifest", model_id=str(model_record.id), error=str(e))
-        raise HTTPException(status_code=500, detail="Internal Registry Error: Model Manifest is corrupt.")
-        
     # 2. Run Decision Engine (Gap Analysis)
     try:
-        is_ready, missing_reqs = DecisionEngine.analyze_gap(payload.fhir_bundle, target_manifest)
+        is_ready, missing_reqs = await run_gap_analysis(payload.fhir_bundle, target_manifest)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid FHIR Bundle format")
     except Exception as e:
         logger.error("decision_engine_error", error=str(e))
         raise HTTPException(status_code=500, detail="Internal Decision Engine Error")
 
+    return [] if is_ready else missing_reqs
+
+async def record_negotiation(payload: JobCreateRequest, missing_reqs: List[LOINCRequirement]):
+    """
+    Audit record explaining WHY a request was rejected.
+    Buffered: the rejection doesn't wait on (or share a transaction with) the audit insert.
+    """
+    await emit_audit_event(
+        event_type="DECISION_NEGOTIATION_REQUIRED",
+        details={
+            "client_id": payload.client_id,
+            "target": payload.target_diagnosis,
+            "missing_codes": [req.code for req in missing_reqs],
+            "missing_display": [req.display for req in missing_reqs]
+        }
+    )
+
+async def find_cached_result(db: AsyncSession, payload: JobCreateRequest) -> dict | None:
+    """
+    Result cache lookup for an accepted request (None = run the model).
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    manifest = await model_registry.get_manifest(db, payload.target_diagnosis)
+    cached_result = await get_cached_result(cache_key(manifest, payload.fhir_bundle), "api")
+    if cached_result is not None and not settings.FHIR_STRICT_VALIDATION:
+        # The worker would fail an invalid bundle; pay the full validation here, but only on hits
+        try:
+            await run_fhir_validation(payload.fhir_bundle)
+        except Exception:
+            return None
+    return cached_result
+
+async def complete_from_cache(db: AsyncSession, payload: JobCreateRequest, result: dict) -> JobResponse:
+    """
+    Records the job as already COMPLETED (plus its webhook) and skips the queue entirely.
+    """
+    job_id = uuid.uuid4()
+    new_job = Job(
+        id=job_id,
+        client_id=payload.client_id,
+        target_model_key=payload.target_diagnosis,
+        fhir_bundle_input=payload.fhir_bundle,
+        webhook_url=payload.webhook_url,
+        status="COMPLETED",
+        result_payload=result
+    )
+    db.add(new_job)
+    add_webhook_delivery(db, job_id, payload.webhook_url, "COMPLETED", result)
+    await db.commit()
+    await publish_job_status(str(job_id), "COMPLETED", result, new_job.created_at)
+    logger.info("diagnosis_served_from_cache", job_id=str(job_id))
+
+    return JobResponse(
+        job_id=job_id,
+        status="COMPLETED",
+        created_at=new_job.created_at,
+        eta_seconds=0
+    )
+
+@router.post("/diagnose", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def request_diagnosis(
+    payload: JobCreateRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=255)
+):
+    logger.info("diagnosis_request_received", client_id=payload.client_id, target=payload.target_diagnosis)
+
+    if not idempotency_key:
+        return await create_diagnosis_job(db, payload)
+
+    # Retries with the same key (per client) get the original answer: no second
+    # validation, INSERT or enqueue. A concurrent duplicate waits for the first one.
+    try:
+        claim = await claim_idempotency_key(
+            payload.client_id, idempotency_key, request_fingerprint(payload.model_dump(mode="json"))
+        )
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request body.")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress.")
+
+    if claim.response is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return JobResponse(**claim.response)
+
+    try:
+        job_response = await create_diagnosis_job(db, payload)
+    except BaseException:
+        # Rejected or crashed: nothing to replay, the client may retry with the same key
+        await release_idempotency_key(claim)
+        raise
+    try:
+        await complete_idempotency_key(claim, job_response.model_dump(mode="json"))
+    except Exception as e:
+        # The job exists and is queued: answer 202 regardless. A retry may still
+        # see the pending marker (409) until it expires.
+        logger.warning("idempotency_complete_failed", job_id=str(job_response.job_id), error=str(e))
+    return job_response
+
+async def create_diagnosis_job(db: AsyncSession, payload: JobCreateRequest) -> JobResponse:
+    """
+    The work behind /diagnose: validate, negotiate, then serve from cache or queue a job.
+    """
+    check_lane_allowed(payload)
+
+    # 1 + 2. Manifest lookup & Gap Analysis
+    missing_reqs = await find_missing_requirements(db, payload)
+
     # 3. Handle Negotiation (The "Red Light")
-    if not is_ready:
+    if missing_reqs:
         logger.info("negotiation_required", missing_count=len(missing_reqs))
 
-        # Record WHY we are rejecting this request
-        try:
-            await record_audit_event(
-                db,
-                event_type="DECISION_NEGOTIATION_REQUIRED",
-                details={
-                    "client_id": payload.client_id,
-                    "target": payload.target_diagnosis,
-                    "missing_codes": [req.code for req in missing_reqs],
-                    "missing_display": [req.display for req in missing_reqs]
-                }
-            )
-            await db.commit()
-        except Exception as audit_err:
-            # Log the actual DB error
-            logger.error("audit_commit_failed", error=str(audit_err))
-
-            # We don't stop the flow, but we might want to rollback the transaction 
-            # to clean up the failed insert attempt before raising the HTTP 409
-            await db.rollback()
+        # Record WHY we are rejecting this request (buffered; never fails the request)
+        await record_negotiation(payload, missing_reqs)
         
         # We return 400 Bad Request because the client FAILED to provide required data.
         # In a chat flow, the bot reads this error and asks the user.
@@ -98,7 +216,12 @@ async def request_diagnosis(
         # Ideally, we might want a custom 422 or 200-OK-with-Action, but 400 is semantically correct here.
         raise HTTPException(status_code=409, detail=return_msg) # 409 Conflict is often used for "State of resource incompatible"
 
-    # 4. Create Job (The "Green Light")
+    # 4. Same model-relevant data answered recently? Then no VM run is needed.
+    cached_result = await find_cached_result(db, payload)
+    if cached_result is not None:
+        return await complete_from_cache(db, payload, cached_result)
+
+    # 5. Create Job (The "Green Light")
     new_job = Job(
         client_id=payload.client_id,
         target_model_key=payload.target_diagnosis,
@@ -107,12 +230,19 @@ async def request_diagnosis(
         status="QUEUED"
     )
     
+    # One round trip: INSERT ... RETURNING created_at (eager_defaults), no refresh()
     db.add(new_job)
     await db.commit()
-    await db.refresh(new_job)
 
-    # 5. Enqueue
-    await enqueue_job(str(new_job.id), payload.model_dump())
+    # 6. Enqueue + seed the status cache in one MULTI. QUEUED is written first,
+    # so it can't overwrite a fast worker's PROCESSING.
+    # The enqueue stays before the response: a job we answered 202 for must be in Redis.
+    queued = [status_event(str(new_job.id), "QUEUED", created_at=new_job.created_at)]
+    await enqueue_job(
+        str(new_job.id),
+        {"client_id": payload.client_id, "priority": payload.priority, "target_model_key": payload.target_diagnosis},
+        prepare=lambda pipe: queue_status_writes(pipe, queued)
+    )
 
     return JobResponse(
         job_id=new_job.id,
@@ -120,24 +250,185 @@ async def request_diagnosis(
         created_at=new_job.created_at
     )
 
+@router.post("/diagnose/batch", response_model=BatchJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def request_diagnosis_batch(
+    payload: BatchJobCreateRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk version of /diagnose. Every item is judged on its own; the accepted ones
+    are inserted with ONE multi-row INSERT ... RETURNING and enqueued with ONE Redis call.
+    """
+    logger.info("batch_diagnosis_request_received", items=len(payload.items))
+
+    results: List[BatchItemResult | None] = [None] * len(payload.items)
+    accepted_rows = []
+
+    # 1. Gap analysis per item
+    for index, item in enumerate(payload.items):
+        try:
+            check_lane_allowed(item)
+            missing_reqs = await find_missing_requirements(db, item)
+        except HTTPException as e:
+            results[index] = BatchItemResult(index=index, status="REJECTED", error=str(e.detail))
+            continue
+
+        if missing_reqs:
+            await record_negotiation(item, missing_reqs)
+            results[index] = BatchItemResult(
+                index=index,
+                status="NEGOTIATION_REQUIRED",
+                missing_data=[req.model_dump() for req in missing_reqs]
+            )
+            continue
+
+        accepted_rows.append((index, {
+            "id": uuid.uuid4(),
+            "client_id": item.client_id,
+            "target_model_key": item.target_diagnosis,
+            "fhir_bundle_input": item.fhir_bundle,
+            "webhook_url": item.webhook_url,
+            "status": "QUEUED"
+        }))
+
+    # 2. One INSERT for all accepted jobs
+    created_at_by_id = {}
+    if accepted_rows:
+        stmt = (
+            insert(Job)
+            .values([row for _, row in accepted_rows])
+            .returning(Job.id, Job.created_at)
+        )
+        inserted = await db.execute(stmt)
+        created_at_by_id = {job_id: created_at for job_id, created_at in inserted.all()}
+    await db.commit()
+
+    # 3. One Redis call for all of them (status cache seeded in the same MULTI)
+    if accepted_rows:
+        queued = [
+            status_event(str(row["id"]), "QUEUED", created_at=created_at_by_id[row["id"]])
+            for _, row in accepted_rows
+        ]
+        await enqueue_jobs(
+            [
+                (str(row["id"]), {
+                    "client_id": row["client_id"],
+                    "priority": payload.items[index].priority,
+                    "target_model_key": row["target_model_key"]
+                })
+                for index, row in accepted_rows
+            ],
+            prepare=lambda pipe: queue_status_writes(pipe, queued)
+        )
+
+    for index, row in accepted_rows:
+        results[index] = BatchItemResult(
+            index=index,
+            status="QUEUED",
+            job_id=row["id"],
+            created_at=created_at_by_id[row["id"]]
+        )
+
+    logger.info("batch_diagnosis_request_done", accepted=len(accepted_rows), rejected=len(results) - len(accepted_rows))
+    return BatchJobResponse(
+        accepted=len(accepted_rows),
+        rejected=len(results) - len(accepted_rows),
+        results=results
+    )
+
 @router.get("/jobs/{job_id}", response_model=JobStatusResponse)
 async def get_job_status(
     job_id: uuid.UUID,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Polling Endpoint.
+    Polling Endpoint. Served from the Redis status cache; Postgres only on a miss.
     """
-    result = await db.execute(select(Job).where(Job.id == job_id))
-    job = result.scalars().first()
+    cached = await get_cached_job_status(str(job_id))
+    if cached:
+        return JobStatusResponse(
+            job_id=job_id,
+            status=cached["status"],
+            result=cached["result"],
+            created_at=cached["created_at"],
+            updated_at=cached["timestamp"]
+        )
+
+    # Only the columns we return; never the (encrypted) FHIR bundle
+    result = await db.execute(
+        select(Job.id, Job.status, Job.result_payload, Job.created_at, Job.updated_at).where(Job.id == job_id)
+    )
+    job = result.first()
 
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
+    await fill_job_status_cache(
+        status_event(str(job.id), job.status, job.result_payload, job.updated_at, job.created_at)
+    )
+
     return JobStatusResponse(
         job_id=job.id,
         status=job.status,
         result=job.result_payload,
         created_at=job.created_at,
         updated_at=job.updated_at
-    )
\ No newline at end of file
+    )
+
+def format_sse(event: dict) -> str:
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_status(job_id: uuid.UUID):
+    """
+    Server-Sent Events alternative to polling: one status read on connect (cache,
+    then Postgres), then the worker's status transitions are pushed until the job finishes.
+    The stream closes after JOB_EVENTS_MAX_STREAM_SECONDS; clients just reconnect.
+    """
+    # 1. Subscribe BEFORE reading, so a transition between the two can't be missed
+    events = job_status_hub.subscribe(str(job_id))
+    try:
+        current = await get_cached_job_status(str(job_id))
+        if current is None:
+            # Own short session instead of Depends(get_db): a dependency would keep its
+            # pooled connection checked out until the stream ends
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(Job.status, Job.result_payload, Job.created_at, Job.updated_at).where(Job.id == job_id)
+                )
+                row = result.first()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+            current = status_event(str(job_id), row.status, row.result_payload, row.updated_at, row.created_at)
+    except Exception:
+        job_status_hub.unsubscribe(str(job_id), events)
+        raise
+
+    async def event_stream():
+        try:
+            # 2. Current state from the DB
+            yield format_sse(current)
+            if current["status"] in TERMINAL_STATUSES:
+                return
+
+            # 3. Pushed transitions (plus comment keepalives so proxies don't cut us off)
+            deadline = time.monotonic() + settings.JOB_EVENTS_MAX_STREAM_SECONDS
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    event = await asyncio.wait_for(
+                        events.get(), timeout=min(remaining, settings.JOB_EVENTS_KEEPALIVE_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+                if event["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            job_status_hub.unsubscribe(str(job_id), events)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
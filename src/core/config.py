@@ -8,9 +8,42 @@ class Settings(BaseSettings):
     ENVIRONMENT: Literal["development", "production", "testing"] = "development"
     DEBUG: bool = False
     API_V1_STR: str = "/v1"
+    # Max items accepted by POST /v1/diagnose/batch
+    BATCH_MAX_ITEMS: int = 1000
 
     # Security
     WEBHOOK_SECRET: str = "mvp-secret-key-change-in-prod"
+    # Data-at-rest key ring: key id -> urlsafe base64 of 32 random bytes. New data uses the active key;
+    # key "0" (derived from WEBHOOK_SECRET) is the default and always readable.
+    ENCRYPTION_KEYS: dict[str, str] = {}
+    ENCRYPTION_ACTIVE_KEY_ID: str = ""
+
+    # Bundle Storage (EncryptedJSON): compression runs before encryption
+    BUNDLE_COMPRESSION: Literal["zstd", "zlib", "none"] = "zstd" # zstd falls back to zlib if not installed
+    BUNDLE_COMPRESSION_LEVEL: int = 3
+    BUNDLE_REENCODE_BATCH_SIZE: int = 500
+
+    # Webhook Delivery (one pooled HTTP client per worker process)
+    WEBHOOK_TIMEOUT_SECONDS: float = 5.0
+    WEBHOOK_HTTP2: bool = True
+    WEBHOOK_MAX_CONNECTIONS: int = 100
+    WEBHOOK_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    WEBHOOK_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    # Concurrent deliveries per destination host; override per host in WEBHOOK_HOST_LIMITS
+    WEBHOOK_MAX_CONNECTIONS_PER_HOST: int = 10
+    WEBHOOK_HOST_LIMITS: dict[str, int] = {}
+
+    # Webhook Outbox (dispatcher runs inside each worker)
+    WEBHOOK_DISPATCH_INTERVAL_SECONDS: float = 1.0
+    WEBHOOK_DISPATCH_BATCH: int = 50
+    # Claimed rows are invisible to other dispatchers this long; must outlast one batch's deliveries
+    WEBHOOK_DISPATCH_LEASE_SECONDS: float = 120.0
+    WEBHOOK_MAX_ATTEMPTS: int = 8
+    WEBHOOK_RETRY_BASE_SECONDS: float = 2.0
+    WEBHOOK_RETRY_MAX_SECONDS: float = 600.0
+    # Consecutive failures before an endpoint's circuit opens, and how long it stays open
+    WEBHOOK_BREAKER_FAILURE_THRESHOLD: int = 5
+    WEBHOOK_BREAKER_RESET_SECONDS: float = 60.0
 
     # Virtualization (Firecracker)
     # Toggle this to True ONLY on a KVM-enabled Linux Host
@@ -20,6 +53,31 @@ class Settings(BaseSettings):
     FC_BINARY_PATH: str = "/usr/bin/firecracker"
     FC_KERNEL_PATH: str = "/var/lib/clinisandbox/vmlinux.bin"
     FC_ROOTFS_PATH: str = "/var/lib/clinisandbox/rootfs.ext4"
+    # Scratch space for per-VM API and vsock sockets
+    FC_WORK_DIR: str = "/tmp/firecracker"
+    # Data plane: the guest agent listens on FC_VSOCK_PORT; one length-prefixed JSON
+    # frame in, one out. A job fails if the guest hasn't answered within the timeout.
+    FC_VSOCK_GUEST_CID: int = 3
+    FC_VSOCK_PORT: int = 5005
+    FC_VSOCK_TIMEOUT_SECONDS: float = 30.0
+    FC_VSOCK_MAX_FRAME_BYTES: int = 16 * 1024 * 1024
+    FC_VSOCK_CONNECT_RETRY_SECONDS: float = 0.01
+    # A cold-booted VM must answer the agent ping within this long, or it is discarded
+    FC_GUEST_READY_TIMEOUT_SECONDS: float = 10.0
+
+    # Warm VM Pool
+    # Booted-and-paused VMs kept ready per model (0 = cold boot every job)
+    FC_POOL_SIZE: int = 2
+    # Models to warm at worker startup; others join the pool on first use
+    FC_POOL_MODELS: list[str] = []
+    FC_POOL_WARMUP_ON_START: bool = True
+    # The refill loop boots at most FC_POOL_REFILL_BATCH VMs per model every interval
+    FC_POOL_REFILL_INTERVAL_SECONDS: float = 1.0
+    FC_POOL_REFILL_BATCH: int = 1
+    # Restore pooled VMs from a per-model snapshot instead of cold booting them.
+    # Delete the model's directory here after changing the kernel or rootfs.
+    FC_USE_SNAPSHOTS: bool = True
+    FC_SNAPSHOT_DIR: str = "/var/lib/clinisandbox/snapshots"
     
     # Database (Postgres)
     POSTGRES_SERVER: str = "localhost"
@@ -33,9 +91,120 @@ class Settings(BaseSettings):
         # Async driver 'postgresql+asyncpg'
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    # Database Pool (per process; the API and worker roles get separate sizes)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_WORKER_POOL_SIZE: int | None = None # Default: WORKER_CONCURRENCY + 2
+    DB_WORKER_MAX_OVERFLOW: int = 2
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 256
+    # Behind PgBouncer in transaction mode: disables prepared statement caching
+    DB_PGBOUNCER_MODE: bool = False
+
+    # Table Partitioning (jobs and audit_logs: one partition per calendar month, UTC)
+    # `python -m src.db.maintenance partitions` creates this many months ahead...
+    PARTITION_PREMAKE_MONTHS: int = 3
+    # ...and detaches partitions entirely older than the retention window (0 = keep forever)
+    JOB_RETENTION_MONTHS: int = 12
+    AUDIT_RETENTION_MONTHS: int = 72
+    # Detached partitions are moved to this schema (to dump/archive), or dropped outright
+    PARTITION_ARCHIVE_SCHEMA: str = "archive"
+    PARTITION_DROP_EXPIRED: bool = False
+
     # Redis (Queue)
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
+
+    # FHIR Validation
+    # False: the API only scans Observation codings for the gap check and the worker
+    # does the full fhir.resources validation. True: the API validates before accepting.
+    # With the default (False), gap analysis never uses the FHIR executor below: the
+    # fast scan takes ~0.3 ms for 1000 entries, less than handing the bundle to a pool.
+    # The executor then only runs strict validation of result-cache hits.
+    FHIR_STRICT_VALIDATION: bool = False
+    # Strict validation of bundles with at least this many entries runs in a pool
+    # instead of on the API event loop ("process" sidesteps the GIL, "thread" avoids pickling).
+    # The pool is created lazily, on the first offloaded bundle.
+    FHIR_EXECUTOR: Literal["thread", "process"] = "process"
+    FHIR_EXECUTOR_WORKERS: int = 2
+    FHIR_OFFLOAD_MIN_ENTRIES: int = 50
+
+    # Model Registry
+    # How long the API trusts a cached manifest without an invalidation message
+    REGISTRY_CACHE_TTL_SECONDS: float = 60.0
+
+    # Queue (reliable delivery)
+    # A claimed job is redelivered if its worker doesn't ack or renew it within this window
+    QUEUE_VISIBILITY_TIMEOUT_SECONDS: float = 120.0
+    # Deliveries per job before it is dead-lettered and marked FAILED
+    QUEUE_MAX_ATTEMPTS: int = 3
+    QUEUE_REAPER_INTERVAL_SECONDS: float = 10.0
+    # Priority lanes and their share of worker capacity when all of them have work
+    QUEUE_LANE_WEIGHTS: dict[str, int] = {"stat": 8, "routine": 3, "batch": 1}
+    QUEUE_DEFAULT_LANE: str = "routine"
+    # Lanes only some clients may submit to (lane -> allowed client_ids); unlisted lanes are open.
+    # Otherwise anyone could jump the fair share by labelling everything stat.
+    QUEUE_RESTRICTED_LANES: dict[str, list[str]] = {"stat": []}
+    # Fair-share weights per client_id inside a lane (clients not listed get 1)
+    QUEUE_CLIENT_WEIGHTS: dict[str, int] = {}
+
+    # Model affinity: workers pull queues of models they hold warm first and only
+    # take other models' jobs when that work runs out
+    QUEUE_AFFINITY_ENABLED: bool = True
+    # Workers re-advertise their warm models every interval; an advertisement lives TTL seconds
+    QUEUE_AFFINITY_HEARTBEAT_SECONDS: float = 10.0
+    QUEUE_AFFINITY_TTL_SECONDS: float = 30.0
+    # Models a worker just ran count as warm too (page cache, weights), most recent N
+    WORKER_AFFINITY_RECENT_MODELS: int = 2
+
+    # Job Status Streaming (GET /v1/jobs/{id}/events)
+    JOB_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    JOB_EVENTS_MAX_STREAM_SECONDS: float = 300.0
+    # Redis status cache in front of GET /v1/jobs/{id}
+    JOB_STATUS_CACHE_TTL_SECONDS: float = 3600.0
+    # QUEUED/PROCESSING entries expire quickly so a lost worker update can't pin them
+    JOB_STATUS_CACHE_ACTIVE_TTL_SECONDS: float = 30.0
+
+    # Inference Result Cache (content-addressed, encrypted in Redis)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL_SECONDS: float = 900.0
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+    # Identical jobs wait this long for the one already running before running it themselves
+    RESULT_CACHE_COALESCE_WAIT_SECONDS: float = 60.0
+    RESULT_CACHE_INFLIGHT_TTL_SECONDS: float = 120.0
+    RESULT_CACHE_POLL_SECONDS: float = 0.2
+
+    # Idempotency-Key on /v1/diagnose
+    # How long a completed request's response is replayed for the same key
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    # An in-progress marker outlives a crashed API process by at most this long
+    IDEMPOTENCY_PENDING_TTL_SECONDS: float = 60.0
+    # A concurrent duplicate waits this long for the first request, then gets 409
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0
+    IDEMPOTENCY_POLL_SECONDS: float = 0.05
+
+    # Audit Log Writer (buffered, multi-row inserts)
+    AUDIT_BUFFER_MAX_EVENTS: int = 10000
+    AUDIT_FLUSH_BATCH_SIZE: int = 500
+    # Also the window of buffered events a hard crash of the process can lose
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    AUDIT_SPILL_DRAIN_BATCHES: int = 10
+
+    # Worker
+    # Max jobs a single worker process runs at the same time (one "slot" per job)
+    WORKER_CONCURRENCY: int = 4
+    # How long a SIGTERM'd worker waits for in-flight jobs before cancelling them
+    WORKER_SHUTDOWN_GRACE_SECONDS: float = 30.0
+    # Micro-batching (opt-in per model): a slot that claims a job for one of these models
+    # also claims up to WORKER_BATCH_MAX_JOBS - 1 more from the same queue (same lane,
+    # model and client), waiting at most WORKER_BATCH_MAX_WAIT_MS, and runs them in one VM
+    WORKER_BATCH_MODELS: list[str] = []
+    WORKER_BATCH_MAX_JOBS: int = 8
+    WORKER_BATCH_MAX_WAIT_MS: int = 50
+    # Port for the worker's Prometheus scrape endpoint (the API serves /metrics itself)
+    WORKER_METRICS_PORT: int = 9100
     
     model_config = SettingsConfigDict(
         env_file=".env", 
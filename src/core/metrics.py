@@ -0,0 +1,189 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# All Prometheus metrics live here so each one is registered exactly once,
+# no matter how many modules import it.
+
+# --- Worker ---
+WORKER_SLOTS_TOTAL = Gauge(
+    "clinisandbox_worker_slots_total",
+    "Number of concurrent job slots configured for this worker",
+)
+WORKER_SLOT_BUSY = Gauge(
+    "clinisandbox_worker_slot_busy",
+    "1 while the slot is running a job, 0 while it is idle",
+    ["slot"],
+)
+WORKER_SLOT_JOBS = Counter(
+    "clinisandbox_worker_slot_jobs_total",
+    "Jobs finished by each worker slot",
+    ["slot"],
+)
+WORKER_SLOT_JOB_SECONDS = Histogram(
+    "clinisandbox_worker_slot_job_seconds",
+    "Wall-clock time a slot spent on one job",
+    ["slot"],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300),
+)
+WORKER_IN_FLIGHT = Gauge(
+    "clinisandbox_worker_in_flight_jobs",
+    "Jobs currently running in this worker",
+)
+WORKER_BATCH_SIZE = Histogram(
+    "clinisandbox_worker_batch_size",
+    "Jobs run together in one VM invocation (micro-batching)",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+# --- Queue ---
+QUEUE_LANE_DEPTH = Gauge(
+    "clinisandbox_queue_lane_depth",
+    "Messages waiting in each priority lane (all clients)",
+    ["lane"],
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "clinisandbox_queue_wait_seconds",
+    "Time from enqueue to a worker claiming the job",
+    ["lane"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600),
+)
+QUEUE_MODEL_DEPTH = Gauge(
+    "clinisandbox_queue_model_depth",
+    "Messages waiting per target model (all lanes and clients)",
+    ["model"],
+)
+QUEUE_AFFINITY_CLAIMS = Counter(
+    "clinisandbox_queue_affinity_claims_total",
+    "Claimed jobs by whether their model was warm on the claiming worker (warm), "
+    "warm only on another worker (stolen) or nowhere (cold)",
+    ["result"],
+)
+
+# --- VM Pool ---
+VM_POOL_IDLE = Gauge(
+    "clinisandbox_vm_pool_idle",
+    "Warm, paused MicroVMs waiting for a job",
+    ["model"],
+)
+VM_POOL_ACQUIRES = Counter(
+    "clinisandbox_vm_pool_acquires_total",
+    "VM acquisitions, split by warm hit vs cold-boot miss",
+    ["model", "result"],
+)
+VM_POOL_ACQUIRE_SECONDS = Histogram(
+    "clinisandbox_vm_pool_acquire_seconds",
+    "Time to get a VM ready for a job",
+    ["result"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+# --- Model Registry ---
+REGISTRY_CACHE_LOOKUPS = Counter(
+    "clinisandbox_registry_cache_lookups_total",
+    "Manifest lookups served from the in-process cache (hit) or the DB (miss)",
+    ["result"],
+)
+
+# --- Inference Result Cache ---
+RESULT_CACHE_LOOKUPS = Counter(
+    "clinisandbox_result_cache_lookups_total",
+    "Inference result cache lookups (hit rate = hit / (hit + miss))",
+    ["where", "result"],
+)
+RESULT_CACHE_COALESCED = Counter(
+    "clinisandbox_result_cache_coalesced_total",
+    "Jobs that reused the result of an identical job running at the same time",
+)
+RESULT_CACHE_EVICTIONS = Counter(
+    "clinisandbox_result_cache_evictions_total",
+    "Cached results evicted to stay under RESULT_CACHE_MAX_ENTRIES",
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    "clinisandbox_idempotency_requests_total",
+    "/v1/diagnose requests carrying an Idempotency-Key, by outcome",
+    ["outcome"],
+)
+
+# --- FHIR Analysis ---
+FHIR_ANALYSIS_QUEUE_WAIT_SECONDS = Histogram(
+    "clinisandbox_fhir_analysis_queue_wait_seconds",
+    "Time a gap analysis waited for a free executor worker",
+    ["mode"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+FHIR_ANALYSIS_COMPUTE_SECONDS = Histogram(
+    "clinisandbox_fhir_analysis_compute_seconds",
+    "Time spent validating a bundle and extracting LOINC codes",
+    ["mode"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# --- Webhooks ---
+WEBHOOK_REQUESTS = Counter(
+    "clinisandbox_webhook_requests_total",
+    "Webhook HTTP requests sent, per destination host",
+    ["host"],
+)
+WEBHOOK_CONNECTIONS_OPENED = Counter(
+    "clinisandbox_webhook_connections_opened_total",
+    "New TCP connections opened for webhooks; reuse ratio = 1 - opened / requests",
+    ["host"],
+)
+WEBHOOK_DELIVERIES = Counter(
+    "clinisandbox_webhook_deliveries_total",
+    "Outbox delivery attempts by outcome (delivered, retry, dead, deferred)",
+    ["result"],
+)
+WEBHOOK_CIRCUIT_OPEN = Gauge(
+    "clinisandbox_webhook_circuit_open",
+    "1 while deliveries to this host are paused by the circuit breaker",
+    ["host"],
+)
+
+# --- Job Status Streaming ---
+JOB_EVENT_SUBSCRIBERS = Gauge(
+    "clinisandbox_job_event_subscribers",
+    "Open job status streams in this API process",
+)
+JOB_STATUS_CACHE_LOOKUPS = Counter(
+    "clinisandbox_job_status_cache_lookups_total",
+    "Job status reads served from the Redis cache (hit) vs Postgres (miss)",
+    ["result"],
+)
+
+# --- Database Pool ---
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "clinisandbox_db_pool_checkout_seconds",
+    "Time spent waiting for a pooled DB connection (incl. opening overflow connections)",
+    ["role"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "clinisandbox_db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS (pool + overflow exhausted)",
+    ["role"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "clinisandbox_db_pool_checked_out",
+    "DB connections currently checked out of the pool",
+    ["role"],
+)
+
+# --- Audit Log ---
+AUDIT_EVENTS_BUFFERED = Gauge(
+    "clinisandbox_audit_events_buffered",
+    "Audit events waiting in this process's buffer",
+)
+AUDIT_EVENTS_WRITTEN = Counter(
+    "clinisandbox_audit_events_written_total",
+    "Audit events inserted into Postgres by the buffered writer",
+)
+AUDIT_EVENTS_SPILLED = Counter(
+    "clinisandbox_audit_events_spilled_total",
+    "Audit events parked in Redis (buffer full or Postgres failing)",
+)
+AUDIT_FLUSH_SECONDS = Histogram(
+    "clinisandbox_audit_flush_seconds",
+    "Duration of one multi-row audit INSERT",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
@@ -1,10 +1,69 @@
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import base64
 import hashlib
+import os
 from src.core.config import settings
 
+# AES-256-GCM envelope
+# --------------------
+# ENVELOPE_VERSION (1 byte) | key id length (1 byte) | key id | nonce (12 bytes) | ciphertext + tag (16 bytes)
+# The header is authenticated as associated data, so a key id can't be swapped.
+# Raw Fernet tokens (the previous binary format) start with 0x80 and are still decrypted.
+ENVELOPE_VERSION = 1
+FERNET_VERSION = 0x80
+NONCE_SIZE = 12
+DEFAULT_KEY_ID = "0" # Derived from WEBHOOK_SECRET; always kept for decryption
+
+class KeyRing:
+    """
+    All keys that may have encrypted stored data, plus the one new data is encrypted with.
+    Rotation: add a key, make it active, run `python -m src.db.maintenance reencrypt-bundles`,
+    and drop the old key once nothing uses it.
+    """
+
+    def __init__(self, keys: dict[str, bytes], active_key_id: str):
+        if active_key_id not in keys:
+            raise ValueError(f"Active encryption key '{active_key_id}' is not in the key ring")
+        for key_id, key in keys.items():
+            if len(key) != 32:
+                raise ValueError(f"Encryption key '{key_id}' must be 32 bytes (AES-256)")
+            if not 0 < len(key_id.encode()) < 256:
+                raise ValueError(f"Encryption key id '{key_id}' must be 1-255 bytes")
+        self.active_key_id = active_key_id
+        self._ciphers = {key_id: AESGCM(key) for key_id, key in keys.items()}
+
+    @classmethod
+    def from_settings(cls) -> "KeyRing":
+        # Labelled, so this never equals the Fernet key derived from the same secret
+        keys = {DEFAULT_KEY_ID: hashlib.sha256(b"clinisandbox-aes-gcm:" + settings.WEBHOOK_SECRET.encode()).digest()}
+        for key_id, key_b64 in settings.ENCRYPTION_KEYS.items():
+            keys[key_id] = base64.urlsafe_b64decode(key_b64)
+        return cls(keys, settings.ENCRYPTION_ACTIVE_KEY_ID or DEFAULT_KEY_ID)
+
+    def header(self, key_id: str | None = None) -> bytes:
+        key_id_bytes = (key_id or self.active_key_id).encode()
+        return bytes([ENVELOPE_VERSION, len(key_id_bytes)]) + key_id_bytes
+
+    def encrypt(self, data: bytes) -> bytes:
+        header = self.header()
+        nonce = os.urandom(NONCE_SIZE)
+        return header + nonce + self._ciphers[self.active_key_id].encrypt(nonce, data, header)
+
+    def decrypt(self, envelope: bytes) -> bytes:
+        if envelope[0] != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported envelope version {envelope[0]}")
+        header_size = 2 + envelope[1]
+        header = envelope[:header_size]
+        key_id = header[2:].decode()
+        if key_id not in self._ciphers:
+            raise ValueError(f"Unknown encryption key '{key_id}'")
+        nonce = envelope[header_size:header_size + NONCE_SIZE]
+        return self._ciphers[key_id].decrypt(nonce, envelope[header_size + NONCE_SIZE:], header)
+
 class DataEncryption:
     _cipher_suite = None
+    _key_ring: KeyRing | None = None
 
     @classmethod
     def get_cipher(cls) -> Fernet:
@@ -16,6 +75,7 @@ class DataEncryption:
             cls._cipher_suite = Fernet(key_b64)
         return cls._cipher_suite
 
+    # Legacy text format (base64 Fernet). Only used to read old rows and for downgrades.
     @classmethod
     def encrypt(cls, data: str) -> str:
         if not data:
@@ -26,4 +86,24 @@ class DataEncryption:
     def decrypt(cls, token: str) -> str:
         if not token:
             return ""
-        return cls.get_cipher().decrypt(token.encode()).decode()
\ No newline at end of file
+        return cls.get_cipher().decrypt(token.encode()).decode()
+
+    @classmethod
+    def get_key_ring(cls) -> KeyRing:
+        if cls._key_ring is None:
+            cls._key_ring = KeyRing.from_settings()
+        return cls._key_ring
+
+    @classmethod
+    def encrypt_bytes(cls, data: bytes) -> bytes:
+        """
+        AES-256-GCM envelope with the active key (for binary columns).
+        """
+        return cls.get_key_ring().encrypt(data)
+
+    @classmethod
+    def decrypt_bytes(cls, token: bytes) -> bytes:
+        if token[0] == FERNET_VERSION:
+            # Raw Fernet token (binary rows written before the key ring)
+            return cls.get_cipher().decrypt(base64.urlsafe_b64encode(token))
+        return cls.get_key_ring().decrypt(token)
@@ -3,11 +3,17 @@ from src.services.virtualization.mock import MockVMBackend
 from src.services.virtualization.firecracker import FirecrackerVMBackend
 from src.core.config import settings
 
+_backend: VMBackend | None = None
+
 def get_vm_backend() -> VMBackend:
     """
     Factory to return the appropriate VM engine based on Config.
+    The instance is shared per process because backends may hold state (e.g. a warm VM pool).
     """
-    if settings.USE_REAL_VM:
-        return FirecrackerVMBackend()
-    
-    return MockVMBackend()
\ No newline at end of file
+    global _backend
+    if _backend is None:
+        if settings.USE_REAL_VM:
+            _backend = FirecrackerVMBackend()
+        else:
+            _backend = MockVMBackend()
+    return _backend
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+One-off database maintenance tasks.
+
+Usage:
+    python -m src.db.maintenance reencode-bundles [--batch-size N] [--pause-seconds S] [--legacy]
+    python -m src.db.maintenance reencrypt-bundles   (same thing; name for key rotations)
+    python -m src.db.maintenance partitions [--months-ahead N] [--drop]   (run daily, e.g. from cron)
+"""
+import argparse
+import asyncio
+import json
+from typing import Any, Callable
+
+import structlog
+from sqlalchemy import LargeBinary, bindparam, func, select, type_coerce, update
+
+from src.core.config import settings
+from src.core.logging import setup_logging
+from src.core.security import DataEncryption
+from src.db.models import Job
+from src.db.partitions import maintain_table
+from src.db.session import AsyncSessionLocal, engine
+from src.db.types import MAGIC, current_prefix, decode_bundle, encode_bundle
+
+logger = structlog.get_logger()
+
+jobs = Job.__table__
+# The column as stored, without EncryptedJSON's encode/decode
+raw_bundle = type_coerce(jobs.c.fhir_bundle_input, LargeBinary)
+
+async def rewrite_bundles(
+    needs_rewrite,
+    encode: Callable[[Any], bytes],
+    batch_size: int,
+    pause_seconds: float = 0.0
+) -> int:
+    """
+    Re-encodes every bundle matching `needs_rewrite` (a SQL condition on the raw bytes),
+    walking the table in primary-key order and committing per batch, so it can be
+    stopped and resumed at any time, and run next to live traffic (pause between batches).
+    Returns the number of rows rewritten.
+    """
+    stmt = (
+        update(jobs)
+        .where(jobs.c.id == bindparam("b_id"))
+        .values(fhir_bundle_input=bindparam("b_data", type_=LargeBinary))
+    )
+    last_id = None
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            query = select(jobs.c.id, raw_bundle).where(needs_rewrite).order_by(jobs.c.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(jobs.c.id > last_id)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+
+            params = [{"b_id": job_id, "b_data": encode(decode_bundle(raw))} for job_id, raw in rows]
+            await db.execute(stmt, params)
+            await db.commit()
+
+        last_id = rows[-1][0]
+        total += len(rows)
+        logger.info("maintenance_batch_done", rewritten=total, last_id=str(last_id))
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
+    return total
+
+async def reencode_bundles(batch_size: int, legacy: bool = False, pause_seconds: float = 0.0) -> int:
+    """
+    Moves bundles to the current compressed binary format and active encryption key
+    (or back to the legacy base64 text, before downgrading the column).
+    """
+    if legacy:
+        def encode(value: Any) -> bytes:
+            return DataEncryption.encrypt(json.dumps(value)).encode("ascii")
+        needs_rewrite = func.substring(raw_bundle, 1, len(MAGIC), type_=LargeBinary) == MAGIC
+    else:
+        header = current_prefix()
+        encode = encode_bundle
+        needs_rewrite = func.substring(raw_bundle, 1, len(header), type_=LargeBinary) != header
+    return await rewrite_bundles(needs_rewrite, encode, batch_size, pause_seconds)
+
+async def maintain_partitions(months_ahead: int, drop: bool) -> dict:
+    """
+    Creates upcoming monthly partitions and archives (or drops) those past retention.
+    """
+    retention = {"jobs": settings.JOB_RETENTION_MONTHS, "audit_logs": settings.AUDIT_RETENTION_MONTHS}
+    summary = {}
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table, months in retention.items():
+            summary[table] = await maintain_table(conn, table, months, months_ahead=months_ahead, drop=drop)
+    await engine.dispose()
+    return summary
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(prog="python -m src.db.maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reencode = commands.add_parser(
+        "reencode-bundles",
+        aliases=["reencrypt-bundles"],
+        help="Rewrite FHIR bundles in the current storage format with the active encryption key"
+    )
+    reencode.add_argument("--batch-size", type=int, default=settings.BUNDLE_REENCODE_BATCH_SIZE)
+    reencode.add_argument("--pause-seconds", type=float, default=0.0, help="Sleep between batches to go easy on the DB")
+    reencode.add_argument("--legacy", action="store_true", help="Write the pre-compression text format instead")
+
+    partitions = commands.add_parser(
+        "partitions",
+        help="Create upcoming jobs/audit_logs partitions and detach the ones past retention"
+    )
+    partitions.add_argument("--months-ahead", type=int, default=settings.PARTITION_PREMAKE_MONTHS)
+    partitions.add_argument("--drop", action="store_true", default=settings.PARTITION_DROP_EXPIRED,
+                            help="Drop expired partitions instead of moving them to the archive schema")
+
+    args = parser.parse_args()
+    if args.command in ("reencode-bundles", "reencrypt-bundles"):
+        total = asyncio.run(reencode_bundles(args.batch_size, args.legacy, args.pause_seconds))
+        logger.info("maintenance_done", command=args.command, rewritten=total)
+    elif args.command == "partitions":
+        summary = asyncio.run(maintain_partitions(args.months_ahead, args.drop))
+        logger.info("maintenance_done", command=args.command, **summary)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import uuid
 import datetime
-from sqlalchemy import String, DateTime, ForeignKey, Float
+from sqlalchemy import String, DateTime, Float, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from src.db.types import EncryptedJSON
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -29,8 +29,12 @@ class DiagnosticModel(Base):
 class Job(Base):
     """
     A single diagnostic execution request.
+    Range-partitioned by month on created_at (see src/db/partitions.py); in Postgres
+    the primary key is (id, created_at), which is also why no foreign key points here.
     """
     __tablename__ = "jobs"
+    # INSERT/UPDATE ... RETURNING the server-side timestamps, instead of a refresh() SELECT later
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     client_id: Mapped[str] = mapped_column(String, index=True)
@@ -41,7 +45,10 @@ class Job(Base):
     target_model_key: Mapped[str] = mapped_column(String) # e.g. "sepsis"
     
     # Input/Output
-    fhir_bundle_input: Mapped[dict] = mapped_column(EncryptedJSON) 
+    # Deferred: loading it means decrypting + parsing the whole patient bundle, and only
+    # the worker needs it. Ask for it with .options(undefer(Job.fhir_bundle_input));
+    # touching it unloaded raises instead of silently lazy-loading.
+    fhir_bundle_input: Mapped[dict] = mapped_column(EncryptedJSON, deferred=True, deferred_raiseload=True)
     result_payload: Mapped[dict | None] = mapped_column(JSONB, nullable=True) # The diagnosis
     
     webhook_url: Mapped[str | None] = mapped_column(String, nullable=True)
@@ -53,14 +60,41 @@ class Job(Base):
 class AuditLog(Base):
     """
     Immutable record of system decisions.
+    Range-partitioned by month on timestamp, like jobs; the DB primary key is (id, timestamp).
     """
     __tablename__ = "audit_logs"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    # Nullable because some events might not be tied to a job (e.g., system startup, login)
-    job_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), ForeignKey("jobs.id"), nullable=True)
+    # Nullable because some events might not be tied to a job (e.g., system startup, login).
+    # Not a foreign key: jobs is partitioned, and audit rows outlive expired job partitions.
+    job_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
     
     event_type: Mapped[str] = mapped_column(String, index=True) # e.g. "DECISION_NEGOTIATION_REQUIRED"
     details: Mapped[dict] = mapped_column(JSONB) # The context (missing codes, client id)
     
-    timestamp: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    timestamp: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class WebhookDelivery(Base):
+    """
+    Transactional outbox: written in the same commit that finishes the job,
+    drained by the webhook dispatcher. Retry state lives here so it survives restarts.
+    """
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        # The dispatcher's "what is due?" query
+        Index("ix_webhook_deliveries_due", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), index=True) # jobs.id (no FK, jobs is partitioned)
+    url: Mapped[str] = mapped_column(String)
+    payload: Mapped[dict] = mapped_column(JSONB)
+
+    # Status: PENDING, DELIVERED, DEAD
+    status: Mapped[str] = mapped_column(String, default="PENDING")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    delivered_at: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,152 @@
+"""
+Monthly range partitions for the append-mostly tables.
+
+jobs (by created_at) and audit_logs (by timestamp) are partitioned by month, in UTC.
+Each table also has a DEFAULT partition, so inserts never fail if the maintenance job
+falls behind; it is supposed to stay empty. The partition holding pre-partitioning
+history, {table}_legacy, covers (MINVALUE, <first month>).
+"""
+import datetime
+import re
+from dataclasses import dataclass
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.core.config import settings
+
+logger = structlog.get_logger()
+
+# table -> partition key column
+PARTITIONED_TABLES = {"jobs": "created_at", "audit_logs": "timestamp"}
+
+_BOUND = re.compile(r"FROM \((?:MINVALUE|'(?P<lower>[^']+)')\) TO \((?:MAXVALUE|'(?P<upper>[^']+)')\)")
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    lower: datetime.datetime | None # None = MINVALUE
+    upper: datetime.datetime | None # None = MAXVALUE
+
+def month_start(moment: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+def add_months(month: datetime.datetime, months: int) -> datetime.datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+
+def partition_name(table: str, month: datetime.datetime) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def parse_bound(name: str, bound: str) -> Partition | None:
+    """
+    Partition from pg_get_expr(relpartbound) text; None for the DEFAULT partition.
+    """
+    match = _BOUND.search(bound)
+    if match is None:
+        return None
+    lower, upper = match.group("lower"), match.group("upper")
+    return Partition(
+        name,
+        datetime.datetime.fromisoformat(lower) if lower else None,
+        datetime.datetime.fromisoformat(upper) if upper else None
+    )
+
+def plan(
+    table: str,
+    existing: list[Partition],
+    now: datetime.datetime,
+    months_ahead: int,
+    retention_months: int
+) -> tuple[list[tuple[str, datetime.datetime, datetime.datetime]], list[Partition]]:
+    """
+    What to do for one table: (partitions to create, partitions past retention).
+    Months already covered by some partition (e.g. the legacy one) are skipped.
+    """
+    current = month_start(now)
+    to_create = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        covered = any(
+            (p.lower is None or p.lower <= start) and (p.upper is None or start < p.upper)
+            for p in existing
+        )
+        if not covered:
+            to_create.append((partition_name(table, start), start, add_months(start, 1)))
+
+    expired = []
+    if retention_months > 0:
+        # Only whole partitions go: everything in them must be older than the window
+        cutoff = add_months(current, -retention_months)
+        expired = [p for p in existing if p.upper is not None and p.upper <= cutoff]
+    return to_create, expired
+
+async def list_partitions(conn: AsyncConnection, table: str) -> tuple[list[Partition], str | None]:
+    """
+    Range partitions of `table`, plus the name of its DEFAULT partition (if any).
+    """
+    rows = await conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": table})
+    partitions, default = [], None
+    for name, bound in rows:
+        partition = parse_bound(name, bound)
+        if partition is None:
+            default = name
+        else:
+            partitions.append(partition)
+    return partitions, default
+
+async def maintain_table(
+    conn: AsyncConnection,
+    table: str,
+    retention_months: int,
+    months_ahead: int | None = None,
+    now: datetime.datetime | None = None,
+    drop: bool | None = None
+) -> dict:
+    """
+    Creates upcoming partitions and detaches expired ones for one table.
+    `conn` must be in autocommit mode: every DDL statement is its own short transaction.
+    """
+    months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+    drop = settings.PARTITION_DROP_EXPIRED if drop is None else drop
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+
+    existing, default = await list_partitions(conn, table)
+    to_create, expired = plan(table, existing, now, months_ahead, retention_months)
+
+    # 1. Partitions ahead of time, so rows never land in DEFAULT
+    for name, start, end in to_create:
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        logger.info("partition_created", table=table, partition=name)
+
+    # 2. Expired partitions: DETACH is a catalog change, no row is touched.
+    # (CONCURRENTLY isn't allowed next to a DEFAULT partition, so bound the lock wait instead.)
+    if expired and not drop:
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {settings.PARTITION_ARCHIVE_SCHEMA}"))
+    for partition in expired:
+        await conn.execute(text("SET lock_timeout = '5s'"))
+        try:
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}"))
+        finally:
+            await conn.execute(text("RESET lock_timeout"))
+        if drop:
+            await conn.execute(text(f"DROP TABLE {partition.name}"))
+        else:
+            await conn.execute(text(f"ALTER TABLE {partition.name} SET SCHEMA {settings.PARTITION_ARCHIVE_SCHEMA}"))
+        logger.info("partition_expired", table=table, partition=partition.name, dropped=drop)
+
+    # 3. Rows in DEFAULT mean partitions weren't created in time (and block creating that month)
+    if default is not None:
+        stray = (await conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default})"))).scalar()
+        if stray:
+            logger.warning("partition_default_not_empty", table=table, partition=default)
+
+    return {"created": [name for name, _, _ in to_create], "expired": [p.name for p in expired]}
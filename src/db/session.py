@@ -1,13 +1,89 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import time
+import uuid
+from typing import Literal
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.core.config import settings
+from src.core.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_SECONDS, DB_POOL_CHECKOUT_TIMEOUTS
+
+Role = Literal["api", "worker"]
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long callers wait for a connection (incl. opening overflow ones).
+    Subclassed per role (see pool_class_for) so the label survives pool.recreate().
+    """
+    role: str = "api"
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(role=self.role).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(role=self.role).observe(time.perf_counter() - start_time)
+
+def pool_class_for(role: Role) -> type[InstrumentedPool]:
+    return type(f"InstrumentedPool_{role}", (InstrumentedPool,), {"role": role})
+
+def engine_options(role: Role) -> dict:
+    """
+    create_async_engine kwargs for a process role. Workers hold one connection per
+    slot plus a few for housekeeping (reaper, webhook dispatcher); the API pool is
+    sized for request concurrency.
+    """
+    if role == "worker":
+        pool_size = settings.DB_WORKER_POOL_SIZE or settings.WORKER_CONCURRENCY + 2
+        max_overflow = settings.DB_WORKER_MAX_OVERFLOW
+    else:
+        pool_size = settings.DB_POOL_SIZE
+        max_overflow = settings.DB_MAX_OVERFLOW
 
-# Create the Async Engine
+    if settings.DB_PGBOUNCER_MODE:
+        # Transaction pooling: the next transaction may land on another server connection,
+        # so no statement caches and no reused prepared-statement names
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        connect_args = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+
+    return {
+        "echo": settings.DEBUG,
+        "poolclass": pool_class_for(role),
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+def create_engine_for(role: Role) -> AsyncEngine:
+    new_engine = create_async_engine(settings.DATABASE_URL, **engine_options(role))
+
+    @event.listens_for(new_engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.labels(role=role).inc()
+
+    @event.listens_for(new_engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(role=role).dec()
+
+    return new_engine
+
+# Create the Async Engine (API role by default; the worker switches with configure_engine)
 # echo=True will print SQL queries to console (useful for dev, turn off in prod via config)
-engine = create_async_engine(
-    settings.DATABASE_URL, 
-    echo=settings.DEBUG,
-    future=True
-)
+engine = create_engine_for("api")
 
 # The Session Factory
 AsyncSessionLocal = async_sessionmaker(
@@ -17,10 +93,20 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+def configure_engine(role: Role) -> AsyncEngine:
+    """
+    Gives this process the pool for its role. Call once at startup, before any query
+    (the replaced engine is simply dropped, it never opened a connection).
+    """
+    global engine
+    engine = create_engine_for(role)
+    AsyncSessionLocal.configure(bind=engine)
+    return engine
+
 # Dependency for FastAPI Routes
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
@@ -1,28 +1,94 @@
 import json
+import zlib
 from typing import Any, Optional
-from sqlalchemy.types import TypeDecorator, Text
+from sqlalchemy.types import TypeDecorator, LargeBinary
+from src.core.config import settings
 from src.core.security import DataEncryption
 
+try:
+    import zstandard
+except ImportError: # zlib is always there; zstd is just faster and smaller
+    zstandard = None
+
+# Stored format
+# -------------
+# v1: MAGIC | version (1 byte) | codec (1 byte) | encrypted compressed compact JSON
+#     (AES-256-GCM key ring envelope, see src/core/security.py; early v1 rows hold a raw Fernet token)
+# legacy: base64 Fernet token of the JSON, as text (rows written before v1; still readable)
+# Compression has to happen BEFORE encryption: ciphertext doesn't compress, so TOAST can't help.
+MAGIC = b"CSB"
+FORMAT_VERSION = 1
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+_CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=settings.BUNDLE_COMPRESSION_LEVEL).compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, settings.BUNDLE_COMPRESSION_LEVEL)
+    return data
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Bundle is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_NONE:
+        return data
+    raise ValueError(f"Unknown bundle codec {codec}")
+
+def configured_codec() -> int:
+    codec = _CODECS[settings.BUNDLE_COMPRESSION]
+    if codec == CODEC_ZSTD and zstandard is None:
+        return CODEC_ZLIB
+    return codec
+
+def current_prefix() -> bytes:
+    """
+    Leading bytes of every value encode_bundle() writes right now (format, codec, active key).
+    Rows that don't start with it are due for re-encoding.
+    """
+    return MAGIC + bytes([FORMAT_VERSION, configured_codec()]) + DataEncryption.get_key_ring().header()
+
+def encode_bundle(value: Any, codec: int | None = None) -> bytes:
+    codec = configured_codec() if codec is None else codec
+    # 1. Compact JSON -> compress -> encrypt (binary envelope, no base64)
+    payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    token = DataEncryption.encrypt_bytes(_compress(payload, codec))
+    # 2. Header says how to read it back
+    return MAGIC + bytes([FORMAT_VERSION, codec]) + token
+
+def decode_bundle(raw: bytes | memoryview | str) -> Any:
+    if isinstance(raw, memoryview):
+        raw = raw.tobytes()
+    if isinstance(raw, bytes) and raw[:len(MAGIC)] == MAGIC:
+        version, codec = raw[len(MAGIC)], raw[len(MAGIC) + 1]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported bundle format version {version}")
+        payload = _decompress(DataEncryption.decrypt_bytes(raw[len(MAGIC) + 2:]), codec)
+        return json.loads(payload)
+    # Legacy row: base64 Fernet text (bytea after the column migration)
+    token = raw.decode("ascii") if isinstance(raw, bytes) else raw
+    return json.loads(DataEncryption.decrypt(token))
+
 class EncryptedJSON(TypeDecorator):
     """
-    Saves JSON as an Encrypted String in the DB.
-    Decrypts back to JSON on retrieval.
+    Saves JSON as compressed, encrypted bytes in the DB.
+    Decrypts back to JSON on retrieval (old text-format rows included).
     """
-    impl = Text
+    impl = LargeBinary
     cache_ok = True
 
-    def process_bind_param(self, value: Any, dialect) -> Optional[str]:
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
         if value is None:
             return None
-        # 1. Convert Dict -> JSON String
-        json_str = json.dumps(value)
-        # 2. Encrypt String
-        return DataEncryption.encrypt(json_str)
+        return encode_bundle(value)
 
-    def process_result_value(self, value: Optional[str], dialect) -> Any:
+    def process_result_value(self, value: Optional[bytes], dialect) -> Any:
         if value is None:
             return None
-        # 1. Decrypt String
-        json_str = DataEncryption.decrypt(value)
-        # 2. Parse JSON
-        return json.loads(json_str)
\ No newline at end of file
+        return decode_bundle(value)
@@ -1,3 +1,4 @@
+import asyncio
 import time
 from contextlib import asynccontextmanager
 
@@ -9,6 +10,10 @@ import structlog
 from src.core.config import settings
 from src.core.logging import setup_logging
 from src.api.router import api_router
+from src.services.registry import model_registry
+from src.services.executor import shutdown_executor
+from src.services.job_status import job_status_hub
+from src.services.audit import audit_writer
 from starlette.middleware.base import BaseHTTPMiddleware
 
 # 1. Initialize Logging
@@ -20,7 +25,17 @@ logger = structlog.get_logger()
 async def lifespan(app: FastAPI):
     logger.info("system_startup", env=settings.ENVIRONMENT)
     # Could initialize Redis pool here if not lazy-loaded
+    listeners = [
+        asyncio.create_task(model_registry.listen_for_invalidations()),
+        asyncio.create_task(job_status_hub.listen()),
+        asyncio.create_task(audit_writer.run()),
+    ]
     yield
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+    await audit_writer.close()
+    shutdown_executor()
     logger.info("system_shutdown")
 
 # 3. Create App
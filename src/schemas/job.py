@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Dict, Any, Optional
+from pydantic import BaseModel, Field, ConfigDict, field_validator
+from typing import Dict, Any, List, Optional
 from uuid import UUID
 from datetime import datetime
+from src.core.config import settings
 
 # 1. Input Schema (Client -> API)
 class JobCreateRequest(BaseModel):
@@ -9,10 +10,18 @@ class JobCreateRequest(BaseModel):
     target_diagnosis: str = Field(..., description="e.g. sepsis, pneumonia")
     webhook_url: Optional[str] = Field(None, description="Callback URL for results")
     fhir_bundle: Dict[str, Any] = Field(..., description="Valid FHIR R4 Bundle")
+    priority: str = Field(settings.QUEUE_DEFAULT_LANE, description="Queue lane, e.g. stat, routine, batch")
 
     # Strict config
     model_config = ConfigDict(extra="forbid")
 
+    @field_validator("priority")
+    @classmethod
+    def priority_must_be_a_lane(cls, value: str) -> str:
+        if value not in settings.QUEUE_LANE_WEIGHTS:
+            raise ValueError(f"priority must be one of {sorted(settings.QUEUE_LANE_WEIGHTS)}")
+        return value
+
 # 2. Output Schema (API -> Client)
 class JobResponse(BaseModel):
     job_id: UUID
@@ -26,4 +35,23 @@ class JobStatusResponse(BaseModel):
     status: str
     result: Optional[Dict[str, Any]] = None
     created_at: datetime
-    updated_at: datetime
\ No newline at end of file
+    updated_at: datetime
+
+# 4. Batch Schemas (POST /diagnose/batch)
+class BatchJobCreateRequest(BaseModel):
+    items: List[JobCreateRequest] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+    model_config = ConfigDict(extra="forbid")
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    status: str = Field(..., description="QUEUED, NEGOTIATION_REQUIRED or REJECTED")
+    job_id: Optional[UUID] = None
+    created_at: Optional[datetime] = None
+    missing_data: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+
+class BatchJobResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[BatchItemResult]
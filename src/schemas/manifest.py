@@ -13,6 +13,7 @@ class ModelManifest(BaseModel):
     """
     target_diagnosis: str
     minimum_accuracy: float
+    model_version: Optional[str] = None
     required_observations: List[LOINCRequirement] = []
     
     # TODO: Add 'required_conditions', 'required_medications' later
\ No newline at end of file
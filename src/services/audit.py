@@ -1,17 +1,33 @@
+import asyncio
+import datetime
+import json
+import time
+import uuid
 import structlog
+from collections import deque
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.config import settings
+from src.core.metrics import AUDIT_EVENTS_BUFFERED, AUDIT_EVENTS_SPILLED, AUDIT_EVENTS_WRITTEN, AUDIT_FLUSH_SECONDS
 from src.db.models import AuditLog
+from src.db.session import AsyncSessionLocal
+from src.services.queue import redis_client
 
 logger = structlog.get_logger()
 
+# LIST of JSON audit rows that couldn't go to Postgres (buffer full, DB down, shutdown)
+SPILL_KEY = "clinisandbox_audit:spill"
+
 async def record_audit_event(
-    db: AsyncSession, 
-    event_type: str, 
-    details: dict, 
+    db: AsyncSession,
+    event_type: str,
+    details: dict,
     job_id: str = None
 ):
     """
     Persists an event to the audit log table.
+    Use this when the event must commit atomically with the caller's own writes;
+    otherwise prefer emit_audit_event (no commit on the request path).
     """
     try:
         log_entry = AuditLog(
@@ -20,12 +36,149 @@ async def record_audit_event(
             details=details
         )
         db.add(log_entry)
-        
+
         # We assume the caller manages the transaction commit for atomicity.
-        # If the main operation fails, the audit log might roll back too 
+        # If the main operation fails, the audit log might roll back too
         # (which is correct for "Decision made" events within a transaction).
-        
+
         logger.info("audit_event_recorded", audit_type=event_type, job_id=job_id)
     except Exception as e:
         # standard logging fallback if DB audit fails
-        logger.error("audit_logging_failed", error=str(e), audit_type=event_type)
\ No newline at end of file
+        logger.error("audit_logging_failed", error=str(e), audit_type=event_type)
+
+class AuditWriter:
+    """
+    Buffers audit events in memory and writes them in multi-row INSERTs,
+    every AUDIT_FLUSH_INTERVAL_SECONDS or as soon as a batch is full.
+
+    Nothing is silently dropped: when the buffer is full (backpressure) or Postgres
+    is failing, events spill to a Redis list, which later flushes drain back into
+    the table.
+
+    Deliberately NOT journaled to Redis on every emit: several API processes draining
+    one shared list can't trim it safely without a claim protocol. The price is that a
+    hard crash (kill -9, OOM) loses the events buffered since the last flush, i.e. at
+    most AUDIT_FLUSH_INTERVAL_SECONDS worth; a clean shutdown flushes everything.
+    Events that must never be lost belong in the caller's transaction (record_audit_event).
+    """
+
+    def __init__(self):
+        self._buffer: deque[dict] = deque()
+        self._wakeup: asyncio.Event | None = None
+
+    async def emit(self, event_type: str, details: dict, job_id: str | None = None):
+        row = {
+            "job_id": str(job_id) if job_id else None,
+            "event_type": event_type,
+            "details": details,
+            # Stamped now, not at flush time
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }
+        if len(self._buffer) >= settings.AUDIT_BUFFER_MAX_EVENTS:
+            # Backpressure: the caller pays one Redis round trip instead of growing memory
+            await self._spill([row])
+            return
+        self._buffer.append(row)
+        AUDIT_EVENTS_BUFFERED.set(len(self._buffer))
+        if len(self._buffer) >= settings.AUDIT_FLUSH_BATCH_SIZE and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _write(self, rows: list[dict]) -> bool:
+        start_time = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                # executemany -> batched multi-row INSERT ... VALUES
+                await db.execute(insert(AuditLog), [
+                    {
+                        **row,
+                        "job_id": uuid.UUID(row["job_id"]) if row["job_id"] else None,
+                        "timestamp": datetime.datetime.fromisoformat(row["timestamp"])
+                    }
+                    for row in rows
+                ])
+                await db.commit()
+        except Exception as e:
+            logger.error("audit_flush_failed", error=str(e), events=len(rows))
+            return False
+        finally:
+            AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - start_time)
+        AUDIT_EVENTS_WRITTEN.inc(len(rows))
+        return True
+
+    async def _spill(self, rows: list[dict]):
+        try:
+            await redis_client.rpush(SPILL_KEY, *[json.dumps(row) for row in rows])
+            AUDIT_EVENTS_SPILLED.inc(len(rows))
+        except Exception as e:
+            # Last resort: the structured log still carries the event
+            for row in rows:
+                logger.error("audit_logging_failed", error=str(e), audit_type=row["event_type"], event=row)
+
+    async def _drain_spill(self) -> int:
+        """
+        Moves a bounded number of spilled events back into Postgres.
+        """
+        written = 0
+        for _ in range(settings.AUDIT_SPILL_DRAIN_BATCHES):
+            raw_rows = await redis_client.lpop(SPILL_KEY, settings.AUDIT_FLUSH_BATCH_SIZE)
+            if not raw_rows:
+                break
+            rows = [json.loads(raw) for raw in raw_rows]
+            if not await self._write(rows):
+                # Put them back at the head, keep their order
+                await redis_client.lpush(SPILL_KEY, *reversed(raw_rows))
+                break
+            written += len(rows)
+        return written
+
+    async def flush(self) -> int:
+        """
+        Writes everything buffered right now. Returns how many events reached Postgres.
+        """
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), settings.AUDIT_FLUSH_BATCH_SIZE))]
+            AUDIT_EVENTS_BUFFERED.set(len(self._buffer))
+            if await self._write(batch):
+                written += len(batch)
+            else:
+                await self._spill(batch)
+        try:
+            written += await self._drain_spill()
+        except Exception as e:
+            logger.warning("audit_spill_drain_failed", error=str(e))
+        return written
+
+    async def run(self):
+        """
+        Long-running task: flushes on the interval, or early when a batch fills up.
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.AUDIT_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("audit_writer_error", error=str(e))
+
+    async def close(self):
+        """
+        Final flush on shutdown (anything Postgres won't take goes to the spill list).
+        """
+        self._wakeup = None
+        written = await self.flush()
+        logger.info("audit_writer_closed", flushed=written)
+
+audit_writer = AuditWriter()
+
+async def emit_audit_event(event_type: str, details: dict, job_id: str | None = None):
+    """
+    Records an audit event without touching the caller's session or waiting on a commit.
+    Durable once flushed (at most AUDIT_FLUSH_INTERVAL_SECONDS later); see AuditWriter.
+    """
+    await audit_writer.emit(event_type, details, job_id)
+    logger.info("audit_event_recorded", audit_type=event_type, job_id=job_id)
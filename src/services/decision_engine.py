@@ -1,9 +1,10 @@
 import structlog
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Set, Tuple
 from fhir.resources.bundle import Bundle
 from fhir.resources.observation import Observation
 from pydantic import ValidationError
 
+from src.core.config import settings
 from src.schemas.manifest import ModelManifest, LOINCRequirement
 
 logger = structlog.get_logger()
@@ -58,25 +59,71 @@ class DecisionEngine:
         return found_codes
 
     @staticmethod
-    def analyze_gap(bundle_json: Dict[str, Any], manifest: ModelManifest) -> Tuple[bool, List[LOINCRequirement]]:
+    def extract_loinc_codes_fast(bundle_json: Dict[str, Any]) -> Set[str]:
+        """
+        Same answer as extract_loinc_codes, straight from the raw JSON.
+        Only checks the parts of the structure it walks (Bundle -> entry[] -> resource),
+        everything else is left to validate_fhir_structure.
+        Raises ValueError if the bundle shape is unusable.
+        """
+        if not isinstance(bundle_json, dict) or bundle_json.get("resourceType") != "Bundle":
+            raise ValueError("Invalid FHIR JSON structure")
+
+        entries = bundle_json.get("entry") or []
+        if not isinstance(entries, list):
+            raise ValueError("Invalid FHIR JSON structure")
+
+        found_codes = set()
+        for entry in entries:
+            if not isinstance(entry, dict):
+                raise ValueError("Invalid FHIR JSON structure")
+
+            resource = entry.get("resource")
+            if not isinstance(resource, dict) or resource.get("resourceType") != "Observation":
+                continue
+
+            code = resource.get("code")
+            codings = code.get("coding") if isinstance(code, dict) else None
+            if not isinstance(codings, list):
+                continue
+
+            for coding in codings:
+                if not isinstance(coding, dict):
+                    continue
+                system = coding.get("system")
+                # Standard LOINC URL: http://loinc.org
+                if isinstance(system, str) and "loinc.org" in system and coding.get("code"):
+                    found_codes.add(coding["code"])
+
+        return found_codes
+
+    @staticmethod
+    def analyze_gap(
+        bundle_json: Dict[str, Any],
+        manifest: ModelManifest,
+        strict: bool | None = None
+    ) -> Tuple[bool, List[LOINCRequirement]]:
         """
         Compares Patient Data vs Model Requirements.
+        strict=True validates the whole bundle with fhir.resources first (slow on big bundles);
+        the default comes from FHIR_STRICT_VALIDATION, otherwise the worker validates later.
         Returns:
             (True, []) -> Ready to Run
             (False, [missing_reqs]) -> Negotiation Needed
         """
-        # 1. Parse & Validate
-        try:
-            bundle = DecisionEngine.validate_fhir_structure(bundle_json)
-        except Exception:
-            # If we can't parse it, we can't analyze it. Caller handles the 400.
-            raise
+        if strict is None:
+            strict = settings.FHIR_STRICT_VALIDATION
 
-        # 2. Extract Patient's Codes
-        patient_codes = DecisionEngine.extract_loinc_codes(bundle)
-        logger.info("analyzing_gap", found_codes=list(patient_codes.keys()))
+        # 1. Extract Patient's Codes
+        # If we can't parse it, we can't analyze it. Caller handles the 400.
+        if strict:
+            bundle = DecisionEngine.validate_fhir_structure(bundle_json)
+            patient_codes = set(DecisionEngine.extract_loinc_codes(bundle))
+        else:
+            patient_codes = DecisionEngine.extract_loinc_codes_fast(bundle_json)
+        logger.info("analyzing_gap", found_codes=list(patient_codes), strict=strict)
 
-        # 3. Check Requirements
+        # 2. Check Requirements
         missing_requirements = []
         
         for req in manifest.required_observations:
@@ -0,0 +1,110 @@
+import asyncio
+import time
+import structlog
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from src.core.config import settings
+from src.core.metrics import FHIR_ANALYSIS_COMPUTE_SECONDS, FHIR_ANALYSIS_QUEUE_WAIT_SECONDS
+from src.schemas.manifest import ModelManifest, LOINCRequirement
+from src.services.decision_engine import DecisionEngine
+
+logger = structlog.get_logger()
+
+_executor: Executor | None = None
+
+def get_executor() -> Executor:
+    """
+    Lazily creates the pool that runs CPU-heavy FHIR work off the event loop.
+    """
+    global _executor
+    if _executor is None:
+        workers = max(1, settings.FHIR_EXECUTOR_WORKERS)
+        if settings.FHIR_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fhir")
+        logger.info("fhir_executor_started", kind=settings.FHIR_EXECUTOR, workers=workers)
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+def _timed_gap_analysis(
+    submitted_at: float,
+    bundle_json: Dict[str, Any],
+    manifest: ModelManifest,
+    strict: bool
+) -> Tuple[Tuple[bool, List[LOINCRequirement]], float, float]:
+    """
+    Runs inside the pool. Returns (result, queue_wait_s, compute_s).
+    Wall-clock time is used because monotonic clocks aren't comparable across processes.
+    """
+    started_at = time.time()
+    try:
+        result = DecisionEngine.analyze_gap(bundle_json, manifest, strict=strict)
+    except ValueError as e:
+        # pydantic's ValidationError doesn't survive pickling back from a process pool,
+        # and callers only care that it's a ValueError (-> HTTP 400)
+        raise ValueError(str(e)) from None
+    return result, started_at - submitted_at, time.time() - started_at
+
+def _timed_validation(submitted_at: float, bundle_json: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    Strict validation only, inside the pool. Returns (queue_wait_s, compute_s).
+    """
+    started_at = time.time()
+    try:
+        DecisionEngine.validate_fhir_structure(bundle_json)
+    except ValueError as e:
+        raise ValueError(str(e)) from None
+    return started_at - submitted_at, time.time() - started_at
+
+def _bundle_size(bundle_json: Dict[str, Any]) -> int:
+    entries = bundle_json.get("entry") if isinstance(bundle_json, dict) else None
+    return len(entries) if isinstance(entries, list) else 0
+
+async def run_gap_analysis(bundle_json: Dict[str, Any], manifest: ModelManifest) -> Tuple[bool, List[LOINCRequirement]]:
+    """
+    DecisionEngine.analyze_gap, but big strict validations don't block the event loop.
+    """
+    strict = settings.FHIR_STRICT_VALIDATION
+    size = _bundle_size(bundle_json)
+
+    # The fast LOINC scan is cheaper than handing the bundle to another thread/process,
+    # so only strict validation of large bundles is worth offloading.
+    if not strict or size < settings.FHIR_OFFLOAD_MIN_ENTRIES:
+        start_time = time.perf_counter()
+        try:
+            return DecisionEngine.analyze_gap(bundle_json, manifest, strict=strict)
+        finally:
+            FHIR_ANALYSIS_COMPUTE_SECONDS.labels(mode="inline").observe(time.perf_counter() - start_time)
+
+    loop = asyncio.get_running_loop()
+    result, wait_s, compute_s = await loop.run_in_executor(
+        get_executor(), _timed_gap_analysis, time.time(), bundle_json, manifest, strict
+    )
+    FHIR_ANALYSIS_QUEUE_WAIT_SECONDS.labels(mode=settings.FHIR_EXECUTOR).observe(max(0.0, wait_s))
+    FHIR_ANALYSIS_COMPUTE_SECONDS.labels(mode=settings.FHIR_EXECUTOR).observe(compute_s)
+    return result
+
+async def run_fhir_validation(bundle_json: Dict[str, Any]):
+    """
+    DecisionEngine.validate_fhir_structure with the same offload rule as run_gap_analysis:
+    large bundles go to the bounded FHIR pool. Raises ValueError if the bundle is invalid.
+    """
+    if _bundle_size(bundle_json) < settings.FHIR_OFFLOAD_MIN_ENTRIES:
+        start_time = time.perf_counter()
+        try:
+            DecisionEngine.validate_fhir_structure(bundle_json)
+            return
+        finally:
+            FHIR_ANALYSIS_COMPUTE_SECONDS.labels(mode="inline").observe(time.perf_counter() - start_time)
+
+    loop = asyncio.get_running_loop()
+    wait_s, compute_s = await loop.run_in_executor(get_executor(), _timed_validation, time.time(), bundle_json)
+    FHIR_ANALYSIS_QUEUE_WAIT_SECONDS.labels(mode=settings.FHIR_EXECUTOR).observe(max(0.0, wait_s))
+    FHIR_ANALYSIS_COMPUTE_SECONDS.labels(mode=settings.FHIR_EXECUTOR).observe(compute_s)
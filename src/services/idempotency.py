@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+import structlog
+from dataclasses import dataclass
+from typing import Any
+
+from src.core.config import settings
+from src.core.metrics import IDEMPOTENCY_REQUESTS
+from src.services.queue import redis_client
+
+logger = structlog.get_logger()
+
+# STRING f"{IDEMPOTENCY_PREFIX}:{client_id}:{key}" -> JSON record:
+#   {"state": "pending", "owner": ..., "fingerprint": ...}   while the first request runs
+#   {"state": "done", "fingerprint": ..., "response": {...}} afterwards (IDEMPOTENCY_TTL_SECONDS)
+IDEMPOTENCY_PREFIX = "clinisandbox_idem"
+
+# Drops a pending record only if it is still ours (not already completed or re-claimed)
+_RELEASE_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+if raw and cjson.decode(raw)['owner'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release = redis_client.register_script(_RELEASE_SCRIPT)
+
+class IdempotencyConflict(Exception):
+    """
+    The key was already used with a different request body.
+    """
+    pass
+
+class IdempotencyInProgress(Exception):
+    """
+    The first request with this key is still running after we waited for it.
+    """
+    pass
+
+@dataclass
+class IdempotencyClaim:
+    key: str
+    fingerprint: str
+    owner: str | None = None # Set when this request must do the work
+    response: dict | None = None # Set when an earlier request already did it
+
+def idempotency_key(client_id: str, key: str) -> str:
+    return f"{IDEMPOTENCY_PREFIX}:{client_id}:{key}"
+
+def request_fingerprint(body: Any) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+async def claim_idempotency_key(client_id: str, key: str, fingerprint: str) -> IdempotencyClaim:
+    """
+    Either makes this request the owner of the key, or returns the stored response
+    of the request that owned it, waiting (up to IDEMPOTENCY_WAIT_SECONDS) if that
+    one is still running.
+    """
+    redis_key = idempotency_key(client_id, key)
+    owner = uuid.uuid4().hex
+    pending = json.dumps({"state": "pending", "owner": owner, "fingerprint": fingerprint})
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        # The pending record expires on its own if this process dies mid-request
+        if await redis_client.set(redis_key, pending, nx=True, ex=int(settings.IDEMPOTENCY_PENDING_TTL_SECONDS)):
+            IDEMPOTENCY_REQUESTS.labels(outcome="new").inc()
+            return IdempotencyClaim(redis_key, fingerprint, owner=owner)
+
+        # None: released or expired between SET and GET, so just try to claim again
+        raw = await redis_client.get(redis_key)
+        if raw is not None:
+            record = json.loads(raw)
+            if record["fingerprint"] != fingerprint:
+                IDEMPOTENCY_REQUESTS.labels(outcome="conflict").inc()
+                raise IdempotencyConflict(key)
+            if record["state"] == "done":
+                IDEMPOTENCY_REQUESTS.labels(outcome="replayed").inc()
+                logger.info("idempotent_request_replayed", client_id=client_id)
+                return IdempotencyClaim(redis_key, fingerprint, response=record["response"])
+
+        if time.monotonic() >= deadline:
+            IDEMPOTENCY_REQUESTS.labels(outcome="in_progress").inc()
+            raise IdempotencyInProgress(key)
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+
+async def complete_idempotency_key(claim: IdempotencyClaim, response: dict):
+    """
+    Stores the response so retries with the same key get it back.
+    """
+    record = json.dumps({"state": "done", "fingerprint": claim.fingerprint, "response": response})
+    await redis_client.set(claim.key, record, ex=int(settings.IDEMPOTENCY_TTL_SECONDS))
+
+async def release_idempotency_key(claim: IdempotencyClaim):
+    """
+    The owner failed (rejected or crashed): let the next retry run for real.
+    """
+    try:
+        await _release(keys=[claim.key], args=[claim.owner])
+    except Exception as e:
+        logger.warning("idempotency_release_failed", error=str(e))
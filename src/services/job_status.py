@@ -0,0 +1,197 @@
+import asyncio
+import datetime
+import json
+import structlog
+from collections import defaultdict
+
+from src.core.config import settings
+from src.core.metrics import JOB_EVENT_SUBSCRIBERS, JOB_STATUS_CACHE_LOOKUPS
+from src.services.queue import redis_client
+
+logger = structlog.get_logger()
+
+# Workers publish every status transition to f"{JOB_EVENTS_CHANNEL}:{job_id}"
+JOB_EVENTS_CHANNEL = "clinisandbox_job_events"
+# HASH f"{STATUS_CACHE_PREFIX}:{job_id}" -> status, result (JSON), timestamp, created_at
+STATUS_CACHE_PREFIX = "clinisandbox_job"
+TERMINAL_STATUSES = ("COMPLETED", "FAILED")
+SUBSCRIBER_BUFFER = 16
+
+def job_channel(job_id: str) -> str:
+    return f"{JOB_EVENTS_CHANNEL}:{job_id}"
+
+def status_cache_key(job_id: str) -> str:
+    return f"{STATUS_CACHE_PREFIX}:{job_id}"
+
+# KEYS: status hash. ARGV: ttl, then field/value pairs.
+# Read-through fills must never overwrite a fresher write from the worker.
+_FILL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+_fill = redis_client.register_script(_FILL_SCRIPT)
+
+def status_event(
+    job_id: str,
+    status: str,
+    result: dict | None = None,
+    timestamp: datetime.datetime | None = None,
+    created_at: datetime.datetime | None = None
+) -> dict:
+    return {
+        "job_id": str(job_id),
+        "status": status,
+        "result": result,
+        "timestamp": (timestamp or datetime.datetime.now(datetime.timezone.utc)).isoformat(),
+        "created_at": created_at.isoformat() if created_at else None
+    }
+
+def _cache_ttl(status: str) -> int:
+    """
+    Terminal statuses never change again; anything else is re-read from Postgres
+    soon, so a lost transition can't pin a stale status for long.
+    """
+    if status in TERMINAL_STATUSES:
+        return int(settings.JOB_STATUS_CACHE_TTL_SECONDS)
+    return int(settings.JOB_STATUS_CACHE_ACTIVE_TTL_SECONDS)
+
+def _cache_fields(event: dict) -> dict:
+    fields = {
+        "status": event["status"],
+        "result": json.dumps(event["result"]),
+        "timestamp": event["timestamp"]
+    }
+    if event["created_at"]:
+        fields["created_at"] = event["created_at"]
+    return fields
+
+def queue_status_writes(pipe, events: list[dict]):
+    """
+    Adds status cache writes to a caller's pipeline (e.g. the enqueue MULTI).
+    """
+    for event in events:
+        pipe.hset(status_cache_key(event["job_id"]), mapping=_cache_fields(event))
+        pipe.expire(status_cache_key(event["job_id"]), _cache_ttl(event["status"]))
+
+async def publish_job_status(
+    job_id: str,
+    status: str,
+    result: dict | None = None,
+    created_at: datetime.datetime | None = None
+):
+    """
+    Records a status transition: refreshes the status cache and announces it
+    to any API process streaming this job, in one round trip.
+    Best effort: a lost event only delays the client until its next read or reconnect.
+    If the cache write fails, the entry is dropped so reads fall back to Postgres.
+    """
+    event = status_event(job_id, status, result, created_at=created_at)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            queue_status_writes(pipe, [event])
+            pipe.publish(job_channel(job_id), json.dumps(event))
+            await pipe.execute()
+    except Exception as e:
+        logger.warning("job_status_publish_failed", job_id=str(job_id), status=status, error=str(e))
+        try:
+            await redis_client.delete(status_cache_key(job_id))
+        except Exception as e:
+            # Redis is unreachable: the short TTL of non-terminal entries bounds the staleness
+            logger.warning("job_status_cache_invalidate_failed", job_id=str(job_id), error=str(e))
+
+async def get_cached_job_status(job_id: str) -> dict | None:
+    """
+    The job's status from the Redis cache, or None on a miss (or if Redis is down).
+    """
+    try:
+        fields = await redis_client.hgetall(status_cache_key(job_id))
+    except Exception as e:
+        logger.warning("job_status_cache_read_failed", job_id=str(job_id), error=str(e))
+        fields = {}
+    # Entries without created_at can't answer a status read on their own
+    if not fields.get("status") or not fields.get("created_at"):
+        JOB_STATUS_CACHE_LOOKUPS.labels(result="miss").inc()
+        return None
+    JOB_STATUS_CACHE_LOOKUPS.labels(result="hit").inc()
+    return {
+        "job_id": str(job_id),
+        "status": fields["status"],
+        "result": json.loads(fields["result"]) if fields.get("result") else None,
+        "timestamp": fields["timestamp"],
+        "created_at": fields["created_at"]
+    }
+
+async def fill_job_status_cache(event: dict):
+    """
+    Read-through fill after a Postgres read. Skipped if the worker already wrote a newer status.
+    """
+    fields = _cache_fields(event)
+    args = [_cache_ttl(event["status"])]
+    for field, value in fields.items():
+        args.extend([field, value])
+    try:
+        await _fill(keys=[status_cache_key(event["job_id"])], args=args)
+    except Exception as e:
+        logger.warning("job_status_cache_write_failed", count=1, error=str(e))
+
+class JobStatusHub:
+    """
+    Fans job status events out to the streaming connections of this API process.
+
+    One pattern subscription per process (not one Redis connection per client):
+    every process sees every transition (a few small messages per job) and drops
+    the ones nobody here is watching.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self._subscribers[str(job_id)].add(queue)
+        JOB_EVENT_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(str(job_id))
+        if subscribers is None or queue not in subscribers:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[str(job_id)]
+        JOB_EVENT_SUBSCRIBERS.dec()
+
+    def dispatch(self, job_id: str, event: dict):
+        for queue in self._subscribers.get(str(job_id), ()):
+            if queue.full():
+                # Slow reader: only the latest status matters
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def listen(self):
+        """
+        Long-running task: reads the pattern subscription and dispatches locally.
+        """
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{JOB_EVENTS_CHANNEL}:*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    job_id = message["channel"].split(":", 1)[1]
+                    if job_id in self._subscribers:
+                        self.dispatch(job_id, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("job_status_listener_error", error=str(e))
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+job_status_hub = JobStatusHub()
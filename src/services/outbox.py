@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import random
+import time
+import httpx
+import structlog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+
+from src.core.config import settings
+from src.core.metrics import WEBHOOK_CIRCUIT_OPEN, WEBHOOK_DELIVERIES
+from src.db.models import WebhookDelivery
+from src.db.session import AsyncSessionLocal
+from src.services.webhook import WebhookService
+
+logger = structlog.get_logger()
+
+def add_webhook_delivery(db: AsyncSession, job_id: str, webhook_url: str | None, status: str, result: dict | None):
+    """
+    Queues the job's webhook in the caller's transaction (no-op without a webhook_url).
+    The caller commits, so the result and its delivery record land together.
+    """
+    if not webhook_url:
+        return
+    db.add(WebhookDelivery(
+        job_id=job_id,
+        url=webhook_url,
+        payload=WebhookService.build_payload(str(job_id), result, status)
+    ))
+
+def retry_delay(attempts: int) -> float:
+    """
+    Exponential backoff with full jitter, so a recovering endpoint isn't hit by a thundering herd.
+    """
+    ceiling = min(settings.WEBHOOK_RETRY_MAX_SECONDS, settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker: after N consecutive failures, stop calling the endpoint
+    for a while, then let a single probe through to see if it recovered.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def retry_at(self) -> float:
+        return (self.opened_at or time.monotonic()) + self.reset_seconds
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self._probing and time.monotonic() >= self.retry_at():
+            self._probing = True # Half-open: exactly one request decides
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+class WebhookDispatcher:
+    """
+    Drains the webhook outbox. Job slots never wait on hospital endpoints anymore.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED and leased by pushing
+    next_attempt_at WEBHOOK_DISPATCH_LEASE_SECONDS out, in one short transaction.
+    Any number of dispatchers (one per worker) can run side by side without
+    double-sending, and no transaction stays open while hospital endpoints answer.
+    A crash mid-batch just lets the lease run out; the rows are picked up again.
+    """
+
+    def __init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def _breaker_for(self, host: str) -> CircuitBreaker:
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(
+                settings.WEBHOOK_BREAKER_FAILURE_THRESHOLD,
+                settings.WEBHOOK_BREAKER_RESET_SECONDS
+            )
+        return self._breakers[host]
+
+    async def attempt(self, delivery: WebhookDelivery):
+        """
+        Tries one delivery and records the outcome on the row (the caller commits).
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        host = httpx.URL(delivery.url).host
+        breaker = self._breaker_for(host)
+
+        # 1. Endpoint is known to be down: push the row out without spending an attempt
+        if not breaker.allow():
+            wait_s = max(0.0, breaker.retry_at() - time.monotonic())
+            delivery.next_attempt_at = now + datetime.timedelta(seconds=wait_s)
+            WEBHOOK_DELIVERIES.labels(result="deferred").inc()
+            return
+
+        # 2. Single attempt; the retry schedule lives in the table, not in tenacity
+        try:
+            await WebhookService.deliver(delivery.url, delivery.payload)
+        except Exception as e:
+            breaker.record_failure()
+            delivery.attempts += 1
+            delivery.last_error = str(e)[:500]
+            if delivery.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                delivery.status = "DEAD"
+                WEBHOOK_DELIVERIES.labels(result="dead").inc()
+                logger.error("webhook_failed_all_retries", job_id=str(delivery.job_id), attempts=delivery.attempts, error=delivery.last_error)
+            else:
+                delivery.next_attempt_at = now + datetime.timedelta(seconds=retry_delay(delivery.attempts))
+                WEBHOOK_DELIVERIES.labels(result="retry").inc()
+                logger.warning("webhook_delivery_retry_scheduled", job_id=str(delivery.job_id), attempts=delivery.attempts, error=delivery.last_error)
+        else:
+            breaker.record_success()
+            delivery.attempts += 1
+            delivery.status = "DELIVERED"
+            delivery.delivered_at = now
+            delivery.last_error = None
+            WEBHOOK_DELIVERIES.labels(result="delivered").inc()
+            logger.info("webhook_delivery_success", job_id=str(delivery.job_id), attempts=delivery.attempts)
+        finally:
+            WEBHOOK_CIRCUIT_OPEN.labels(host=host).set(1 if breaker.is_open else 0)
+
+    async def dispatch_once(self) -> int:
+        """
+        Sends every due delivery in one batch (concurrently). Returns how many were due.
+        """
+        # 1. Claim: lock, lease, commit
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(WebhookDelivery)
+                .where(WebhookDelivery.status == "PENDING")
+                .where(WebhookDelivery.next_attempt_at <= func.now())
+                .order_by(WebhookDelivery.next_attempt_at)
+                .limit(settings.WEBHOOK_DISPATCH_BATCH)
+                .with_for_update(skip_locked=True)
+            )
+            deliveries = result.scalars().all()
+            if not deliveries:
+                return 0
+            lease_until = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+                seconds=settings.WEBHOOK_DISPATCH_LEASE_SECONDS
+            )
+            for delivery in deliveries:
+                delivery.next_attempt_at = lease_until
+            await db.commit()
+
+        # 2. Deliver with no connection checked out
+        await asyncio.gather(*(self.attempt(delivery) for delivery in deliveries))
+
+        # 3. Record the outcomes in a second short transaction
+        async with AsyncSessionLocal() as db:
+            for delivery in deliveries:
+                db.add(delivery)
+            await db.commit()
+        return len(deliveries)
+
+    async def run(self):
+        while True:
+            try:
+                due = await self.dispatch_once()
+            except Exception as e:
+                logger.error("webhook_dispatcher_error", error=str(e))
+                due = 0
+            # A full batch means there's probably more waiting
+            if due < settings.WEBHOOK_DISPATCH_BATCH:
+                await asyncio.sleep(settings.WEBHOOK_DISPATCH_INTERVAL_SECONDS)
@@ -1,5 +1,8 @@
 import json
+import time
 import structlog
+from dataclasses import dataclass
+from typing import Any, Callable
 from redis.asyncio import Redis
 from src.core.config import settings
 
@@ -13,24 +16,311 @@ redis_client = Redis(
 )
 
 QUEUE_NAME = "clinisandbox_jobs"
+# Jobs live in one list per (priority lane, model, client): f"{QUEUE_NAME}:{lane}:{model_key}:{client_id}".
+# SET of those lists that currently hold messages; the claim script removes emptied ones.
+QUEUES_KEY = f"{QUEUE_NAME}:queues"
+# ZSET job_id -> lease deadline (unix seconds) for every message a worker is holding
+INFLIGHT_KEY = f"{QUEUE_NAME}:inflight"
+# HASH job_id -> raw message, so an expired lease can be redelivered
+MESSAGES_KEY = f"{QUEUE_NAME}:messages"
+# LIST of messages that failed QUEUE_MAX_ATTEMPTS times
+DEAD_LETTER_KEY = f"{QUEUE_NAME}:dead"
+# LIST poked on every enqueue so idle workers can block instead of polling
+DOORBELL_KEY = f"{QUEUE_NAME}:doorbell"
+DOORBELL_MAX_LENGTH = 1000
+# ZSET f"{model_key}:{worker_id}" -> advertisement deadline: which worker holds which model warm
+WARM_MODELS_KEY = f"{QUEUE_NAME}:warm"
 
-async def enqueue_job(job_id: str, job_data: dict):
+# Reliable delivery
+# -----------------
+# A worker never just pops a message: the claim script moves it into INFLIGHT_KEY/MESSAGES_KEY
+# with a lease in the same atomic step. The worker renews the lease while the job runs and
+# acks it when done. If the worker dies, the lease expires and the reaper puts the message
+# back at the head of its queue with attempt+1 (or dead-letters it).
+
+# KEYS: inflight, messages, queue registry, queue_1..queue_n (in preference order)
+# ARGV: visibility timeout (s)
+_CLAIM_SCRIPT = """
+local now = redis.call('TIME')
+local deadline = tonumber(now[1]) + tonumber(now[2]) / 1000000 + tonumber(ARGV[1])
+for i = 4, #KEYS do
+    local raw = redis.call('RPOP', KEYS[i])
+    if raw then
+        if redis.call('LLEN', KEYS[i]) == 0 then
+            redis.call('SREM', KEYS[3], KEYS[i])
+        end
+        local msg = cjson.decode(raw)
+        if not msg['queue'] then
+            -- Older producers didn't record their queue; the reaper needs it
+            msg['queue'] = KEYS[i]
+            raw = cjson.encode(msg)
+        end
+        redis.call('ZADD', KEYS[1], deadline, msg['job_id'])
+        redis.call('HSET', KEYS[2], msg['job_id'], raw)
+        return raw
+    end
+end
+return false
+"""
+
+# KEYS: inflight, messages
+# ARGV: visibility timeout (s), then pairs of (job_id, raw message)
+# A lease is only touched if it still belongs to this exact delivery (same raw message).
+_EXTEND_SCRIPT = """
+local now = redis.call('TIME')
+local deadline = tonumber(now[1]) + tonumber(now[2]) / 1000000 + tonumber(ARGV[1])
+local extended = 0
+for i = 2, #ARGV, 2 do
+    if redis.call('HGET', KEYS[2], ARGV[i]) == ARGV[i + 1] then
+        redis.call('ZADD', KEYS[1], 'XX', deadline, ARGV[i])
+        extended = extended + 1
+    end
+end
+return extended
+"""
+
+# KEYS: inflight, messages
+# ARGV: job_id, raw message
+_ACK_SCRIPT = """
+if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# KEYS: inflight, messages, dead letter, doorbell, queue registry
+# ARGV: max attempts, batch limit
+# Note: the target queue comes from the message itself (fine on a single Redis node).
+_REAP_SCRIPT = """
+local now = redis.call('TIME')
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', tonumber(now[1]) + tonumber(now[2]) / 1000000, 'LIMIT', 0, tonumber(ARGV[2]))
+local requeued = {}
+local dead = {}
+for _, job_id in ipairs(expired) do
+    local raw = redis.call('HGET', KEYS[2], job_id)
+    redis.call('ZREM', KEYS[1], job_id)
+    redis.call('HDEL', KEYS[2], job_id)
+    if raw then
+        local msg = cjson.decode(raw)
+        msg['attempt'] = (tonumber(msg['attempt']) or 1) + 1
+        local new_raw = cjson.encode(msg)
+        if msg['attempt'] > tonumber(ARGV[1]) then
+            redis.call('LPUSH', KEYS[3], new_raw)
+            table.insert(dead, new_raw)
+        else
+            -- RPUSH = head of the line, the job already waited once
+            redis.call('RPUSH', msg['queue'], new_raw)
+            redis.call('SADD', KEYS[5], msg['queue'])
+            redis.call('LPUSH', KEYS[4], '1')
+            table.insert(requeued, new_raw)
+        end
+    end
+end
+return {requeued, dead}
+"""
+
+_claim = redis_client.register_script(_CLAIM_SCRIPT)
+_extend = redis_client.register_script(_EXTEND_SCRIPT)
+_ack = redis_client.register_script(_ACK_SCRIPT)
+_reap = redis_client.register_script(_REAP_SCRIPT)
+
+@dataclass
+class QueueMessage:
+    job_id: str
+    attempt: int
+    queue: str
+    raw: str # Exact payload as stored in Redis; identifies this delivery
+    enqueued_at: float | None = None
+
+    @classmethod
+    def parse(cls, raw: str) -> "QueueMessage":
+        data = json.loads(raw)
+        return cls(
+            job_id=data["job_id"],
+            attempt=int(data.get("attempt", 1)),
+            queue=data.get("queue", QUEUE_NAME),
+            raw=raw,
+            enqueued_at=data.get("enqueued_at")
+        )
+
+    @property
+    def lane(self) -> str:
+        return parse_queue_key(self.queue)[0]
+
+    @property
+    def model_key(self) -> str:
+        return parse_queue_key(self.queue)[1]
+
+def queue_key(lane: str, client_id: str, model_key: str = "") -> str:
+    return f"{QUEUE_NAME}:{lane}:{model_key}:{client_id}"
+
+def parse_queue_key(key: str) -> tuple[str, str, str]:
+    """
+    Returns (lane, model_key, client_id). Client ids may contain ':', lanes and model keys may not.
+    The bare legacy QUEUE_NAME list maps to the default lane.
+    """
+    parts = key.split(":", 3)
+    if len(parts) != 4 or parts[0] != QUEUE_NAME:
+        return settings.QUEUE_DEFAULT_LANE, "", ""
+    return parts[1], parts[2], parts[3]
+
+def route_job(job_data: dict) -> str:
+    """
+    Picks the queue for a job from its request data (priority lane + model + client).
+    Per-model queues let workers pull the models they already hold warm.
+    """
+    lane = job_data.get("priority") or settings.QUEUE_DEFAULT_LANE
+    if lane not in settings.QUEUE_LANE_WEIGHTS:
+        lane = settings.QUEUE_DEFAULT_LANE
+    return queue_key(lane, job_data.get("client_id") or "anonymous", job_data.get("target_model_key") or "")
+
+def build_message(job_id: str, queue: str = QUEUE_NAME) -> str:
+    return json.dumps({
+        "job_id": job_id,
+        "attempt": 1,
+        "queue": queue,
+        "enqueued_at": time.time()
+    })
+
+async def enqueue_job(job_id: str, job_data: dict, prepare: Callable[[Any], None] | None = None):
     """
     Pushes the job ID to the Redis List.
     We don't need to push the whole FHIR bundle to Redis (it's big).
     We just push the ID. The worker will fetch the data from Postgres.
-    
+
     However, for the 'Walking Skeleton', passing data might be easier.
     Let's stick to the 'Clean Arch' way: Pass ID only.
+    The request data only picks the queue (priority lane + client).
     """
-    
-    # Payload for the worker
-    message = {
-        "job_id": job_id,
-        "attempt": 1
-    }
-    
-    # LPUSH (Left Push) to the list
-    await redis_client.lpush(QUEUE_NAME, json.dumps(message))
-    
-    logger.info("job_enqueued", queue=QUEUE_NAME, job_id=job_id)
\ No newline at end of file
+    await enqueue_jobs([(job_id, job_data)], prepare)
+
+async def enqueue_jobs(jobs: list[tuple[str, dict]], prepare: Callable[[Any], None] | None = None):
+    """
+    Enqueues many (job_id, job_data) pairs in one round trip.
+    `prepare(pipe)` can add commands that must land BEFORE the jobs are visible
+    to workers (same MULTI, so same round trip).
+    """
+    if not jobs:
+        return
+
+    by_queue: dict[str, list[str]] = {}
+    for job_id, job_data in jobs:
+        queue = route_job(job_data)
+        by_queue.setdefault(queue, []).append(build_message(job_id, queue))
+
+    # MULTI/EXEC so the claim script never sees a message whose queue isn't registered
+    async with redis_client.pipeline(transaction=True) as pipe:
+        if prepare is not None:
+            prepare(pipe)
+        for queue, messages in by_queue.items():
+            # LPUSH (Left Push) to the list
+            pipe.lpush(queue, *messages)
+        pipe.sadd(QUEUES_KEY, *by_queue)
+        pipe.lpush(DOORBELL_KEY, *["1"] * len(jobs))
+        pipe.ltrim(DOORBELL_KEY, 0, DOORBELL_MAX_LENGTH - 1)
+        await pipe.execute()
+
+    logger.info("jobs_enqueued", queues=list(by_queue), count=len(jobs), job_ids=[job_id for job_id, _ in jobs[:10]])
+
+async def list_queues() -> list[str]:
+    """
+    Every queue that currently holds at least one message.
+    """
+    return list(await redis_client.smembers(QUEUES_KEY))
+
+async def queue_depths(queues: list[str]) -> dict[str, int]:
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for queue in queues:
+            pipe.llen(queue)
+        lengths = await pipe.execute()
+    return dict(zip(queues, lengths))
+
+async def advertise_warm_models(worker_id: str, models: set[str]):
+    """
+    Tells the fleet which models this worker can run without a cold start.
+    Entries expire unless re-advertised, so a dead worker stops attracting work.
+    """
+    now = time.time()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if models:
+            deadline = now + settings.QUEUE_AFFINITY_TTL_SECONDS
+            pipe.zadd(WARM_MODELS_KEY, {f"{model_key}:{worker_id}": deadline for model_key in models})
+        pipe.zremrangebyscore(WARM_MODELS_KEY, "-inf", now)
+        await pipe.execute()
+
+async def withdraw_warm_models(worker_id: str, models: set[str]):
+    if models:
+        await redis_client.zrem(WARM_MODELS_KEY, *[f"{model_key}:{worker_id}" for model_key in models])
+
+async def warm_models_elsewhere(worker_id: str) -> set[str]:
+    """
+    Models that at least one OTHER live worker holds warm.
+    """
+    members = await redis_client.zrangebyscore(WARM_MODELS_KEY, time.time(), "+inf")
+    models = set()
+    for member in members:
+        model_key, _, owner = member.partition(":")
+        if owner != worker_id:
+            models.add(model_key)
+    return models
+
+async def claim_job(queues: list[str] | None = None, include_legacy: bool = True) -> QueueMessage | None:
+    """
+    Atomically pops the next message (first non-empty queue wins) and leases it
+    for QUEUE_VISIBILITY_TIMEOUT_SECONDS. Never blocks.
+    The bare QUEUE_NAME list is tried last (unless include_legacy=False) so messages
+    from older producers drain.
+    """
+    legacy = [QUEUE_NAME] if include_legacy else []
+    raw = await _claim(
+        keys=[INFLIGHT_KEY, MESSAGES_KEY, QUEUES_KEY, *(queues or []), *legacy],
+        args=[settings.QUEUE_VISIBILITY_TIMEOUT_SECONDS]
+    )
+    return QueueMessage.parse(raw) if raw else None
+
+async def wait_for_jobs(timeout: int = 1):
+    """
+    Blocks until something is enqueued (or the timeout passes).
+    Wake-ups can be stale; callers just try to claim again.
+    """
+    await redis_client.brpop(DOORBELL_KEY, timeout=timeout)
+
+async def extend_leases(messages: list[QueueMessage]) -> int:
+    """
+    Pushes the lease deadline out for messages this worker is still running.
+    """
+    if not messages:
+        return 0
+    args = [settings.QUEUE_VISIBILITY_TIMEOUT_SECONDS]
+    for message in messages:
+        args.extend([message.job_id, message.raw])
+    return await _extend(keys=[INFLIGHT_KEY, MESSAGES_KEY], args=args)
+
+async def ack_job(message: QueueMessage) -> bool:
+    """
+    Marks a delivery as done. Returns False if the lease had already expired
+    (the job was redelivered and someone else owns it now).
+    """
+    acked = await _ack(keys=[INFLIGHT_KEY, MESSAGES_KEY], args=[message.job_id, message.raw])
+    if not acked:
+        logger.warning("queue_ack_lost_lease", job_id=message.job_id, attempt=message.attempt)
+    return bool(acked)
+
+async def requeue_expired_jobs(limit: int = 100) -> tuple[list[QueueMessage], list[QueueMessage]]:
+    """
+    Redelivers messages whose lease expired. Returns (requeued, dead_lettered).
+    Safe to run from every worker at once.
+    """
+    requeued, dead = await _reap(
+        keys=[INFLIGHT_KEY, MESSAGES_KEY, DEAD_LETTER_KEY, DOORBELL_KEY, QUEUES_KEY],
+        args=[settings.QUEUE_MAX_ATTEMPTS, limit]
+    )
+    requeued = [QueueMessage.parse(raw) for raw in requeued]
+    dead = [QueueMessage.parse(raw) for raw in dead]
+    for message in requeued:
+        logger.warning("queue_job_redelivered", job_id=message.job_id, attempt=message.attempt)
+    for message in dead:
+        logger.error("queue_job_dead_lettered", job_id=message.job_id, attempt=message.attempt)
+    return requeued, dead
@@ -0,0 +1,130 @@
+import asyncio
+import time
+import structlog
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.core.metrics import REGISTRY_CACHE_LOOKUPS
+from src.db.models import DiagnosticModel
+from src.schemas.manifest import ModelManifest, LOINCRequirement
+from src.services.queue import redis_client
+
+logger = structlog.get_logger()
+
+# Publish a model key here (or "*" for everything) after changing diagnostic_models
+INVALIDATION_CHANNEL = "clinisandbox_registry_invalidate"
+
+class ManifestError(Exception):
+    """
+    The registry row exists but its requirements JSON can't be turned into a manifest.
+    """
+    pass
+
+@dataclass
+class _CacheEntry:
+    manifest: ModelManifest
+    expires_at: float
+
+class ModelRegistryCache:
+    """
+    Process-local cache of pre-built ModelManifests, keyed by target diagnosis.
+    Entries expire after REGISTRY_CACHE_TTL_SECONDS, or earlier when an
+    invalidation arrives on the Redis channel.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None):
+        self.ttl_seconds = settings.REGISTRY_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries: dict[str, _CacheEntry] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def get_manifest(self, db: AsyncSession, target_diagnosis: str) -> ModelManifest | None:
+        """
+        Returns the manifest of the most accurate model for this target,
+        or None if no model is registered.
+        """
+        entry = self._entries.get(target_diagnosis)
+        if entry and entry.expires_at > time.monotonic():
+            REGISTRY_CACHE_LOOKUPS.labels(result="hit").inc()
+            return entry.manifest
+
+        # One DB lookup per key, even if many requests miss at the same time
+        lock = self._locks.setdefault(target_diagnosis, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(target_diagnosis)
+            if entry and entry.expires_at > time.monotonic():
+                REGISTRY_CACHE_LOOKUPS.labels(result="hit").inc()
+                return entry.manifest
+
+            REGISTRY_CACHE_LOOKUPS.labels(result="miss").inc()
+            manifest = await self._load_manifest(db, target_diagnosis)
+            # Unknown targets are not cached, so a newly seeded model is picked up at once
+            if manifest is not None:
+                self._entries[target_diagnosis] = _CacheEntry(manifest, time.monotonic() + self.ttl_seconds)
+            return manifest
+
+    def invalidate(self, target_diagnosis: str | None = None):
+        if target_diagnosis is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(target_diagnosis, None)
+        logger.info("registry_cache_invalidated", target=target_diagnosis or "*")
+
+    async def _load_manifest(self, db: AsyncSession, target_diagnosis: str) -> ModelManifest | None:
+        # We look for the model with the highest accuracy for this target
+        stmt = (
+            select(DiagnosticModel)
+            .where(DiagnosticModel.key == target_diagnosis)
+            .order_by(DiagnosticModel.accuracy.desc())
+        )
+        result = await db.execute(stmt)
+        model_record = result.scalars().first()
+
+        if not model_record:
+            return None
+
+        # Convert DB JSONB to Pydantic Manifest
+        try:
+            reqs = [LOINCRequirement(**req) for req in model_record.required_fhir_resources.get("required_observations", [])]
+
+            return ModelManifest(
+                target_diagnosis=model_record.key,
+                minimum_accuracy=model_record.accuracy,
+                model_version=model_record.version,
+                required_observations=reqs
+            )
+        except Exception as e:
+            logger.error("corrupt_model_manifest", model_id=str(model_record.id), error=str(e))
+            raise ManifestError(str(e))
+
+    async def listen_for_invalidations(self):
+        """
+        Long-running task: drops cache entries when someone publishes a model change.
+        """
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # We may have missed messages while disconnected
+                self.invalidate()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    key = message["data"]
+                    self.invalidate(None if key in ("", "*") else key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("registry_invalidation_listener_error", error=str(e))
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+async def publish_registry_change(target_diagnosis: str | None = None):
+    """
+    Tells every API and worker process to drop its cached manifest for this target (or all).
+    """
+    await redis_client.publish(INVALIDATION_CHANNEL, target_diagnosis or "*")
+
+model_registry = ModelRegistryCache()
@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import structlog
+from typing import Any, Dict
+
+from src.core.config import settings
+from src.core.metrics import RESULT_CACHE_COALESCED, RESULT_CACHE_EVICTIONS, RESULT_CACHE_LOOKUPS
+from src.core.security import DataEncryption
+from src.schemas.manifest import ModelManifest
+from src.services.queue import redis_client
+
+logger = structlog.get_logger()
+
+# Content-addressed inference results
+# -----------------------------------
+# STRING f"{RESULT_CACHE_PREFIX}:{digest}" -> base64 of the encrypted result JSON (TTL)
+# ZSET RESULT_LRU_KEY digest -> last use; trimmed to RESULT_CACHE_MAX_ENTRIES, least recent first
+# STRING f"{RESULT_INFLIGHT_PREFIX}:{digest}" -> job_id of the one job computing it right now
+RESULT_CACHE_PREFIX = "clinisandbox_result"
+RESULT_LRU_KEY = f"{RESULT_CACHE_PREFIX}:lru"
+RESULT_INFLIGHT_PREFIX = f"{RESULT_CACHE_PREFIX}:inflight"
+
+# Compare-and-delete, so a job never drops another job's in-flight marker
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release = redis_client.register_script(_RELEASE_SCRIPT)
+
+# Fields of an Observation that carry the measurement itself
+_OBSERVATION_FIELDS = ("component", "effectiveDateTime", "effectivePeriod", "effectiveInstant")
+
+def relevant_subset(bundle: Dict[str, Any], manifest: ModelManifest) -> Dict[str, Any]:
+    """
+    The part of a bundle the model reads: observations for the manifest's LOINC codes
+    (values, components, effective time) and the patient's sex and birth date.
+    Ids, narrative, metadata and entry order don't change the key.
+    """
+    wanted = {req.code for req in manifest.required_observations}
+    observations, patients = [], []
+    for entry in bundle.get("entry") or []:
+        resource = entry.get("resource") if isinstance(entry, dict) else None
+        if not isinstance(resource, dict):
+            continue
+        if resource.get("resourceType") == "Patient":
+            patients.append({"gender": resource.get("gender"), "birthDate": resource.get("birthDate")})
+            continue
+        if resource.get("resourceType") != "Observation":
+            continue
+        codings = (resource.get("code") or {}).get("coding") or []
+        codes = sorted(
+            coding["code"] for coding in codings
+            if isinstance(coding, dict) and "loinc.org" in str(coding.get("system", "")) and coding.get("code") in wanted
+        )
+        if not codes:
+            continue
+        observation = {"codes": codes}
+        for field, value in resource.items():
+            if field.startswith("value") or field in _OBSERVATION_FIELDS:
+                observation[field] = value
+        observations.append(observation)
+
+    canonical = lambda item: json.dumps(item, sort_keys=True, separators=(",", ":"))
+    return {
+        "observations": sorted(observations, key=canonical),
+        "patients": sorted(patients, key=canonical),
+    }
+
+def cache_key(manifest: ModelManifest, bundle: Dict[str, Any]) -> str:
+    """
+    sha256 of (model key, model version, canonical relevant subset).
+    A new model version never sees an older version's results.
+    """
+    document = {
+        "model": manifest.target_diagnosis,
+        "version": manifest.model_version,
+        "input": relevant_subset(bundle, manifest),
+    }
+    return hashlib.sha256(json.dumps(document, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def _result_key(digest: str) -> str:
+    return f"{RESULT_CACHE_PREFIX}:{digest}"
+
+def _inflight_key(digest: str) -> str:
+    return f"{RESULT_INFLIGHT_PREFIX}:{digest}"
+
+async def get_cached_result(digest: str, where: str) -> Dict[str, Any] | None:
+    """
+    The cached result for this key (and marks it recently used), or None.
+    `where` labels the metrics: "api" or "worker".
+    """
+    try:
+        raw = await redis_client.get(_result_key(digest))
+        if raw is None:
+            RESULT_CACHE_LOOKUPS.labels(where=where, result="miss").inc()
+            return None
+        await redis_client.zadd(RESULT_LRU_KEY, {digest: time.time()})
+        result = json.loads(DataEncryption.decrypt_bytes(base64.b64decode(raw)))
+    except Exception as e:
+        # A cache problem must never fail a job; it just runs the model
+        logger.warning("result_cache_read_failed", error=str(e))
+        RESULT_CACHE_LOOKUPS.labels(where=where, result="error").inc()
+        return None
+    RESULT_CACHE_LOOKUPS.labels(where=where, result="hit").inc()
+    return result
+
+async def store_result(digest: str, result: Dict[str, Any]):
+    """
+    Caches a COMPLETED result (encrypted) and evicts the least recently used entries
+    beyond RESULT_CACHE_MAX_ENTRIES.
+    """
+    token = DataEncryption.encrypt_bytes(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(_result_key(digest), base64.b64encode(token).decode("ascii"), ex=int(settings.RESULT_CACHE_TTL_SECONDS))
+            pipe.zadd(RESULT_LRU_KEY, {digest: time.time()})
+            # Entries that simply expired are dropped from the index as well
+            pipe.zremrangebyscore(RESULT_LRU_KEY, "-inf", time.time() - settings.RESULT_CACHE_TTL_SECONDS)
+            pipe.zcard(RESULT_LRU_KEY)
+            size = (await pipe.execute())[-1]
+
+        excess = size - settings.RESULT_CACHE_MAX_ENTRIES
+        if excess > 0:
+            evicted = [member for member, _ in await redis_client.zpopmin(RESULT_LRU_KEY, excess)]
+            if evicted:
+                await redis_client.delete(*[_result_key(member) for member in evicted])
+                RESULT_CACHE_EVICTIONS.inc(len(evicted))
+    except Exception as e:
+        logger.warning("result_cache_write_failed", error=str(e))
+
+async def claim_execution(digest: str, job_id: str) -> bool:
+    """
+    True if this job should run the model; False if an identical job already is.
+    The marker expires on its own if its job dies.
+    """
+    return bool(await redis_client.set(
+        _inflight_key(digest), job_id, nx=True, ex=int(settings.RESULT_CACHE_INFLIGHT_TTL_SECONDS)
+    ))
+
+async def release_execution(digest: str, job_id: str):
+    await _release(keys=[_inflight_key(digest)], args=[job_id])
+
+async def wait_for_result(digest: str, timeout: float) -> Dict[str, Any] | None:
+    """
+    Waits for the identical in-flight job to publish its result.
+    None if it failed, vanished or took longer than `timeout`; the caller then runs the model itself.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.RESULT_CACHE_POLL_SECONDS)
+        # Read the marker first: the owner stores the result BEFORE releasing it
+        running = await redis_client.exists(_inflight_key(digest))
+        raw = await redis_client.get(_result_key(digest))
+        if raw is not None:
+            RESULT_CACHE_COALESCED.inc()
+            return json.loads(DataEncryption.decrypt_bytes(base64.b64decode(raw)))
+        if not running:
+            return None
+    return None
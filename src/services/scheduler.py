@@ -0,0 +1,143 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+
+import structlog
+
+from src.core.config import settings
+from src.core.metrics import QUEUE_AFFINITY_CLAIMS
+from src.services.queue import (
+    advertise_warm_models,
+    parse_queue_key,
+    warm_models_elsewhere,
+    withdraw_warm_models,
+)
+from src.services.virtualization.base import VMBackend
+
+logger = structlog.get_logger()
+
+class SmoothWeightedRoundRobin:
+    """
+    nginx-style smooth WRR: with weights {a: 5, b: 1}, 'a' is picked 5 times out of 6
+    but never 5 times in a row, so the light item's wait stays bounded.
+    """
+
+    def __init__(self):
+        self._current: dict[str, int] = defaultdict(int)
+
+    def pick(self, weights: dict[str, int]) -> str:
+        total = sum(weights.values())
+        for item, weight in weights.items():
+            self._current[item] += weight
+        best = max(weights, key=lambda item: (self._current[item], weights[item]))
+        self._current[best] -= total
+        return best
+
+class FairScheduler:
+    """
+    Orders the non-empty queues a worker should try, most deserving first:
+
+    1. Priority lanes share the worker by QUEUE_LANE_WEIGHTS, so a batch backlog
+       can slow an interactive lane down by at most its weight share.
+    2. Inside a lane, model affinity (when `warm` is given): queues of models this
+       worker holds warm first, then models no other worker holds warm, and only
+       then models that are warm elsewhere (stealing). Lanes still beat affinity.
+    3. Inside that, clients share by QUEUE_CLIENT_WEIGHTS (default 1 each),
+       so one client's 5,000-job sweep doesn't starve another client's requests.
+
+    The claim script pops from the first queue that still has a message,
+    so the fallbacks after the first entry only matter under races and when
+    a worker's own warm queues are empty.
+    """
+
+    def __init__(self, lane_weights: dict[str, int] | None = None, client_weights: dict[str, int] | None = None):
+        self.lane_weights = lane_weights if lane_weights is not None else settings.QUEUE_LANE_WEIGHTS
+        self.client_weights = client_weights if client_weights is not None else settings.QUEUE_CLIENT_WEIGHTS
+        self._lanes = SmoothWeightedRoundRobin()
+        self._clients: dict[tuple[str, int], SmoothWeightedRoundRobin] = defaultdict(SmoothWeightedRoundRobin)
+
+    @staticmethod
+    def affinity_tier(model_key: str, warm: set[str] | None, warm_elsewhere: set[str] | None) -> int:
+        """
+        0 = warm here, 1 = cold everywhere, 2 = warm on another worker (leave it to them).
+        """
+        if warm is None or model_key in warm:
+            return 0
+        if warm_elsewhere and model_key in warm_elsewhere:
+            return 2
+        return 1
+
+    def order(
+        self,
+        queues: list[str],
+        warm: set[str] | None = None,
+        warm_elsewhere: set[str] | None = None
+    ) -> list[str]:
+        # lane -> affinity tier -> client -> queues
+        by_lane: dict[str, dict[int, dict[str, list[str]]]] = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        for queue in queues:
+            lane, model_key, client_id = parse_queue_key(queue)
+            by_lane[lane][self.affinity_tier(model_key, warm, warm_elsewhere)][client_id].append(queue)
+        if not by_lane:
+            return []
+
+        lane_weights = {lane: max(1, self.lane_weights.get(lane, 1)) for lane in by_lane}
+        first_lane = self._lanes.pick(lane_weights)
+        lanes = [first_lane] + sorted(
+            (lane for lane in by_lane if lane != first_lane),
+            key=lambda lane: -lane_weights[lane]
+        )
+
+        ordered = []
+        for lane in lanes:
+            for tier, clients in sorted(by_lane[lane].items()):
+                client_weights = {client_id: max(1, self.client_weights.get(client_id, 1)) for client_id in clients}
+                first_client = self._clients[(lane, tier)].pick(client_weights)
+                ordered.extend(sorted(clients[first_client]))
+                for client_id, client_queues in sorted(clients.items()):
+                    if client_id != first_client:
+                        ordered.extend(sorted(client_queues))
+        return ordered
+
+class ModelAffinity:
+    """
+    Tracks which models this worker holds warm (backend pool + the models it just ran)
+    and which ones other workers advertise, and keeps our own advertisement alive.
+    """
+
+    def __init__(self, worker_id: str, vm_backend: VMBackend):
+        self.worker_id = worker_id
+        self.vm_backend = vm_backend
+        self.recent: OrderedDict[str, None] = OrderedDict()
+        self.elsewhere: set[str] = set()
+        self._advertised: set[str] = set()
+
+    def warm(self) -> set[str]:
+        return self.vm_backend.warm_models() | set(self.recent)
+
+    def record_run(self, model_key: str):
+        if not model_key or settings.WORKER_AFFINITY_RECENT_MODELS <= 0:
+            return
+        self.recent[model_key] = None
+        self.recent.move_to_end(model_key)
+        while len(self.recent) > settings.WORKER_AFFINITY_RECENT_MODELS:
+            self.recent.popitem(last=False)
+
+    def record_claim(self, model_key: str):
+        tier = FairScheduler.affinity_tier(model_key, self.warm(), self.elsewhere)
+        QUEUE_AFFINITY_CLAIMS.labels(result=("warm", "cold", "stolen")[tier]).inc()
+
+    async def refresh(self):
+        self._advertised = self.warm()
+        await advertise_warm_models(self.worker_id, self._advertised)
+        self.elsewhere = await warm_models_elsewhere(self.worker_id)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("queue_affinity_refresh_failed", error=str(e))
+            await asyncio.sleep(settings.QUEUE_AFFINITY_HEARTBEAT_SECONDS)
+
+    async def withdraw(self):
+        await withdraw_warm_models(self.worker_id, self._advertised)
@@ -1,7 +1,45 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any
 
+def batch_input(model_key: str, inputs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    What a batch-capable guest reads: every job's bundle, tagged with its job id.
+    """
+    return {
+        "model": model_key,
+        "jobs": [{"job_id": job_id, "input": data} for job_id, data in inputs.items()]
+    }
+
+def split_batch_output(job_ids: list[str], output: Dict[str, Any]) -> Dict[str, Dict[str, Any] | Exception]:
+    """
+    Maps the guest's {"results": {job_id: result}} back onto the jobs.
+    A job the guest didn't answer for fails on its own; the rest of the batch stands.
+    """
+    results = output.get("results") or {}
+    return {
+        job_id: results[job_id] if job_id in results else RuntimeError("No result for job in batch output")
+        for job_id in job_ids
+    }
+
 class VMBackend(ABC):
+    async def startup(self):
+        """
+        Called once when the worker starts (e.g. to warm a VM pool).
+        """
+        pass
+
+    async def shutdown(self):
+        """
+        Called once when the worker stops, after in-flight jobs have drained.
+        """
+        pass
+
+    def warm_models(self) -> set[str]:
+        """
+        Models this backend can start without a cold path (e.g. pooled VMs), for queue affinity.
+        """
+        return set()
+
     @abstractmethod
     async def prepare_resources(self, job_id: str, model_path: str, input_data: Dict[str, Any]) -> str:
         pass
@@ -12,4 +50,24 @@ class VMBackend(ABC):
 
     @abstractmethod
     async def cleanup(self, job_id: str, resource_id: str):
-        pass
\ No newline at end of file
+        pass
+
+    async def run_batch_inference(
+        self,
+        model_key: str,
+        inputs: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any] | Exception]:
+        """
+        Runs several jobs for one model. Returns job_id -> result, or the exception that job failed with.
+        Default: one prepare/run/cleanup cycle per job; backends override it to share one VM.
+        """
+        results: Dict[str, Dict[str, Any] | Exception] = {}
+        for job_id, data in inputs.items():
+            resource = await self.prepare_resources(job_id, model_key, data)
+            try:
+                results[job_id] = await self.run_inference(job_id, resource)
+            except Exception as e:
+                results[job_id] = e
+            finally:
+                await self.cleanup(job_id, resource)
+        return results
\ No newline at end of file
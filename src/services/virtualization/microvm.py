@@ -0,0 +1,165 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import httpx
+import structlog
+from typing import Any, Dict
+
+from src.core.config import settings
+from src.services.virtualization import vsock
+
+logger = structlog.get_logger()
+
+# Relative to the Firecracker process's cwd (its work dir). The path is baked into
+# snapshots, so it must not name a specific VM's directory.
+VSOCK_UDS_NAME = "vsock.sock"
+
+class MicroVM:
+    """
+    Thin wrapper around ONE Firecracker process and its API socket.
+    Knows how to boot, pause/resume, snapshot/restore and destroy itself,
+    and talks to the guest agent over virtio-vsock.
+    """
+
+    def __init__(self, vm_id: str, model_key: str, work_dir: str):
+        self.vm_id = vm_id
+        self.model_key = model_key
+        self.work_dir = work_dir
+        self.socket_path = f"{work_dir}/firecracker.socket"
+        self.vsock_path = f"{work_dir}/{VSOCK_UDS_NAME}"
+        self.log_path = f"{work_dir}/firecracker.log"
+        self.process: subprocess.Popen | None = None
+        self._log_file = None
+        self._client: httpx.AsyncClient | None = None
+
+    async def spawn(self):
+        """
+        Starts the Firecracker process and waits for its API socket.
+        """
+        os.makedirs(self.work_dir, exist_ok=True)
+        # In Prod, we would use the 'Jailer' binary here for isolation.
+        cmd = [settings.FC_BINARY_PATH, "--api-sock", self.socket_path]
+        logger.info("vm_spawning_process", vm_id=self.vm_id, cmd=cmd)
+
+        # Serial console + VMM output go to a file in the work dir (removed with the VM).
+        # A pipe nobody reads would fill up and block a long-lived pooled VM.
+        self._log_file = open(self.log_path, "ab")
+        try:
+            self.process = subprocess.Popen(cmd, cwd=self.work_dir, stdout=self._log_file, stderr=subprocess.STDOUT)
+        except FileNotFoundError:
+            self._log_file.close()
+            self._log_file = None
+            # Fallback for Dev environments checking the code
+            logger.error("firecracker_binary_missing", hint="Are you on Linux?")
+            raise RuntimeError("Firecracker binary not found. Cannot run Real VM.")
+
+        transport = httpx.AsyncHTTPTransport(uds=self.socket_path)
+        self._client = httpx.AsyncClient(transport=transport, base_url="http://localhost")
+        for _ in range(10): # Try for 1 second
+            try:
+                await self._client.get("/")
+                return
+            except httpx.ConnectError:
+                await asyncio.sleep(0.1)
+
+        await self.destroy()
+        raise TimeoutError("Firecracker API socket did not appear.")
+
+    async def _api(self, method: str, path: str, body: dict):
+        response = await self._client.request(method, path, json=body)
+        response.raise_for_status()
+
+    async def boot(self):
+        """
+        Configures kernel, rootfs and vsock device and cold-boots the guest.
+        """
+        # 1. Boot Source (The Kernel)
+        await self._api("PUT", "/boot-source", {
+            "kernel_image_path": settings.FC_KERNEL_PATH,
+            "boot_args": "console=ttyS0 reboot=k panic=1 pci=off"
+        })
+
+        # 2. Drive 1: The OS (Read Only)
+        await self._api("PUT", "/drives/rootfs", {
+            "drive_id": "rootfs",
+            "path_on_host": settings.FC_ROOTFS_PATH,
+            "is_root_device": True,
+            "is_read_only": True
+        })
+
+        # 3. Data plane: virtio-vsock, exposed on the host as a UDS in the work dir.
+        # Inputs and results travel over it; no per-job files or drives.
+        await self._api("PUT", "/vsock", {
+            "guest_cid": settings.FC_VSOCK_GUEST_CID,
+            "uds_path": VSOCK_UDS_NAME
+        })
+
+        # 4. Action: InstanceStart
+        logger.info("vm_booting", vm_id=self.vm_id, model=self.model_key)
+        await self._api("PUT", "/actions", {"action_type": "InstanceStart"})
+
+    async def pause(self):
+        await self._api("PATCH", "/vm", {"state": "Paused"})
+
+    async def resume(self):
+        await self._api("PATCH", "/vm", {"state": "Resumed"})
+
+    async def exchange(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """
+        Sends one framed request to the guest agent and waits for its framed reply.
+        The VM must be running.
+        """
+        return await vsock.exchange(
+            self.vsock_path,
+            settings.FC_VSOCK_PORT,
+            message,
+            timeout=timeout,
+            max_frame_bytes=settings.FC_VSOCK_MAX_FRAME_BYTES,
+            retry_seconds=settings.FC_VSOCK_CONNECT_RETRY_SECONDS
+        )
+
+    async def wait_until_ready(self, timeout: float):
+        """
+        Blocks until the guest agent answers a ping over vsock, i.e. the kernel is up
+        and the agent listens. InstanceStart returning only means Firecracker began booting.
+        """
+        reply = await self.exchange({"ping": True}, timeout=timeout)
+        if not reply.get("pong"):
+            raise RuntimeError(f"Guest agent answered the readiness ping with {reply!r}")
+
+    async def create_snapshot(self, snapshot_path: str, mem_path: str):
+        """
+        Writes a full snapshot. The VM must be paused.
+        """
+        await self._api("PUT", "/snapshot/create", {
+            "snapshot_type": "Full",
+            "snapshot_path": snapshot_path,
+            "mem_file_path": mem_path
+        })
+
+    async def load_snapshot(self, snapshot_path: str, mem_path: str):
+        """
+        Restores a freshly spawned process from a snapshot. The VM stays paused.
+        """
+        await self._api("PUT", "/snapshot/load", {
+            "snapshot_path": snapshot_path,
+            "mem_backend": {"backend_type": "File", "backend_path": mem_path},
+            "resume_vm": False
+        })
+
+    async def destroy(self):
+        """
+        Kills the process and wipes the work dir. A VM is never reused across jobs.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            await asyncio.to_thread(self.process.wait)
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        logger.info("vm_destroyed", vm_id=self.vm_id, model=self.model_key)
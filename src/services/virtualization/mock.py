@@ -4,7 +4,7 @@ import os
 import tempfile
 import structlog
 from typing import Dict, Any
-from src.services.virtualization.base import VMBackend
+from src.services.virtualization.base import VMBackend, batch_input, split_batch_output
 
 logger = structlog.get_logger()
 
@@ -33,4 +33,18 @@ class MockVMBackend(VMBackend):
 
     async def cleanup(self, job_id: str, resource_path: str):
         if os.path.exists(resource_path):
-            os.remove(resource_path)
\ No newline at end of file
+            os.remove(resource_path)
+
+    async def run_batch_inference(self, model_key: str, inputs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        # One input file and one "VM run" for the whole batch
+        path = await self.prepare_resources(f"batch_{len(inputs)}", model_key, batch_input(model_key, inputs))
+        try:
+            logger.info("vm_mock_batch_start", model=model_key, size=len(inputs))
+            await asyncio.sleep(2.0)
+            output = {"results": {
+                job_id: {"diagnosis": "POSITIVE", "confidence": 0.98, "backend": "DOCKER_MOCK", "batch_size": len(inputs)}
+                for job_id in inputs
+            }}
+        finally:
+            await self.cleanup("batch", path)
+        return split_batch_output(list(inputs), output)
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+import uuid
+import structlog
+
+from src.core.config import settings
+from src.core.metrics import VM_POOL_ACQUIRE_SECONDS, VM_POOL_ACQUIRES, VM_POOL_IDLE
+from src.services.virtualization.microvm import MicroVM
+
+logger = structlog.get_logger()
+
+class MicroVMPool:
+    """
+    Keeps FC_POOL_SIZE booted-and-paused MicroVMs per model so a job only pays
+    for "resume + send input over vsock" instead of a cold boot.
+
+    - Warm VMs come from a per-model Firecracker snapshot when one exists,
+      otherwise from a cold boot (which then writes the snapshot for next time).
+    - A VM serves exactly one job and is destroyed afterwards (patient isolation);
+      a background task tops the pool back up at FC_POOL_REFILL_BATCH VMs per tick.
+    - An empty pool never blocks a job: acquire() falls back to a cold boot.
+    """
+
+    def __init__(self, size: int | None = None):
+        self.size = settings.FC_POOL_SIZE if size is None else size
+        self._idle: dict[str, asyncio.Queue] = {}
+        self._models: set[str] = set(settings.FC_POOL_MODELS)
+        self._snapshot_locks: dict[str, asyncio.Lock] = {}
+        self._refill_task: asyncio.Task | None = None
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        if self.size <= 0:
+            logger.info("vm_pool_disabled")
+            return
+
+        if settings.FC_POOL_WARMUP_ON_START:
+            await asyncio.gather(*(self._warm_up(model) for model in self._models))
+
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        logger.info("vm_pool_started", size=self.size, models=sorted(self._models))
+
+    async def shutdown(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+
+        for model_key, idle in self._idle.items():
+            while not idle.empty():
+                await idle.get_nowait().destroy()
+            VM_POOL_IDLE.labels(model=model_key).set(0)
+        logger.info("vm_pool_stopped")
+
+    def warm_models(self) -> set[str]:
+        """
+        Models with a paused VM ready, or kept topped up by the refill loop.
+        """
+        warm = {model_key for model_key, idle in self._idle.items() if not idle.empty()}
+        if self.size > 0:
+            warm |= self._models
+        return warm
+
+    # --- Job API ---
+
+    async def acquire(self, model_key: str) -> MicroVM:
+        """
+        Returns a paused VM for this model, warm if possible.
+        """
+        start_time = time.perf_counter()
+        self._models.add(model_key)
+        idle = self._idle_queue(model_key)
+
+        while not idle.empty():
+            vm = idle.get_nowait()
+            VM_POOL_IDLE.labels(model=model_key).set(idle.qsize())
+            if vm.process is not None and vm.process.poll() is None:
+                VM_POOL_ACQUIRES.labels(model=model_key, result="hit").inc()
+                VM_POOL_ACQUIRE_SECONDS.labels(result="hit").observe(time.perf_counter() - start_time)
+                return vm
+            # The process died while parked in the pool
+            logger.warning("vm_pool_dead_vm_discarded", vm_id=vm.vm_id, model=model_key)
+            await vm.destroy()
+
+        vm = await self._boot_vm(model_key)
+        VM_POOL_ACQUIRES.labels(model=model_key, result="miss").inc()
+        VM_POOL_ACQUIRE_SECONDS.labels(result="miss").observe(time.perf_counter() - start_time)
+        return vm
+
+    async def release(self, vm: MicroVM):
+        """
+        Destroys a used VM. The refill loop replaces it.
+        """
+        await vm.destroy()
+
+    # --- Internals ---
+
+    def _idle_queue(self, model_key: str) -> asyncio.Queue:
+        if model_key not in self._idle:
+            self._idle[model_key] = asyncio.Queue()
+        return self._idle[model_key]
+
+    def _model_dir(self, model_key: str) -> str:
+        return os.path.join(settings.FC_SNAPSHOT_DIR, model_key)
+
+    def _snapshot_paths(self, model_key: str) -> tuple[str, str]:
+        # The device layout is part of the snapshot: the name changes with it,
+        # so snapshots from the input-drive layout are never restored
+        model_dir = self._model_dir(model_key)
+        return os.path.join(model_dir, "vm-vsock.snap"), os.path.join(model_dir, "vm-vsock.mem")
+
+    async def _boot_vm(self, model_key: str) -> MicroVM:
+        vm_id = uuid.uuid4().hex[:12]
+        vm = MicroVM(vm_id, model_key, os.path.join(settings.FC_WORK_DIR, "vms", vm_id))
+        await vm.spawn()
+        try:
+            snapshot_path, mem_path = self._snapshot_paths(model_key)
+            if settings.FC_USE_SNAPSHOTS and os.path.exists(snapshot_path) and os.path.exists(mem_path):
+                await vm.load_snapshot(snapshot_path, mem_path)
+                logger.info("vm_restored_from_snapshot", vm_id=vm_id, model=model_key)
+            else:
+                await vm.boot()
+                # Pause (and snapshot) only a fully booted guest, so a resume goes straight to work.
+                # A guest that never comes up is destroyed below.
+                await vm.wait_until_ready(settings.FC_GUEST_READY_TIMEOUT_SECONDS)
+                await vm.pause()
+                if settings.FC_USE_SNAPSHOTS:
+                    await self._save_snapshot(vm, model_key)
+        except Exception:
+            await vm.destroy()
+            raise
+        return vm
+
+    async def _save_snapshot(self, vm: MicroVM, model_key: str):
+        lock = self._snapshot_locks.setdefault(model_key, asyncio.Lock())
+        async with lock:
+            snapshot_path, mem_path = self._snapshot_paths(model_key)
+            if os.path.exists(snapshot_path) and os.path.exists(mem_path):
+                return
+            os.makedirs(self._model_dir(model_key), exist_ok=True)
+            # Write to temp names first so a half-written snapshot is never loaded
+            await vm.create_snapshot(snapshot_path + ".tmp", mem_path + ".tmp")
+            os.replace(mem_path + ".tmp", mem_path)
+            os.replace(snapshot_path + ".tmp", snapshot_path)
+            logger.info("vm_snapshot_created", model=model_key, path=snapshot_path)
+
+    async def _warm_up(self, model_key: str):
+        idle = self._idle_queue(model_key)
+        # The first boot may have to create the snapshot; the rest restore from it
+        try:
+            idle.put_nowait(await self._boot_vm(model_key))
+            vms = await asyncio.gather(
+                *(self._boot_vm(model_key) for _ in range(self.size - 1)),
+                return_exceptions=True
+            )
+        except Exception as e:
+            logger.error("vm_pool_warmup_failed", model=model_key, error=str(e))
+            return
+
+        for vm in vms:
+            if isinstance(vm, Exception):
+                logger.error("vm_pool_warmup_failed", model=model_key, error=str(vm))
+            else:
+                idle.put_nowait(vm)
+        VM_POOL_IDLE.labels(model=model_key).set(idle.qsize())
+
+    async def _refill_loop(self):
+        while True:
+            await asyncio.sleep(settings.FC_POOL_REFILL_INTERVAL_SECONDS)
+            for model_key in list(self._models):
+                idle = self._idle_queue(model_key)
+                missing = min(self.size - idle.qsize(), settings.FC_POOL_REFILL_BATCH)
+                for _ in range(max(0, missing)):
+                    try:
+                        idle.put_nowait(await self._boot_vm(model_key))
+                    except Exception as e:
+                        logger.error("vm_pool_refill_failed", model=model_key, error=str(e))
+                        break
+                VM_POOL_IDLE.labels(model=model_key).set(idle.qsize())
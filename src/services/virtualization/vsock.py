@@ -0,0 +1,88 @@
+import asyncio
+import json
+import struct
+import time
+import structlog
+from typing import Any, Dict
+
+logger = structlog.get_logger()
+
+# Frame = 4-byte big-endian length + UTF-8 JSON body, in both directions.
+# The host sends one frame with the job(s); the guest agent answers with one frame.
+_HEADER = struct.Struct(">I")
+
+def _remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+async def _send(writer: asyncio.StreamWriter, data: bytes, deadline: float):
+    """
+    Write + drain under the deadline: a guest that stops reading must not hang the job.
+    """
+    writer.write(data)
+    await asyncio.wait_for(writer.drain(), timeout=_remaining(deadline))
+
+class VsockError(RuntimeError):
+    """
+    The guest could not be reached, broke the framing or answered too late.
+    """
+    pass
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+async def read_frame(reader: asyncio.StreamReader, max_bytes: int) -> Dict[str, Any]:
+    try:
+        (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        if length > max_bytes:
+            raise VsockError(f"Guest frame of {length} bytes exceeds the {max_bytes} byte limit")
+        return json.loads(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        raise VsockError("Guest closed the connection mid-frame")
+    except ValueError as e:
+        raise VsockError(f"Guest sent an undecodable frame: {e}")
+
+async def connect(uds_path: str, port: int, deadline: float, retry_seconds: float):
+    """
+    Host-initiated Firecracker vsock connection: open the VM's vsock UDS, send
+    "CONNECT <port>\\n", expect "OK <host port>\\n". Firecracker drops the connection
+    while nothing listens on the guest port yet (agent still starting after a resume),
+    so we retry until `deadline` (time.monotonic()).
+    """
+    while True:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_unix_connection(uds_path)
+            await _send(writer, f"CONNECT {port}\n".encode("ascii"), deadline)
+            ack = await asyncio.wait_for(reader.readline(), timeout=_remaining(deadline))
+            if ack.startswith(b"OK "):
+                return reader, writer
+        except (OSError, asyncio.TimeoutError):
+            pass
+        if writer is not None:
+            writer.close()
+        if time.monotonic() + retry_seconds >= deadline:
+            raise VsockError(f"Guest did not accept vsock port {port}")
+        await asyncio.sleep(retry_seconds)
+
+async def exchange(
+    uds_path: str,
+    port: int,
+    message: Dict[str, Any],
+    timeout: float,
+    max_frame_bytes: int,
+    retry_seconds: float = 0.01
+) -> Dict[str, Any]:
+    """
+    Streams one request frame into the guest and returns its reply frame.
+    Returns as soon as the guest answers; `timeout` bounds the whole round trip.
+    """
+    deadline = time.monotonic() + timeout
+    reader, writer = await connect(uds_path, port, deadline, retry_seconds)
+    try:
+        await _send(writer, encode_frame(message), deadline)
+        return await asyncio.wait_for(read_frame(reader, max_frame_bytes), timeout=_remaining(deadline))
+    except asyncio.TimeoutError:
+        raise VsockError(f"Guest did not answer within {timeout}s")
+    finally:
+        writer.close()
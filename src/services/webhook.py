@@ -1,3 +1,4 @@
+import asyncio
 import hmac
 import hashlib
 import json
@@ -6,11 +7,60 @@ import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 from src.core.config import settings
+from src.core.metrics import WEBHOOK_CONNECTIONS_OPENED, WEBHOOK_REQUESTS
 
 logger = structlog.get_logger()
 
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401 (installed via httpx[http2])
+        return True
+    except ImportError:
+        return False
+
 class WebhookService:
-    
+    # One pooled client per process: keep-alive + HTTP/2 mean repeat deliveries to the
+    # same hospital endpoint skip the TCP/TLS handshake.
+    _client: httpx.AsyncClient | None = None
+    _host_slots: dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        if cls._client is None:
+            http2 = settings.WEBHOOK_HTTP2 and _http2_available()
+            if settings.WEBHOOK_HTTP2 and not http2:
+                logger.warning("webhook_http2_unavailable", hint="pip install 'httpx[http2]'")
+            cls._client = httpx.AsyncClient(
+                timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.WEBHOOK_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.WEBHOOK_KEEPALIVE_EXPIRY_SECONDS
+                )
+            )
+        return cls._client
+
+    @classmethod
+    async def aclose(cls):
+        """
+        Closes pooled connections. Call on process shutdown.
+        """
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+        cls._host_slots.clear()
+
+    @classmethod
+    def _slots_for(cls, host: str) -> asyncio.Semaphore:
+        """
+        Caps concurrent requests (and so connections) per destination host.
+        """
+        if host not in cls._host_slots:
+            limit = settings.WEBHOOK_HOST_LIMITS.get(host, settings.WEBHOOK_MAX_CONNECTIONS_PER_HOST)
+            cls._host_slots[host] = asyncio.Semaphore(limit)
+        return cls._host_slots[host]
+
     @staticmethod
     def generate_signature(payload: dict) -> str:
         """
@@ -24,26 +74,20 @@ class WebhookService:
         return signature
 
     @staticmethod
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((httpx.ConnectError, httpx.TimeoutException, httpx.HTTPStatusError)),
-        reraise=True
-    )
-    async def send_webhook(url: str, job_id: str, result: dict):
-        """
-        Sends the result to the client. Retries 3 times on failure.
-        """
-        logger.info("webhook_attempt_start", job_id=job_id, url=url)
-        
-        payload = {
+    def build_payload(job_id: str, result: dict, status: str = "COMPLETED") -> dict:
+        return {
             "job_id": job_id,
-            "status": "COMPLETED",
+            "status": status,
             "result": result,
             # In a real app, add a timestamp here to prevent replay attacks
             # "timestamp": datetime.utcnow().isoformat() 
         }
-        
+
+    @staticmethod
+    async def deliver(url: str, payload: dict) -> httpx.Response:
+        """
+        One signed POST, no retries. Raises on network errors and non-2xx responses.
+        """
         signature = WebhookService.generate_signature(payload)
         
         headers = {
@@ -52,8 +96,33 @@ class WebhookService:
             "User-Agent": "CliniSandbox-Webhook/1.0"
         }
         
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.post(url, json=payload, headers=headers)
+        host = httpx.URL(url).host
+
+        async def trace(event_name: str, info: dict):
+            # Only fires when the pool has no idle connection to reuse
+            if event_name == "connection.connect_tcp.complete":
+                WEBHOOK_CONNECTIONS_OPENED.labels(host=host).inc()
+
+        async with WebhookService._slots_for(host):
+            WEBHOOK_REQUESTS.labels(host=host).inc()
+            response = await WebhookService.get_client().post(
+                url, json=payload, headers=headers, extensions={"trace": trace}
+            )
             response.raise_for_status()
-            
-        logger.info("webhook_delivery_success", job_id=job_id, status_code=response.status_code)
\ No newline at end of file
+        return response
+
+    @staticmethod
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((httpx.ConnectError, httpx.TimeoutException, httpx.HTTPStatusError)),
+        reraise=True
+    )
+    async def send_webhook(url: str, job_id: str, result: dict):
+        """
+        Sends the result to the client. Retries 3 times on failure.
+        The worker goes through the outbox dispatcher instead; this is for ad-hoc sends.
+        """
+        logger.info("webhook_attempt_start", job_id=job_id, url=url)
+        response = await WebhookService.deliver(url, WebhookService.build_payload(job_id, result))
+        logger.info("webhook_delivery_success", job_id=job_id, status_code=response.status_code)
@@ -1,80 +1,503 @@
 import asyncio
-import json
+import os
 import signal
+import socket
+import time
 import structlog
-from sqlalchemy import select
+from prometheus_client import start_http_server
+from sqlalchemy import and_, bindparam, or_, update
+from src.core.config import settings
 from src.core.logging import setup_logging
-from src.db.session import AsyncSessionLocal
+from src.core.metrics import (
+    QUEUE_LANE_DEPTH,
+    QUEUE_MODEL_DEPTH,
+    QUEUE_WAIT_SECONDS,
+    WORKER_BATCH_SIZE,
+    WORKER_IN_FLIGHT,
+    WORKER_SLOT_BUSY,
+    WORKER_SLOT_JOBS,
+    WORKER_SLOT_JOB_SECONDS,
+    WORKER_SLOTS_TOTAL,
+)
+from src.db.session import AsyncSessionLocal, configure_engine
 from src.db.models import Job
-from src.services.queue import redis_client, QUEUE_NAME
+from src.services.queue import (
+    QUEUE_NAME,
+    QueueMessage,
+    ack_job,
+    claim_job,
+    extend_leases,
+    list_queues,
+    parse_queue_key,
+    queue_depths,
+    requeue_expired_jobs,
+    wait_for_jobs,
+)
+from src.services.scheduler import FairScheduler, ModelAffinity
 from src.core.vm_factory import get_vm_backend
 from src.services.webhook import WebhookService
+from src.services.outbox import WebhookDispatcher, add_webhook_delivery
+from src.services.job_status import publish_job_status
+from src.services.registry import model_registry
+from src.services.result_cache import (
+    cache_key,
+    claim_execution,
+    get_cached_result,
+    release_execution,
+    store_result,
+    wait_for_result,
+)
+from src.services.decision_engine import DecisionEngine
 
 setup_logging()
 logger = structlog.get_logger()
 SHUTDOWN_FLAG = False
+QUEUE_METRICS_INTERVAL_SECONDS = 5
+# Identifies this process in the fleet's warm-model advertisements
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
 
 def handle_sigterm(signum, frame):
     global SHUTDOWN_FLAG
     logger.info("worker_shutdown_signal_received")
     SHUTDOWN_FLAG = True
 
-async def process_job(job_id: str):
-    logger.info("processing_job_start", job_id=job_id)
+async def bundle_is_valid(bundle: dict) -> bool:
+    """
+    Deferred FHIR validation: unless FHIR_STRICT_VALIDATION is on, the API only scanned
+    LOINC codings, so the full fhir.resources parse happens here (off the event loop).
+    """
+    if settings.FHIR_STRICT_VALIDATION:
+        return True
+    try:
+        await asyncio.to_thread(DecisionEngine.validate_fhir_structure, bundle)
+    except Exception:
+        return False
+    return True
+
+async def result_digest(db, model_key: str, bundle: dict) -> str | None:
+    """
+    Result cache key for a job (None = caching off or the model isn't registered).
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    try:
+        manifest = await model_registry.get_manifest(db, model_key)
+    except Exception as e:
+        logger.warning("result_cache_key_failed", model=model_key, error=str(e))
+        return None
+    return cache_key(manifest, bundle) if manifest is not None else None
+
+async def run_model(vm_runner, job_id: str, model_key: str, bundle: dict, digest: str | None) -> tuple[str, dict]:
+    """
+    One VM run, unless the result cache already has the answer or an identical
+    job is computing it right now (then we wait for its result instead).
+    Returns (status, result_payload).
+    """
+    owner = False
+    if digest is not None:
+        cached = await get_cached_result(digest, "worker")
+        if cached is not None:
+            return "COMPLETED", cached
+        try:
+            owner = await claim_execution(digest, job_id)
+            if not owner:
+                cached = await wait_for_result(digest, settings.RESULT_CACHE_COALESCE_WAIT_SECONDS)
+                if cached is not None:
+                    return "COMPLETED", cached
+        except Exception as e:
+            logger.warning("result_cache_coalesce_failed", job_id=job_id, error=str(e))
+
+    try:
+        # --- VIRTUALIZATION START ---
+        # The model key picks the warm VM pool (and later, the model image)
+        resource = await vm_runner.prepare_resources(job_id, model_key, bundle)
+        try:
+            result_payload = await vm_runner.run_inference(job_id, resource)
+            status = "COMPLETED"
+        except Exception as e:
+            status = "FAILED"
+            result_payload = {"error": str(e)}
+        finally:
+            await vm_runner.cleanup(job_id, resource)
+        # --- VIRTUALIZATION END ---
+
+        # Stored before the in-flight marker goes, so waiting twins find it
+        if status == "COMPLETED" and digest is not None:
+            await store_result(digest, result_payload)
+    finally:
+        if owner:
+            try:
+                await release_execution(digest, job_id)
+            except Exception as e:
+                logger.warning("result_cache_release_failed", job_id=job_id, error=str(e))
+    return status, result_payload
+
+async def process_job(job_id: str, attempt: int = 1):
+    logger.info("processing_job_start", job_id=job_id, attempt=attempt)
     vm_runner = get_vm_backend()
     
     async with AsyncSessionLocal() as db:
         try:
-            result = await db.execute(select(Job).where(Job.id == job_id))
-            job = result.scalars().first()
-            if not job: return
+            # 1. Claim with ONE statement. Delivery is at-least-once: only a QUEUED job, or a
+            # redelivery of one whose previous worker died mid-run, may be (re)started.
+            # Finished jobs (and unknown ids) return no row and are skipped.
+            claimable = Job.status == "QUEUED"
+            if attempt > 1:
+                claimable = or_(claimable, Job.status == "PROCESSING")
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .where(claimable)
+                .values(status="PROCESSING")
+                .returning(Job.target_model_key, Job.fhir_bundle_input, Job.webhook_url, Job.created_at)
+                .execution_options(synchronize_session=False)
+            )
+            job = result.first()
+            await db.commit()
+            if job is None:
+                logger.info("processing_job_skipped", job_id=job_id)
+                return
+            await publish_job_status(job_id, "PROCESSING", created_at=job.created_at)
+            
+            # --- DEFERRED FHIR VALIDATION ---
+            if not await bundle_is_valid(job.fhir_bundle_input):
+                status = "FAILED"
+                result_payload = {"error": "Invalid FHIR Bundle format"}
+            else:
+                digest = await result_digest(db, job.target_model_key, job.fhir_bundle_input)
+                status, result_payload = await run_model(
+                    vm_runner, job_id, job.target_model_key, job.fhir_bundle_input, digest
+                )
 
-            job.status = "PROCESSING"
+            # 2. Finish with ONE UPDATE, plus the webhook outbox row in the same commit
+            # (the dispatcher delivers it later, so a slow hospital endpoint never holds this slot)
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id)
+                .values(status=status, result_payload=result_payload)
+                .execution_options(synchronize_session=False)
+            )
+            add_webhook_delivery(db, job_id, job.webhook_url, status, result_payload)
             await db.commit()
+            await publish_job_status(job_id, status, result_payload, job.created_at)
             
-            # --- VIRTUALIZATION START ---
-            resource = await vm_runner.prepare_resources(str(job.id), "model.pt", job.fhir_bundle_input)
-            try:
-                output = await vm_runner.run_inference(str(job.id), resource)
-                job.status = "COMPLETED"
-                job.result_payload = output
-            except Exception as e:
-                job.status = "FAILED"
-                job.result_payload = {"error": str(e)}
-            finally:
-                await vm_runner.cleanup(str(job.id), resource)
-            # --- VIRTUALIZATION END ---
+            logger.info("processing_job_done", status=status)
+
+        except Exception as e:
+            logger.error("processing_job_error", error=str(e))
+            # Not acked -> the lease expires and the job is redelivered (up to QUEUE_MAX_ATTEMPTS)
+            raise
 
+async def process_batch(messages: list[QueueMessage]):
+    """
+    process_job for several jobs from one queue (same model, same client): one claim
+    UPDATE, one VM invocation, and one commit with every result and outbox row.
+    """
+    job_ids = [message.job_id for message in messages]
+    logger.info("processing_batch_start", job_ids=job_ids)
+    vm_runner = get_vm_backend()
+
+    async with AsyncSessionLocal() as db:
+        try:
+            # 1. Claim every job at once (same rules as process_job, per message)
+            claimable = Job.status == "QUEUED"
+            redelivered = [message.job_id for message in messages if message.attempt > 1]
+            if redelivered:
+                claimable = or_(claimable, and_(Job.id.in_(redelivered), Job.status == "PROCESSING"))
+            result = await db.execute(
+                update(Job)
+                .where(Job.id.in_(job_ids))
+                .where(claimable)
+                .values(status="PROCESSING")
+                .returning(Job.id, Job.target_model_key, Job.fhir_bundle_input, Job.webhook_url, Job.created_at)
+                .execution_options(synchronize_session=False)
+            )
+            jobs = {str(row.id): row for row in result.all()}
             await db.commit()
+            if not jobs:
+                logger.info("processing_batch_skipped", job_ids=job_ids)
+                return
+            for job_id, job in jobs.items():
+                await publish_job_status(job_id, "PROCESSING", created_at=job.created_at)
+
+            # 2. Invalid bundles fail on their own; the rest go to the VM together (per model)
+            outcomes: dict[str, tuple[str, dict]] = {}
+            by_model: dict[str, dict[str, dict]] = {}
+            digests: dict[str, str] = {}
+            for job_id, job in jobs.items():
+                if not await bundle_is_valid(job.fhir_bundle_input):
+                    outcomes[job_id] = ("FAILED", {"error": "Invalid FHIR Bundle format"})
+                    continue
+                digest = await result_digest(db, job.target_model_key, job.fhir_bundle_input)
+                cached = await get_cached_result(digest, "worker") if digest is not None else None
+                if cached is not None:
+                    outcomes[job_id] = ("COMPLETED", cached)
+                    continue
+                if digest is not None:
+                    digests[job_id] = digest
+                by_model.setdefault(job.target_model_key, {})[job_id] = job.fhir_bundle_input
 
-            # --- WEBHOOK DISPATCH START ---
-            if job.webhook_url:
+            for model_key, inputs in by_model.items():
+                WORKER_BATCH_SIZE.labels(model=model_key).observe(len(inputs))
                 try:
-                    await WebhookService.send_webhook(
-                        url=job.webhook_url, 
-                        job_id=str(job.id), 
-                        result=job.result_payload
-                    )
-                except Exception as wh_err:
-                    logger.error("webhook_failed_all_retries", job_id=job_id, error=str(wh_err))
-            
-            logger.info("processing_job_done", status=job.status)
+                    results = await vm_runner.run_batch_inference(model_key, inputs)
+                except Exception as e:
+                    results = {job_id: e for job_id in inputs}
+                for job_id, outcome in results.items():
+                    if isinstance(outcome, Exception):
+                        outcomes[job_id] = ("FAILED", {"error": str(outcome)})
+                    else:
+                        outcomes[job_id] = ("COMPLETED", outcome)
+                        if job_id in digests:
+                            await store_result(digests[job_id], outcome)
+
+            # 3. Finish: one executemany UPDATE + the outbox rows, in one commit
+            jobs_table = Job.__table__
+            await db.execute(
+                update(jobs_table)
+                .where(jobs_table.c.id == bindparam("b_id"))
+                .values(status=bindparam("b_status"), result_payload=bindparam("b_result")),
+                [
+                    {"b_id": jobs[job_id].id, "b_status": status, "b_result": payload}
+                    for job_id, (status, payload) in outcomes.items()
+                ]
+            )
+            for job_id, (status, payload) in outcomes.items():
+                add_webhook_delivery(db, job_id, jobs[job_id].webhook_url, status, payload)
+            await db.commit()
+            for job_id, (status, payload) in outcomes.items():
+                await publish_job_status(job_id, status, payload, jobs[job_id].created_at)
+
+            logger.info("processing_batch_done", size=len(outcomes))
 
         except Exception as e:
-            logger.error("processing_job_error", error=str(e))
+            logger.error("processing_batch_error", error=str(e), job_ids=job_ids)
+            # Nothing acked -> every lease expires and the jobs are redelivered
+            raise
+
+async def collect_batch(messages: list[QueueMessage], leases: dict):
+    """
+    Adds more jobs from the first message's queue to `messages` (leasing each one as it
+    is claimed) until WORKER_BATCH_MAX_JOBS or WORKER_BATCH_MAX_WAIT_MS is reached.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.WORKER_BATCH_MAX_WAIT_MS / 1000
+    queue = messages[0].queue
+    while len(messages) < settings.WORKER_BATCH_MAX_JOBS:
+        message = await claim_job([queue], include_legacy=False)
+        if message is not None:
+            leases[message.job_id] = message
+            messages.append(message)
+            continue
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(0.01, remaining))
+
+async def run_in_slot(slot_id: int, message: QueueMessage, free_slots: asyncio.Queue, leases: dict):
+    """
+    Runs one job (or, for WORKER_BATCH_MODELS, a batch starting with it) inside
+    a worker slot, acks on success and hands the slot back.
+    """
+    slot = str(slot_id)
+    WORKER_SLOT_BUSY.labels(slot=slot).set(1)
+    WORKER_IN_FLIGHT.inc()
+    leases[message.job_id] = message
+    messages = [message]
+    start_time = time.perf_counter()
+    try:
+        if message.model_key in settings.WORKER_BATCH_MODELS:
+            await collect_batch(messages, leases)
+            await process_batch(messages)
+        else:
+            await process_job(message.job_id, message.attempt)
+        for claimed in messages:
+            await ack_job(claimed)
+    except Exception:
+        for claimed in messages:
+            logger.warning("job_left_for_redelivery", job_id=claimed.job_id, attempt=claimed.attempt)
+    finally:
+        for claimed in messages:
+            leases.pop(claimed.job_id, None)
+        WORKER_SLOT_JOB_SECONDS.labels(slot=slot).observe(time.perf_counter() - start_time)
+        WORKER_SLOT_JOBS.labels(slot=slot).inc(len(messages))
+        WORKER_SLOT_BUSY.labels(slot=slot).set(0)
+        WORKER_IN_FLIGHT.dec()
+        free_slots.put_nowait(slot_id)
+
+async def keep_leases_alive(leases: dict):
+    """
+    Renews the queue lease of every running job well before it expires.
+    """
+    while True:
+        await asyncio.sleep(settings.QUEUE_VISIBILITY_TIMEOUT_SECONDS / 3)
+        try:
+            await extend_leases(list(leases.values()))
+        except Exception as e:
+            logger.error("queue_lease_renewal_failed", error=str(e))
+
+async def fail_dead_lettered_jobs(messages: list[QueueMessage]):
+    """
+    Jobs that used up their attempts would otherwise sit in QUEUED/PROCESSING forever.
+    Their webhooks are queued in the same transaction, like any other terminal status.
+    """
+    error = {"error": f"Gave up after {settings.QUEUE_MAX_ATTEMPTS} attempts"}
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(Job)
+            .where(Job.id.in_([message.job_id for message in messages]))
+            .where(Job.status.in_(("QUEUED", "PROCESSING")))
+            .values(status="FAILED", result_payload=error)
+            .returning(Job.id, Job.created_at, Job.webhook_url)
+        )
+        failed = result.all()
+        for job_id, _, webhook_url in failed:
+            add_webhook_delivery(db, job_id, webhook_url, "FAILED", error)
+        await db.commit()
+    for job_id, created_at, _ in failed:
+        await publish_job_status(str(job_id), "FAILED", error, created_at)
+
+async def reap_expired_leases():
+    """
+    Redelivers jobs whose worker died (lease expired) and fails poison jobs.
+    """
+    while True:
+        await asyncio.sleep(settings.QUEUE_REAPER_INTERVAL_SECONDS)
+        try:
+            _, dead = await requeue_expired_jobs()
+            if dead:
+                await fail_dead_lettered_jobs(dead)
+        except Exception as e:
+            logger.error("queue_reaper_error", error=str(e))
+
+async def drain_in_flight(in_flight: set):
+    """
+    Waits for running jobs on shutdown; cancels whatever is left after the grace period.
+    """
+    if not in_flight:
+        return
+    logger.info("worker_draining", in_flight=len(in_flight))
+    done, pending = await asyncio.wait(in_flight, timeout=settings.WORKER_SHUTDOWN_GRACE_SECONDS)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("worker_drain_timeout", cancelled=len(pending))
+        await asyncio.gather(*pending, return_exceptions=True)
+
+async def report_queue_depths():
+    """
+    Publishes per-lane and per-model backlog so lane starvation and models
+    without warm workers are visible on dashboards.
+    """
+    seen_models: set[str] = set()
+    while True:
+        try:
+            depths = await queue_depths(await list_queues())
+            per_lane = {lane: 0 for lane in settings.QUEUE_LANE_WEIGHTS}
+            per_model = {model_key: 0 for model_key in seen_models}
+            for queue, depth in depths.items():
+                lane, model_key, _ = parse_queue_key(queue)
+                per_lane[lane] = per_lane.get(lane, 0) + depth
+                per_model[model_key] = per_model.get(model_key, 0) + depth
+            for lane, depth in per_lane.items():
+                QUEUE_LANE_DEPTH.labels(lane=lane).set(depth)
+            # Models whose queues drained since the last pass go back to 0
+            for model_key, depth in per_model.items():
+                QUEUE_MODEL_DEPTH.labels(model=model_key).set(depth)
+            seen_models.update(per_model)
+        except Exception as e:
+            logger.error("queue_metrics_error", error=str(e))
+        await asyncio.sleep(QUEUE_METRICS_INTERVAL_SECONDS)
 
 async def worker_loop():
-    logger.info("worker_startup", queue=QUEUE_NAME)
+    concurrency = max(1, settings.WORKER_CONCURRENCY)
+    logger.info("worker_startup", queue=QUEUE_NAME, concurrency=concurrency)
+
+    # A queue of slot ids works like a semaphore, but tells us WHICH slot is busy (per-slot metrics)
+    free_slots: asyncio.Queue = asyncio.Queue()
+    for slot_id in range(concurrency):
+        free_slots.put_nowait(slot_id)
+        WORKER_SLOT_BUSY.labels(slot=str(slot_id)).set(0)
+    WORKER_SLOTS_TOTAL.set(concurrency)
+
+    vm_backend = get_vm_backend()
+    await vm_backend.startup()
+    WebhookService.get_client()
+
+    in_flight: set = set()
+    leases: dict = {}
+    housekeeping = [
+        asyncio.create_task(keep_leases_alive(leases)),
+        asyncio.create_task(reap_expired_leases()),
+        asyncio.create_task(report_queue_depths()),
+        asyncio.create_task(WebhookDispatcher().run()),
+        # result_digest keys the result cache by model version: drop stale manifests
+        # as soon as a model change is published, like the API does
+        asyncio.create_task(model_registry.listen_for_invalidations()),
+    ]
+    scheduler = FairScheduler()
+    affinity = ModelAffinity(WORKER_ID, vm_backend)
+    if settings.QUEUE_AFFINITY_ENABLED:
+        housekeeping.append(asyncio.create_task(affinity.run()))
+
     while not SHUTDOWN_FLAG:
+        # 1. Only claim from Redis once we have somewhere to run the job
         try:
-            val = await redis_client.brpop(QUEUE_NAME, timeout=1)
-            if val:
-                await process_job(json.loads(val[1]).get("job_id"))
+            slot_id = await asyncio.wait_for(free_slots.get(), timeout=1)
+        except asyncio.TimeoutError:
+            continue
+
+        # 2. Claim (pop + lease) the next job for that slot: fairest queue first,
+        # models we hold warm before the rest (we only steal when our own models have no work)
+        try:
+            queues = await list_queues()
+            if settings.QUEUE_AFFINITY_ENABLED:
+                message = await claim_job(scheduler.order(queues, affinity.warm(), affinity.elsewhere))
+            else:
+                message = await claim_job(scheduler.order(queues))
         except Exception as e:
             logger.error("worker_loop_error", error=str(e))
+            free_slots.put_nowait(slot_id)
             await asyncio.sleep(1)
+            continue
+
+        if message is None:
+            free_slots.put_nowait(slot_id)
+            try:
+                await wait_for_jobs(timeout=1)
+            except Exception as e:
+                logger.error("worker_loop_error", error=str(e))
+                await asyncio.sleep(1)
+            continue
+
+        if message.enqueued_at:
+            QUEUE_WAIT_SECONDS.labels(lane=message.lane).observe(max(0.0, time.time() - message.enqueued_at))
+        if settings.QUEUE_AFFINITY_ENABLED:
+            affinity.record_claim(message.model_key)
+            affinity.record_run(message.model_key)
+
+        # 3. Run it in the background and go back for more
+        task = asyncio.create_task(run_in_slot(slot_id, message, free_slots, leases))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    # Leases must keep being renewed while we drain
+    await drain_in_flight(in_flight)
+    for task in housekeeping:
+        task.cancel()
+    await asyncio.gather(*housekeeping, return_exceptions=True)
+    if settings.QUEUE_AFFINITY_ENABLED:
+        try:
+            await affinity.withdraw()
+        except Exception as e:
+            logger.error("queue_affinity_withdraw_failed", error=str(e))
+    await vm_backend.shutdown()
+    await WebhookService.aclose()
+    logger.info("worker_stopped")
 
 if __name__ == "__main__":
     signal.signal(signal.SIGTERM, handle_sigterm)
     signal.signal(signal.SIGINT, handle_sigterm)
-    asyncio.run(worker_loop())
\ No newline at end of file
+    start_http_server(settings.WORKER_METRICS_PORT)
+    configure_engine("worker")
+    asyncio.run(worker_loop())
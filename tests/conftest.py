@@ -47,11 +47,17 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
             
     src.worker.main.AsyncSessionLocal = MockSessionManager
 
+    # The buffered audit writer opens its own sessions too
+    import src.services.audit
+    original_audit_session_factory = src.services.audit.AsyncSessionLocal
+    src.services.audit.AsyncSessionLocal = MockSessionManager
+
     yield session
     
     # TEARDOWN
     # Restore the original factory
     src.worker.main.AsyncSessionLocal = original_session_factory
+    src.services.audit.AsyncSessionLocal = original_audit_session_factory
     
     await session.close()
     await transaction.rollback()
@@ -86,8 +92,40 @@ def mock_redis_queue(monkeypatch):
     """
     
     # Create a dummy async function that does nothing
-    async def mock_enqueue(job_id, job_data):
+    async def mock_enqueue(job_id, job_data, prepare=None):
+        return
+
+    async def mock_enqueue_many(job_ids, prepare=None):
         return
     
     # Patch the function where it is IMPORTED (in the endpoint file)
-    monkeypatch.setattr("src.api.endpoints.jobs.enqueue_job", mock_enqueue)
\ No newline at end of file
+    monkeypatch.setattr("src.api.endpoints.jobs.enqueue_job", mock_enqueue)
+    monkeypatch.setattr("src.api.endpoints.jobs.enqueue_jobs", mock_enqueue_many)
+
+    # Same for the Redis status cache: always a miss, writes go nowhere
+    async def mock_cache_read(job_id):
+        return None
+
+    async def mock_cache_write(events):
+        return
+
+    monkeypatch.setattr("src.api.endpoints.jobs.get_cached_job_status", mock_cache_read)
+    monkeypatch.setattr("src.api.endpoints.jobs.fill_job_status_cache", mock_cache_write)
+
+    # Inference result cache: always a miss
+    async def mock_result_cache_read(digest, where):
+        return None
+
+    monkeypatch.setattr("src.api.endpoints.jobs.get_cached_result", mock_result_cache_read)
+    # Idempotency keys: every request is the first one with its key
+    from src.services.idempotency import IdempotencyClaim
+
+    async def mock_claim(client_id, key, fingerprint):
+        return IdempotencyClaim(key=key, fingerprint=fingerprint, owner="test")
+
+    async def mock_idempotency_noop(*args):
+        return
+
+    monkeypatch.setattr("src.api.endpoints.jobs.claim_idempotency_key", mock_claim)
+    monkeypatch.setattr("src.api.endpoints.jobs.complete_idempotency_key", mock_idempotency_noop)
+    monkeypatch.setattr("src.api.endpoints.jobs.release_idempotency_key", mock_idempotency_noop)
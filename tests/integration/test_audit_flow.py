@@ -2,6 +2,7 @@ import pytest
 from httpx import AsyncClient
 from sqlalchemy import select
 from src.db.models import AuditLog
+from src.services.audit import audit_writer
 
 @pytest.mark.asyncio
 async def test_negotiation_triggers_audit_log(client: AsyncClient, db_session):
@@ -26,6 +27,9 @@ async def test_negotiation_triggers_audit_log(client: AsyncClient, db_session):
     assert response.json()["detail"]["status"] == "NEGOTIATION_REQUIRED"
 
     # 4. Assert Database Side Effect
+    # The event is buffered; flush it like the background writer would
+    await audit_writer.flush()
+
     # Query the audit log table
     result = await db_session.execute(
         select(AuditLog).where(AuditLog.event_type == "DECISION_NEGOTIATION_REQUIRED")
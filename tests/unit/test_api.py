@@ -75,4 +75,57 @@ async def test_invalid_diagnosis_model(client: AsyncClient):
         "fhir_bundle": {}
     }
     response = await client.post("/v1/diagnose", json=payload)
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_batch_diagnosis_mixed_results(client: AsyncClient, db_session):
+    def observation(code):
+        return {
+            "resource": {
+                "resourceType": "Observation",
+                "status": "final",
+                "code": { "coding": [{ "system": "http://loinc.org", "code": code }] },
+                "valueQuantity": { "value": 1, "unit": "1" }
+            }
+        }
+
+    complete_bundle = {"resourceType": "Bundle", "type": "collection", "entry": [observation(c) for c in ("8310-5", "8867-4", "6690-2")]}
+    empty_bundle = {"resourceType": "Bundle", "type": "collection", "entry": []}
+
+    payload = {
+        "items": [
+            {"client_id": "batch_bot", "target_diagnosis": "sepsis", "fhir_bundle": complete_bundle},
+            {"client_id": "batch_bot", "target_diagnosis": "sepsis", "fhir_bundle": empty_bundle},
+            {"client_id": "batch_bot", "target_diagnosis": "cancer_v1", "fhir_bundle": complete_bundle},
+            {"client_id": "batch_bot", "target_diagnosis": "sepsis", "fhir_bundle": complete_bundle},
+        ]
+    }
+
+    response = await client.post("/v1/diagnose/batch", json=payload)
+
+    assert response.status_code == 202
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 2
+    assert [r["status"] for r in data["results"]] == ["QUEUED", "NEGOTIATION_REQUIRED", "REJECTED", "QUEUED"]
+
+    # Accepted items were really inserted
+    job_ids = [r["job_id"] for r in data["results"] if r["job_id"]]
+    result = await db_session.execute(select(Job).where(Job.id.in_(job_ids)))
+    assert len(result.scalars().all()) == 2
+
+def test_restricted_lane_needs_an_allowed_client(monkeypatch):
+    from fastapi import HTTPException
+    from src.api.endpoints.jobs import check_lane_allowed
+    from src.schemas.job import JobCreateRequest
+
+    monkeypatch.setattr("src.api.endpoints.jobs.settings.QUEUE_RESTRICTED_LANES", {"stat": ["ed_bot"]})
+
+    def request(client_id, priority):
+        return JobCreateRequest(client_id=client_id, target_diagnosis="sepsis", fhir_bundle={}, priority=priority)
+
+    check_lane_allowed(request("ed_bot", "stat"))
+    check_lane_allowed(request("ward_bot", "routine")) # Unlisted lanes are open
+    with pytest.raises(HTTPException) as denied:
+        check_lane_allowed(request("ward_bot", "stat"))
+    assert denied.value.status_code == 403
@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import AsyncMock, MagicMock
-from src.services.audit import record_audit_event
+from src.services import audit
+from src.services.audit import AuditWriter, record_audit_event
 from src.db.models import AuditLog
 
 @pytest.mark.asyncio
@@ -27,4 +28,65 @@ async def test_record_audit_event_success():
     
     assert isinstance(log_entry, AuditLog)
     assert log_entry.event_type == "TEST_EVENT"
-    assert log_entry.details == {"foo": "bar"}
\ No newline at end of file
+    assert log_entry.details == {"foo": "bar"}
+
+class FakeAuditBackend:
+    """
+    The session and Redis doubles an AuditWriter writes to, patched into the audit module.
+    """
+    def __init__(self, monkeypatch):
+        self.session = AsyncMock()
+        self.redis = AsyncMock()
+        self.redis.lpop.return_value = None
+        session = self.session
+
+        class SessionManager:
+            async def __aenter__(self):
+                return session
+            async def __aexit__(self, exc_type, exc_val, exc_tb):
+                pass
+
+        monkeypatch.setattr(audit, "AsyncSessionLocal", SessionManager)
+        monkeypatch.setattr(audit, "redis_client", self.redis)
+
+@pytest.fixture
+def backend(monkeypatch):
+    return FakeAuditBackend(monkeypatch)
+
+@pytest.mark.asyncio
+async def test_audit_writer_flushes_in_one_multi_row_insert(backend):
+    writer = AuditWriter()
+    job_id = "6f1c1d3e-4a7b-4c1e-9f6a-2b8d0e3c5a71"
+    await writer.emit("A", {"n": 1})
+    await writer.emit("B", {"n": 2}, job_id=job_id)
+
+    # Nothing touches the DB until the flush
+    assert not backend.session.execute.called
+
+    assert await writer.flush() == 2
+    assert backend.session.execute.await_count == 1
+    _, rows = backend.session.execute.call_args.args
+    assert [row["event_type"] for row in rows] == ["A", "B"]
+    assert str(rows[1]["job_id"]) == job_id
+    assert backend.session.commit.await_count == 1
+
+@pytest.mark.asyncio
+async def test_audit_writer_spills_to_redis_when_db_fails(backend):
+    writer = AuditWriter()
+    backend.session.execute.side_effect = Exception("db down")
+    await writer.emit("A", {"n": 1})
+
+    assert await writer.flush() == 0
+    key, spilled = backend.redis.rpush.call_args.args
+    assert key == "clinisandbox_audit:spill"
+    assert '"event_type": "A"' in spilled
+
+@pytest.mark.asyncio
+async def test_audit_writer_full_buffer_spills_instead_of_growing(backend, monkeypatch):
+    monkeypatch.setattr(audit.settings, "AUDIT_BUFFER_MAX_EVENTS", 1)
+    writer = AuditWriter()
+    await writer.emit("A", {})
+    await writer.emit("B", {})
+
+    assert len(writer._buffer) == 1
+    assert backend.redis.rpush.await_count == 1
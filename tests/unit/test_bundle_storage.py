@@ -0,0 +1,50 @@
+import json
+import pytest
+
+import src.db.types as types
+from src.core.security import DataEncryption
+from src.db.types import CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD, EncryptedJSON, MAGIC, decode_bundle, encode_bundle
+
+BUNDLE = {
+    "resourceType": "Bundle",
+    "type": "collection",
+    "entry": [
+        {"resource": {"resourceType": "Observation", "status": "final",
+                      "code": {"coding": [{"system": "http://loinc.org", "code": "8310-5"}]},
+                      "valueQuantity": {"value": 37.5, "unit": "C"}}}
+    ] * 50
+}
+
+@pytest.mark.parametrize("codec", [CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD])
+def test_round_trip_per_codec(codec):
+    if codec == CODEC_ZSTD and types.zstandard is None:
+        pytest.skip("zstandard not installed")
+    stored = encode_bundle(BUNDLE, codec)
+    assert stored.startswith(MAGIC)
+    assert stored[len(MAGIC) + 1] == codec
+    assert decode_bundle(stored) == BUNDLE
+    assert decode_bundle(memoryview(stored)) == BUNDLE # asyncpg may hand back buffers
+
+def test_compressed_format_is_smaller_than_legacy():
+    legacy = DataEncryption.encrypt(json.dumps(BUNDLE))
+    assert len(encode_bundle(BUNDLE, CODEC_ZLIB)) < len(legacy) / 5
+
+def test_legacy_rows_stay_readable():
+    legacy_text = DataEncryption.encrypt(json.dumps(BUNDLE))
+    column = EncryptedJSON()
+    # Before the bytea migration (text) and after it (the same text as bytes)
+    assert column.process_result_value(legacy_text, None) == BUNDLE
+    assert column.process_result_value(legacy_text.encode("ascii"), None) == BUNDLE
+
+def test_zstd_falls_back_to_zlib_when_missing(monkeypatch):
+    monkeypatch.setattr(types.settings, "BUNDLE_COMPRESSION", "zstd")
+    monkeypatch.setattr(types, "zstandard", None)
+    stored = EncryptedJSON().process_bind_param(BUNDLE, None)
+    assert stored[len(MAGIC) + 1] == CODEC_ZLIB
+    assert decode_bundle(stored) == BUNDLE
+
+def test_unknown_format_version_is_rejected():
+    stored = bytearray(encode_bundle(BUNDLE, CODEC_ZLIB))
+    stored[len(MAGIC)] = 99
+    with pytest.raises(ValueError):
+        decode_bundle(bytes(stored))
@@ -0,0 +1,49 @@
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+import src.db.session as session
+from src.core.metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_CHECKOUT_TIMEOUTS
+
+def sample_count(metric, role: str) -> float:
+    for sample in metric.collect()[0].samples:
+        if sample.name.endswith(("_count", "_total")) and sample.labels.get("role") == role:
+            return sample.value
+    return 0.0
+
+def test_roles_get_their_own_pool_sizes(monkeypatch):
+    monkeypatch.setattr(session.settings, "WORKER_CONCURRENCY", 6)
+    monkeypatch.setattr(session.settings, "DB_WORKER_POOL_SIZE", None)
+    monkeypatch.setattr(session.settings, "DB_POOL_SIZE", 20)
+
+    worker = session.engine_options("worker")
+    api = session.engine_options("api")
+
+    assert worker["pool_size"] == 8 # One per slot + housekeeping
+    assert api["pool_size"] == 20
+    assert worker["poolclass"].role == "worker"
+    assert api["connect_args"]["prepared_statement_cache_size"] == session.settings.DB_STATEMENT_CACHE_SIZE
+
+def test_pgbouncer_mode_disables_statement_caches(monkeypatch):
+    monkeypatch.setattr(session.settings, "DB_PGBOUNCER_MODE", True)
+    connect_args = session.engine_options("api")["connect_args"]
+
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    name_func = connect_args["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+@pytest.mark.asyncio
+async def test_pool_records_checkout_wait_and_timeouts():
+    pool = session.pool_class_for("test")(creator=MagicMock, pool_size=1, max_overflow=0, timeout=0.01)
+    checkouts = sample_count(DB_POOL_CHECKOUT_SECONDS, "test")
+
+    held = await greenlet_spawn(pool.connect)
+    with pytest.raises(exc.TimeoutError):
+        await greenlet_spawn(pool.connect)
+    held.close()
+
+    assert sample_count(DB_POOL_CHECKOUT_SECONDS, "test") == checkouts + 2
+    assert sample_count(DB_POOL_CHECKOUT_TIMEOUTS, "test") == 1
+    assert type(pool.recreate()).role == "test" # Label survives dispose()
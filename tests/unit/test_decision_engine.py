@@ -75,4 +75,31 @@ def test_malformed_fhir_rejection(sepsis_manifest):
     malformed_json = {"resourceType": "Bundle", "type": "collection", "entry": "INVALID_TYPE"}
     
     with pytest.raises(Exception):
-        DecisionEngine.analyze_gap(malformed_json, sepsis_manifest)
\ No newline at end of file
+        DecisionEngine.analyze_gap(malformed_json, sepsis_manifest)
+
+def test_fast_and_strict_paths_agree(valid_bundle, incomplete_bundle, sepsis_manifest):
+    for bundle in (valid_bundle, incomplete_bundle):
+        assert DecisionEngine.analyze_gap(bundle, sepsis_manifest, strict=True) == \
+            DecisionEngine.analyze_gap(bundle, sepsis_manifest, strict=False)
+
+def test_fast_extractor_ignores_non_loinc_codings():
+    bundle = {
+        "resourceType": "Bundle",
+        "type": "collection",
+        "entry": [
+            {"resource": {"resourceType": "Patient", "id": "pat-1"}},
+            {"resource": {"resourceType": "Observation", "code": {"coding": [
+                {"system": "http://snomed.info/sct", "code": "386661006"},
+                {"system": "http://loinc.org", "code": "8310-5"}
+            ]}}},
+            {"resource": {"resourceType": "Condition", "code": {"coding": [
+                {"system": "http://loinc.org", "code": "8867-4"}
+            ]}}}
+        ]
+    }
+    assert DecisionEngine.extract_loinc_codes_fast(bundle) == {"8310-5"}
+
+def test_fast_extractor_rejects_unusable_structure():
+    for bad in ({}, {"resourceType": "Patient"}, {"resourceType": "Bundle", "entry": ["x"]}):
+        with pytest.raises(ValueError):
+            DecisionEngine.extract_loinc_codes_fast(bad)
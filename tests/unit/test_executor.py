@@ -0,0 +1,52 @@
+import pytest
+from src.schemas.manifest import ModelManifest, LOINCRequirement
+import src.services.executor as executor
+
+MANIFEST = ModelManifest(
+    target_diagnosis="sepsis",
+    minimum_accuracy=0.95,
+    required_observations=[LOINCRequirement(code="8310-5", display="Body Temp", mandatory=True)]
+)
+
+BUNDLE = {
+    "resourceType": "Bundle",
+    "type": "collection",
+    "entry": [
+        {
+            "resource": {
+                "resourceType": "Observation",
+                "status": "final",
+                "code": {"coding": [{"system": "http://loinc.org", "code": "8310-5"}]},
+                "valueQuantity": {"value": 37.5}
+            }
+        }
+    ]
+}
+
+@pytest.fixture(params=["thread", "process"])
+def offloading(request, monkeypatch):
+    # Strict + threshold of 1 entry forces every call through the pool
+    monkeypatch.setattr(executor.settings, "FHIR_STRICT_VALIDATION", True)
+    monkeypatch.setattr(executor.settings, "FHIR_OFFLOAD_MIN_ENTRIES", 1)
+    monkeypatch.setattr(executor.settings, "FHIR_EXECUTOR", request.param)
+    monkeypatch.setattr(executor.settings, "FHIR_EXECUTOR_WORKERS", 1)
+    yield
+    executor.shutdown_executor()
+
+@pytest.mark.asyncio
+async def test_offloaded_analysis_matches_inline(offloading):
+    assert await executor.run_gap_analysis(BUNDLE, MANIFEST) == (True, [])
+
+@pytest.mark.asyncio
+async def test_offloaded_validation_errors_surface_as_value_error(offloading):
+    bad = {"resourceType": "Bundle", "type": "collection", "entry": [{"resource": {"resourceType": "Observation"}}]}
+    with pytest.raises(ValueError):
+        await executor.run_gap_analysis(bad, MANIFEST)
+
+@pytest.mark.asyncio
+async def test_offloaded_strict_validation(offloading):
+    await executor.run_fhir_validation(BUNDLE)
+
+    bad = {"resourceType": "Bundle", "type": "collection", "entry": [{"resource": {"resourceType": "Observation"}}]}
+    with pytest.raises(ValueError):
+        await executor.run_fhir_validation(bad)
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+import src.services.idempotency as idempotency
+from src.services.idempotency import (
+    IdempotencyConflict,
+    IdempotencyInProgress,
+    claim_idempotency_key,
+    complete_idempotency_key,
+    release_idempotency_key,
+    request_fingerprint,
+)
+
+class FakeRedis:
+    """
+    Just the SET NX / GET semantics the idempotency records rely on.
+    """
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(idempotency, "redis_client", redis)
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_WAIT_SECONDS", 0.5)
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_POLL_SECONDS", 0.01)
+    return redis
+
+RESPONSE = {"job_id": "4f1c5d2e-0000-0000-0000-000000000001", "status": "QUEUED", "created_at": "2026-10-17T12:00:00Z", "eta_seconds": 5}
+
+def test_fingerprint_ignores_key_order():
+    assert request_fingerprint({"a": 1, "b": [1, 2]}) == request_fingerprint({"b": [1, 2], "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+@pytest.mark.asyncio
+async def test_completed_key_is_replayed(fake_redis):
+    first = await claim_idempotency_key("client-a", "key-1", "fp")
+    assert first.owner is not None and first.response is None
+    await complete_idempotency_key(first, RESPONSE)
+
+    retry = await claim_idempotency_key("client-a", "key-1", "fp")
+    assert retry.owner is None
+    assert retry.response == RESPONSE
+
+    # Keys are scoped per client
+    other_client = await claim_idempotency_key("client-b", "key-1", "fp")
+    assert other_client.owner is not None
+
+@pytest.mark.asyncio
+async def test_same_key_with_another_body_is_rejected(fake_redis):
+    first = await claim_idempotency_key("client-a", "key-1", "fp")
+    await complete_idempotency_key(first, RESPONSE)
+
+    with pytest.raises(IdempotencyConflict):
+        await claim_idempotency_key("client-a", "key-1", "other-fp")
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicate_waits_for_the_first_request(fake_redis):
+    first = await claim_idempotency_key("client-a", "key-1", "fp")
+
+    async def finish_later():
+        await asyncio.sleep(0.05)
+        await complete_idempotency_key(first, RESPONSE)
+
+    finisher = asyncio.create_task(finish_later())
+    duplicate = await claim_idempotency_key("client-a", "key-1", "fp")
+    await finisher
+
+    assert duplicate.response == RESPONSE
+
+@pytest.mark.asyncio
+async def test_duplicate_gives_up_when_the_first_request_hangs(fake_redis):
+    await claim_idempotency_key("client-a", "key-1", "fp")
+
+    with pytest.raises(IdempotencyInProgress):
+        await claim_idempotency_key("client-a", "key-1", "fp")
+
+@pytest.mark.asyncio
+async def test_release_only_drops_our_own_marker(fake_redis, monkeypatch):
+    release = AsyncMock()
+    monkeypatch.setattr(idempotency, "_release", release)
+    claim = await claim_idempotency_key("client-a", "key-1", "fp")
+
+    await release_idempotency_key(claim)
+
+    release.assert_awaited_once_with(keys=[claim.key], args=[claim.owner])
+
+@pytest.mark.asyncio
+async def test_flapping_key_polls_and_gives_up(fake_redis, monkeypatch):
+    # Someone else always wins the SET NX, but the key is gone again by the GET
+    fake_redis.set = AsyncMock(return_value=None)
+    sleep = AsyncMock(wraps=asyncio.sleep)
+    monkeypatch.setattr(idempotency.asyncio, "sleep", sleep)
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_WAIT_SECONDS", 0.05)
+
+    with pytest.raises(IdempotencyInProgress):
+        await claim_idempotency_key("client-a", "key-1", "fp")
+
+    assert sleep.await_count >= 1
+    assert fake_redis.set.await_count == sleep.await_count + 1
@@ -0,0 +1,174 @@
+import asyncio
+import datetime
+import json
+import uuid
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from httpx import AsyncClient, ASGITransport
+
+from src.main import app
+from src.db.session import get_db
+from src.services.job_status import (
+    JobStatusHub,
+    job_status_hub,
+    publish_job_status,
+    queue_status_writes,
+    status_cache_key,
+    status_event,
+    SUBSCRIBER_BUFFER,
+)
+
+def fake_db(row):
+    """
+    Session whose single query returns `row` (or no row).
+    """
+    result = MagicMock()
+    result.first.return_value = row
+    session = AsyncMock()
+    session.execute.return_value = result
+
+    async def override_get_db():
+        yield session
+    return session, override_get_db
+
+def session_factory(session):
+    """
+    Stands in for AsyncSessionLocal: `async with factory() as db` yields `session`.
+    """
+    class SessionManager:
+        async def __aenter__(self):
+            return session
+        async def __aexit__(self, exc_type, exc_val, exc_tb):
+            session.closed = True
+    return SessionManager
+
+def parse_events(body: str) -> list[dict]:
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+def test_hub_routes_events_to_subscribers_only():
+    hub = JobStatusHub()
+    watched = hub.subscribe("job-1")
+    hub.dispatch("job-2", status_event("job-2", "PROCESSING"))
+    hub.dispatch("job-1", status_event("job-1", "PROCESSING"))
+
+    assert watched.qsize() == 1
+    assert watched.get_nowait()["status"] == "PROCESSING"
+
+    hub.unsubscribe("job-1", watched)
+    hub.dispatch("job-1", status_event("job-1", "COMPLETED"))
+    assert watched.empty()
+
+def test_slow_subscriber_keeps_latest_events():
+    hub = JobStatusHub()
+    queue = hub.subscribe("job-1")
+    for i in range(SUBSCRIBER_BUFFER + 3):
+        hub.dispatch("job-1", {"status": str(i)})
+    assert queue.qsize() == SUBSCRIBER_BUFFER
+    assert [queue.get_nowait()["status"] for _ in range(SUBSCRIBER_BUFFER)][-1] == str(SUBSCRIBER_BUFFER + 2)
+
+@pytest.mark.asyncio
+async def test_stream_pushes_transitions_until_terminal(monkeypatch):
+    job_id = uuid.uuid4()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    session, _ = fake_db(SimpleNamespace(status="QUEUED", result_payload=None, created_at=now, updated_at=now))
+    session.closed = False
+    monkeypatch.setattr("src.api.endpoints.jobs.AsyncSessionLocal", session_factory(session))
+    closed_while_streaming = []
+
+    async def worker_publishes():
+        await asyncio.sleep(0.05)
+        # The connection went back to the pool before the stream started waiting
+        closed_while_streaming.append(session.closed)
+        job_status_hub.dispatch(str(job_id), status_event(str(job_id), "PROCESSING"))
+        job_status_hub.dispatch(str(job_id), status_event(str(job_id), "COMPLETED", {"diagnosis": "NEGATIVE"}))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        publisher = asyncio.create_task(worker_publishes())
+        response = await asyncio.wait_for(client.get(f"/v1/jobs/{job_id}/events"), timeout=5)
+        await publisher
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert [event["status"] for event in events] == ["QUEUED", "PROCESSING", "COMPLETED"]
+    assert events[-1]["result"] == {"diagnosis": "NEGATIVE"}
+    assert session.execute.await_count == 1 # Only the initial read hits the DB
+    assert closed_while_streaming == [True]
+    assert str(job_id) not in job_status_hub._subscribers
+
+@pytest.mark.asyncio
+async def test_stream_of_finished_or_unknown_job(monkeypatch):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    finished_session, _ = fake_db(SimpleNamespace(status="COMPLETED", result_payload={"diagnosis": "POSITIVE"}, created_at=now, updated_at=now))
+    monkeypatch.setattr("src.api.endpoints.jobs.AsyncSessionLocal", session_factory(finished_session))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        finished = await client.get(f"/v1/jobs/{uuid.uuid4()}/events")
+        monkeypatch.setattr("src.api.endpoints.jobs.AsyncSessionLocal", session_factory(fake_db(None)[0]))
+        missing = await client.get(f"/v1/jobs/{uuid.uuid4()}/events")
+
+    assert [event["status"] for event in parse_events(finished.text)] == ["COMPLETED"]
+    assert missing.status_code == 404
+    assert not job_status_hub._subscribers
+
+@pytest.mark.asyncio
+async def test_polling_is_served_from_status_cache(monkeypatch):
+    job_id = uuid.uuid4()
+    cached = status_event(str(job_id), "COMPLETED", {"diagnosis": "POSITIVE"}, created_at=datetime.datetime.now(datetime.timezone.utc))
+
+    async def cache_hit(requested_id):
+        return cached
+    monkeypatch.setattr("src.api.endpoints.jobs.get_cached_job_status", cache_hit)
+    session, override = fake_db(None)
+    app.dependency_overrides[get_db] = override
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(f"/v1/jobs/{job_id}")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "COMPLETED"
+    assert response.json()["result"] == {"diagnosis": "POSITIVE"}
+    session.execute.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_polling_fallback_never_loads_the_bundle():
+    job_id = uuid.uuid4()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    session, override = fake_db(SimpleNamespace(id=job_id, status="QUEUED", result_payload=None, created_at=now, updated_at=now))
+    app.dependency_overrides[get_db] = override
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(f"/v1/jobs/{job_id}")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    statement = str(session.execute.await_args.args[0])
+    assert "fhir_bundle_input" not in statement # No decryption on the polling path
+
+def test_only_terminal_statuses_are_cached_for_long(monkeypatch):
+    monkeypatch.setattr("src.services.job_status.settings.JOB_STATUS_CACHE_TTL_SECONDS", 3600)
+    monkeypatch.setattr("src.services.job_status.settings.JOB_STATUS_CACHE_ACTIVE_TTL_SECONDS", 30)
+    pipe = MagicMock()
+
+    queue_status_writes(pipe, [status_event("job-1", "PROCESSING"), status_event("job-2", "COMPLETED")])
+
+    assert [c.args for c in pipe.expire.call_args_list] == [
+        (status_cache_key("job-1"), 30),
+        (status_cache_key("job-2"), 3600),
+    ]
+
+@pytest.mark.asyncio
+async def test_failed_publish_drops_the_cached_status(monkeypatch):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=ConnectionError("reset"))
+    redis = MagicMock()
+    redis.pipeline.return_value.__aenter__.return_value = pipe
+    redis.delete = AsyncMock()
+    monkeypatch.setattr("src.services.job_status.redis_client", redis)
+
+    await publish_job_status("job-1", "COMPLETED", {"diagnosis": "POSITIVE"})
+
+    # The next poll goes to Postgres instead of reading the stale status
+    redis.delete.assert_awaited_once_with(status_cache_key("job-1"))
@@ -0,0 +1,111 @@
+import uuid
+import pytest
+from unittest.mock import AsyncMock
+
+import src.services.outbox as outbox
+from src.db.models import WebhookDelivery
+from src.services.outbox import CircuitBreaker, WebhookDispatcher
+
+def make_delivery(url: str = "http://hospital.test/hook") -> WebhookDelivery:
+    return WebhookDelivery(
+        job_id=uuid.uuid4(),
+        url=url,
+        payload={"job_id": "x", "status": "COMPLETED", "result": {}},
+        status="PENDING",
+        attempts=0
+    )
+
+def test_breaker_opens_after_threshold_and_probes_once(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(outbox.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()      # Half-open probe
+    assert not breaker.allow()  # ...only one
+    breaker.record_failure()    # Probe failed -> open again
+    assert not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and not breaker.is_open
+
+@pytest.mark.asyncio
+async def test_failed_delivery_is_rescheduled_then_dead(monkeypatch):
+    monkeypatch.setattr(outbox.settings, "WEBHOOK_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox.settings, "WEBHOOK_BREAKER_FAILURE_THRESHOLD", 100)
+    monkeypatch.setattr(outbox.WebhookService, "deliver", AsyncMock(side_effect=ConnectionError("down")))
+    dispatcher = WebhookDispatcher()
+    delivery = make_delivery()
+
+    await dispatcher.attempt(delivery)
+    assert delivery.status == "PENDING"
+    assert delivery.attempts == 1
+    assert delivery.next_attempt_at is not None
+    assert delivery.last_error == "down"
+
+    await dispatcher.attempt(delivery)
+    assert delivery.status == "DEAD"
+    assert delivery.attempts == 2
+
+@pytest.mark.asyncio
+async def test_open_circuit_defers_without_calling_endpoint(monkeypatch):
+    monkeypatch.setattr(outbox.settings, "WEBHOOK_BREAKER_FAILURE_THRESHOLD", 1)
+    deliver = AsyncMock(side_effect=ConnectionError("down"))
+    monkeypatch.setattr(outbox.WebhookService, "deliver", deliver)
+    dispatcher = WebhookDispatcher()
+
+    await dispatcher.attempt(make_delivery())
+    deferred = make_delivery()
+    await dispatcher.attempt(deferred)
+
+    assert deliver.await_count == 1
+    assert deferred.attempts == 0 # Deferral doesn't burn an attempt
+    assert deferred.status == "PENDING"
+
+    # Other hosts are unaffected
+    deliver.side_effect = None
+    other = make_delivery("http://other.test/hook")
+    await dispatcher.attempt(other)
+    assert other.status == "DELIVERED"
+
+@pytest.mark.asyncio
+async def test_dispatch_holds_no_transaction_while_delivering(monkeypatch):
+    from unittest.mock import MagicMock
+
+    delivery = make_delivery()
+    open_sessions = []
+    sessions = []
+
+    class SessionManager:
+        async def __aenter__(self):
+            session = MagicMock()
+            result = MagicMock()
+            result.scalars.return_value.all.return_value = [delivery]
+            session.execute = AsyncMock(return_value=result)
+            session.commit = AsyncMock()
+            open_sessions.append(session)
+            sessions.append(session)
+            return session
+        async def __aexit__(self, *exc):
+            open_sessions.pop()
+
+    async def deliver(url, payload):
+        assert open_sessions == [] # Claim committed, connection back in the pool
+        assert delivery.next_attempt_at is not None # Leased
+    monkeypatch.setattr(outbox, "AsyncSessionLocal", SessionManager)
+    monkeypatch.setattr(outbox.WebhookService, "deliver", deliver)
+
+    assert await WebhookDispatcher().dispatch_once() == 1
+
+    claim, record = sessions
+    claim.commit.assert_awaited_once()
+    record.add.assert_called_once_with(delivery)
+    record.commit.assert_awaited_once()
+    assert delivery.status == "DELIVERED"
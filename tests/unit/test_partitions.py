@@ -0,0 +1,50 @@
+import datetime
+from src.db.partitions import Partition, add_months, parse_bound, partition_name, plan
+
+UTC = datetime.timezone.utc
+
+def month(year, m):
+    return datetime.datetime(year, m, 1, tzinfo=UTC)
+
+def test_add_months_crosses_years():
+    assert add_months(month(2026, 11), 3) == month(2027, 2)
+    assert add_months(month(2026, 1), -1) == month(2025, 12)
+    assert partition_name("jobs", month(2027, 2)) == "jobs_y2027m02"
+
+def test_parse_bound_reads_postgres_partition_bounds():
+    partition = parse_bound("jobs_y2026m10", "FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')")
+    assert partition == Partition("jobs_y2026m10", month(2026, 10), month(2026, 11))
+
+    legacy = parse_bound("jobs_legacy", "FOR VALUES FROM (MINVALUE) TO ('2026-11-01 00:00:00+00')")
+    assert legacy.lower is None and legacy.upper == month(2026, 11)
+
+    assert parse_bound("jobs_default", "DEFAULT") is None
+
+def test_plan_creates_missing_months_and_skips_covered_ones():
+    existing = [
+        Partition("jobs_legacy", None, month(2026, 11)),
+        Partition("jobs_y2026m11", month(2026, 11), month(2026, 12)),
+    ]
+    now = datetime.datetime(2026, 10, 17, 12, tzinfo=UTC)
+
+    to_create, expired = plan("jobs", existing, now, months_ahead=3, retention_months=12)
+
+    # October is inside the legacy partition, November already exists
+    assert [name for name, _, _ in to_create] == ["jobs_y2026m12", "jobs_y2027m01"]
+    assert to_create[0][1:] == (month(2026, 12), month(2027, 1))
+    assert expired == []
+
+def test_plan_expires_only_whole_partitions_past_retention():
+    existing = [
+        Partition("jobs_y2025m09", month(2025, 9), month(2025, 10)),
+        Partition("jobs_y2025m10", month(2025, 10), month(2025, 11)),
+        Partition("jobs_y2025m11", month(2025, 11), month(2025, 12)),
+    ]
+    now = datetime.datetime(2026, 10, 17, tzinfo=UTC)
+
+    _, expired = plan("jobs", existing, now, months_ahead=0, retention_months=12)
+    # 2025-10 still holds rows younger than 12 months
+    assert [p.name for p in expired] == ["jobs_y2025m09"]
+
+    _, kept = plan("jobs", existing, now, months_ahead=0, retention_months=0)
+    assert kept == []
@@ -0,0 +1,58 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.services.registry import ModelRegistryCache, ManifestError
+
+def mock_db_returning(model_record):
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = model_record
+    db = AsyncMock()
+    db.execute.return_value = result
+    return db
+
+@pytest.fixture
+def sepsis_record():
+    record = MagicMock()
+    record.key = "sepsis"
+    record.version = "1.0.0"
+    record.accuracy = 0.98
+    record.required_fhir_resources = {
+        "required_observations": [{"code": "8310-5", "display": "Body Temp", "mandatory": True}]
+    }
+    return record
+
+@pytest.mark.asyncio
+async def test_manifest_is_served_from_cache(sepsis_record):
+    cache = ModelRegistryCache(ttl_seconds=60)
+    db = mock_db_returning(sepsis_record)
+
+    first = await cache.get_manifest(db, "sepsis")
+    second = await cache.get_manifest(db, "sepsis")
+
+    assert first is second
+    assert first.required_observations[0].code == "8310-5"
+    assert db.execute.await_count == 1
+
+@pytest.mark.asyncio
+async def test_invalidation_and_ttl_force_reload(sepsis_record):
+    cache = ModelRegistryCache(ttl_seconds=60)
+    db = mock_db_returning(sepsis_record)
+
+    await cache.get_manifest(db, "sepsis")
+    cache.invalidate("sepsis")
+    await cache.get_manifest(db, "sepsis")
+    assert db.execute.await_count == 2
+
+    expired = ModelRegistryCache(ttl_seconds=0)
+    await expired.get_manifest(db, "sepsis")
+    await expired.get_manifest(db, "sepsis")
+    assert db.execute.await_count == 4
+
+@pytest.mark.asyncio
+async def test_unknown_and_corrupt_models():
+    cache = ModelRegistryCache(ttl_seconds=60)
+    assert await cache.get_manifest(mock_db_returning(None), "cancer_v1") is None
+
+    corrupt = MagicMock()
+    corrupt.required_fhir_resources = {"required_observations": [{"code": "8310-5"}]}
+    with pytest.raises(ManifestError):
+        await cache.get_manifest(mock_db_returning(corrupt), "broken")
@@ -0,0 +1,105 @@
+import copy
+import pytest
+from unittest.mock import AsyncMock
+
+import src.worker.main as worker
+from src.schemas.manifest import LOINCRequirement, ModelManifest
+from src.services.result_cache import cache_key
+
+MANIFEST = ModelManifest(
+    target_diagnosis="sepsis",
+    minimum_accuracy=0.9,
+    model_version="1.0.0",
+    required_observations=[LOINCRequirement(code="8310-5", display="Body Temp")]
+)
+
+def observation(obs_id: str, code: str, value: float) -> dict:
+    return {"resource": {
+        "resourceType": "Observation",
+        "id": obs_id,
+        "status": "final",
+        "code": {"coding": [{"system": "http://loinc.org", "code": code}]},
+        "valueQuantity": {"value": value, "unit": "Cel"}
+    }}
+
+BUNDLE = {
+    "resourceType": "Bundle",
+    "type": "collection",
+    "entry": [
+        {"resource": {"resourceType": "Patient", "id": "pat-1", "gender": "female", "birthDate": "1970-01-01"}},
+        observation("obs-1", "8310-5", 39.2),
+        observation("obs-2", "8867-4", 120),
+    ]
+}
+
+def test_cache_key_ignores_what_the_model_does_not_read():
+    resubmitted = copy.deepcopy(BUNDLE)
+    resubmitted["id"] = "another-submission"
+    resubmitted["entry"].reverse()
+    resubmitted["entry"][1]["resource"]["id"] = "obs-renamed"
+    # 8867-4 is not in the manifest
+    resubmitted["entry"][0]["resource"]["valueQuantity"]["value"] = 80
+
+    assert cache_key(MANIFEST, resubmitted) == cache_key(MANIFEST, BUNDLE)
+
+def test_cache_key_changes_with_values_and_model_version():
+    changed = copy.deepcopy(BUNDLE)
+    changed["entry"][1]["resource"]["valueQuantity"]["value"] = 37.0
+    assert cache_key(MANIFEST, changed) != cache_key(MANIFEST, BUNDLE)
+
+    upgraded = MANIFEST.model_copy(update={"model_version": "1.1.0"})
+    assert cache_key(upgraded, BUNDLE) != cache_key(MANIFEST, BUNDLE)
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    fakes = {
+        "get_cached_result": AsyncMock(return_value=None),
+        "claim_execution": AsyncMock(return_value=True),
+        "wait_for_result": AsyncMock(return_value=None),
+        "store_result": AsyncMock(),
+        "release_execution": AsyncMock(),
+    }
+    for name, fake in fakes.items():
+        monkeypatch.setattr(worker, name, fake)
+    vm = AsyncMock()
+    vm.run_inference.return_value = {"diagnosis": "POSITIVE"}
+    fakes["vm"] = vm
+    return fakes
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_the_vm(result_cache):
+    result_cache["get_cached_result"].return_value = {"diagnosis": "NEGATIVE"}
+
+    status, result = await worker.run_model(result_cache["vm"], "job-1", "sepsis", BUNDLE, "digest")
+
+    assert (status, result) == ("COMPLETED", {"diagnosis": "NEGATIVE"})
+    result_cache["vm"].prepare_resources.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_job_is_coalesced(result_cache):
+    result_cache["claim_execution"].return_value = False # Someone else is computing it
+    result_cache["wait_for_result"].return_value = {"diagnosis": "POSITIVE"}
+
+    status, _ = await worker.run_model(result_cache["vm"], "job-2", "sepsis", BUNDLE, "digest")
+
+    assert status == "COMPLETED"
+    result_cache["vm"].prepare_resources.assert_not_awaited()
+    result_cache["release_execution"].assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_owner_runs_stores_then_releases(result_cache):
+    status, result = await worker.run_model(result_cache["vm"], "job-3", "sepsis", BUNDLE, "digest")
+
+    assert (status, result) == ("COMPLETED", {"diagnosis": "POSITIVE"})
+    result_cache["store_result"].assert_awaited_once_with("digest", {"diagnosis": "POSITIVE"})
+    result_cache["release_execution"].assert_awaited_once_with("digest", "job-3")
+
+@pytest.mark.asyncio
+async def test_failed_runs_are_not_cached(result_cache):
+    result_cache["vm"].run_inference.side_effect = RuntimeError("guest crashed")
+
+    status, _ = await worker.run_model(result_cache["vm"], "job-4", "sepsis", BUNDLE, "digest")
+
+    assert status == "FAILED"
+    result_cache["store_result"].assert_not_awaited()
+    result_cache["release_execution"].assert_awaited_once()
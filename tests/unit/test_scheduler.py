@@ -0,0 +1,77 @@
+from collections import Counter
+from src.services.queue import parse_queue_key, queue_key, route_job
+from src.services.scheduler import FairScheduler, ModelAffinity
+from src.services.virtualization.mock import MockVMBackend
+
+def first_picks(scheduler, queues, rounds):
+    return Counter(scheduler.order(queues)[0] for _ in range(rounds))
+
+def test_lanes_share_capacity_by_weight():
+    scheduler = FairScheduler(lane_weights={"stat": 8, "routine": 3, "batch": 1}, client_weights={})
+    queues = [queue_key("stat", "ed"), queue_key("routine", "ward"), queue_key("batch", "research")]
+
+    picks = first_picks(scheduler, queues, 120)
+
+    assert picks[queue_key("stat", "ed")] == 80
+    assert picks[queue_key("routine", "ward")] == 30
+    assert picks[queue_key("batch", "research")] == 10
+
+def test_batch_backlog_never_blocks_stat_for_long():
+    scheduler = FairScheduler(lane_weights={"stat": 8, "batch": 1}, client_weights={})
+    queues = [queue_key("stat", "ed"), queue_key("batch", "research")]
+
+    order = [scheduler.order(queues)[0] for _ in range(50)]
+
+    # Smooth WRR never gives the batch lane two picks in a row
+    batch = queue_key("batch", "research")
+    assert not any(a == b == batch for a, b in zip(order, order[1:]))
+
+def test_clients_share_a_lane_fairly_and_fallbacks_follow():
+    scheduler = FairScheduler(lane_weights={"routine": 1}, client_weights={"vip": 2})
+    queues = [queue_key("routine", "vip"), queue_key("routine", "small"), queue_key("routine", "other")]
+
+    picks = first_picks(scheduler, queues, 40)
+    assert picks[queue_key("routine", "vip")] == 20
+    assert picks[queue_key("routine", "small")] == 10
+    assert picks[queue_key("routine", "other")] == 10
+
+    # Every queue is still listed, so an emptied first choice falls through to the next
+    assert sorted(scheduler.order(queues)) == sorted(queues)
+
+def test_client_ids_may_contain_colons():
+    scheduler = FairScheduler(lane_weights={"routine": 1}, client_weights={})
+    queue = queue_key("routine", "hospital:bot-7")
+    assert scheduler.order([queue]) == [queue]
+
+def test_jobs_are_routed_per_model():
+    queue = route_job({"client_id": "ed", "priority": "stat", "target_model_key": "sepsis"})
+    assert queue == queue_key("stat", "ed", "sepsis")
+    assert parse_queue_key(queue) == ("stat", "sepsis", "ed")
+
+def test_warm_models_first_then_cold_then_stolen():
+    scheduler = FairScheduler(lane_weights={"routine": 1}, client_weights={})
+    warm = queue_key("routine", "a", "sepsis")
+    cold = queue_key("routine", "b", "stroke")
+    elsewhere = queue_key("routine", "c", "pneumonia")
+
+    order = scheduler.order([elsewhere, cold, warm], warm={"sepsis"}, warm_elsewhere={"pneumonia"})
+
+    assert order == [warm, cold, elsewhere]
+
+def test_priority_lanes_still_beat_affinity():
+    scheduler = FairScheduler(lane_weights={"stat": 8, "batch": 1}, client_weights={})
+    stat_cold = queue_key("stat", "ed", "stroke")
+    batch_warm = queue_key("batch", "research", "sepsis")
+
+    # A warm batch job doesn't jump ahead of a cold stat job
+    assert scheduler.order([batch_warm, stat_cold], warm={"sepsis"}) == [stat_cold, batch_warm]
+
+def test_recently_run_models_count_as_warm(monkeypatch):
+    from src.core.config import settings
+    monkeypatch.setattr(settings, "WORKER_AFFINITY_RECENT_MODELS", 2)
+    affinity = ModelAffinity("worker-1", MockVMBackend())
+
+    for model_key in ("sepsis", "stroke", "pneumonia"):
+        affinity.record_run(model_key)
+
+    assert affinity.warm() == {"stroke", "pneumonia"}
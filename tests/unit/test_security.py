@@ -0,0 +1,74 @@
+import base64
+import os
+import pytest
+from cryptography.exceptions import InvalidTag
+
+import src.core.security as security
+from src.core.security import DataEncryption, KeyRing
+from src.db.types import MAGIC, current_prefix, decode_bundle, encode_bundle
+
+KEY_A = base64.urlsafe_b64encode(os.urandom(32)).decode()
+KEY_B = base64.urlsafe_b64encode(os.urandom(32)).decode()
+
+@pytest.fixture
+def key_ring(monkeypatch):
+    """
+    Rebuilds the key ring from (patched) settings; call it again after changing them.
+    """
+    def load(keys: dict, active: str) -> KeyRing:
+        monkeypatch.setattr(security.settings, "ENCRYPTION_KEYS", keys)
+        monkeypatch.setattr(security.settings, "ENCRYPTION_ACTIVE_KEY_ID", active)
+        monkeypatch.setattr(DataEncryption, "_key_ring", None)
+        return DataEncryption.get_key_ring()
+    yield load
+    DataEncryption._key_ring = None
+
+def test_round_trip_and_overhead(key_ring):
+    key_ring({"a": KEY_A}, "a")
+    data = b"x" * 1000
+    envelope = DataEncryption.encrypt_bytes(data)
+    assert DataEncryption.decrypt_bytes(envelope) == data
+    # version + id length + "a" + nonce + tag
+    assert len(envelope) - len(data) == 2 + 1 + 12 + 16
+
+def test_rotation_keeps_old_rows_readable(key_ring):
+    key_ring({"a": KEY_A}, "a")
+    old = encode_bundle({"v": 1})
+
+    key_ring({"a": KEY_A, "b": KEY_B}, "b")
+    new = encode_bundle({"v": 2})
+
+    assert decode_bundle(old) == {"v": 1}
+    assert decode_bundle(new) == {"v": 2}
+    assert new.startswith(current_prefix())
+    assert not old.startswith(current_prefix()) # -> picked up by reencrypt-bundles
+
+def test_default_key_is_always_in_the_ring(key_ring):
+    key_ring({}, "")
+    written_with_default = DataEncryption.encrypt_bytes(b"phi")
+    key_ring({"a": KEY_A}, "a")
+    assert DataEncryption.decrypt_bytes(written_with_default) == b"phi"
+
+def test_removed_key_and_tampering_are_rejected(key_ring):
+    key_ring({"a": KEY_A}, "a")
+    envelope = bytearray(DataEncryption.encrypt_bytes(b"phi"))
+
+    envelope[-1] ^= 1
+    with pytest.raises(InvalidTag):
+        DataEncryption.decrypt_bytes(bytes(envelope))
+
+    envelope[-1] ^= 1
+    key_ring({"b": KEY_B}, "b")
+    with pytest.raises(ValueError, match="Unknown encryption key"):
+        DataEncryption.decrypt_bytes(bytes(envelope))
+
+def test_misconfigured_ring_fails_fast(key_ring):
+    with pytest.raises(ValueError):
+        key_ring({"a": KEY_A}, "missing")
+    with pytest.raises(ValueError):
+        key_ring({"short": base64.urlsafe_b64encode(b"0" * 16).decode()}, "short")
+
+def test_raw_fernet_tokens_still_decrypt():
+    # Binary bundle rows written before the key ring carried a raw Fernet token
+    token = base64.urlsafe_b64decode(DataEncryption.get_cipher().encrypt(b"{\"v\": 0}"))
+    assert decode_bundle(MAGIC + bytes([1, 0]) + token) == {"v": 0}
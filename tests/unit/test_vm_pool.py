@@ -0,0 +1,99 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.services.virtualization.pool import MicroVMPool
+
+def make_fake_vm(model_key):
+    vm = MagicMock()
+    vm.vm_id = f"vm-{model_key}"
+    vm.model_key = model_key
+    vm.process.poll.return_value = None # Still running
+    vm.destroy = AsyncMock()
+    return vm
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr("src.services.virtualization.pool.settings.FC_POOL_MODELS", ["sepsis"])
+    monkeypatch.setattr("src.services.virtualization.pool.settings.FC_POOL_WARMUP_ON_START", True)
+    monkeypatch.setattr("src.services.virtualization.pool.settings.FC_POOL_REFILL_INTERVAL_SECONDS", 3600)
+    vm_pool = MicroVMPool(size=2)
+    vm_pool._boot_vm = AsyncMock(side_effect=make_fake_vm)
+    return vm_pool
+
+@pytest.mark.asyncio
+async def test_warm_pool_serves_without_booting(pool):
+    await pool.start()
+    assert pool._boot_vm.call_count == 2
+
+    vm = await pool.acquire("sepsis")
+
+    assert vm.model_key == "sepsis"
+    assert pool._boot_vm.call_count == 2 # Warm hit, no extra boot
+    await pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_empty_pool_falls_back_to_cold_boot(pool):
+    await pool.start()
+
+    vm = await pool.acquire("pneumonia")
+
+    assert vm.model_key == "pneumonia"
+    pool._boot_vm.assert_called_with("pneumonia")
+    await pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_released_vm_is_destroyed_and_dead_vms_are_skipped(pool):
+    await pool.start()
+
+    # One of the parked VMs died in the meantime
+    dead_vm = pool._idle["sepsis"]._queue[0]
+    dead_vm.process.poll.return_value = 1
+
+    vm = await pool.acquire("sepsis")
+    assert vm is not dead_vm
+    dead_vm.destroy.assert_awaited()
+
+    await pool.release(vm)
+    vm.destroy.assert_awaited()
+    await pool.shutdown()
+
+@pytest.fixture
+def booting_vms(monkeypatch, tmp_path):
+    """
+    Real MicroVMPool._boot_vm against MicroVM doubles that record their lifecycle calls.
+    Set `guest["ready"] = False` for a guest whose agent never answers.
+    """
+    monkeypatch.setattr("src.services.virtualization.pool.settings.FC_USE_SNAPSHOTS", False)
+    monkeypatch.setattr("src.services.virtualization.pool.settings.FC_WORK_DIR", str(tmp_path))
+    guest = {"ready": True, "calls": [], "vms": []}
+
+    class FakeMicroVM:
+        def __init__(self, vm_id, model_key, work_dir):
+            self.vm_id = vm_id
+            self.model_key = model_key
+            for step in ("spawn", "boot", "pause", "destroy"):
+                setattr(self, step, AsyncMock(side_effect=lambda *args, step=step: guest["calls"].append(step)))
+            guest["vms"].append(self)
+
+        async def wait_until_ready(self, timeout):
+            guest["calls"].append("wait_until_ready")
+            if not guest["ready"]:
+                raise TimeoutError("Guest did not accept vsock port 5005")
+
+    monkeypatch.setattr("src.services.virtualization.pool.MicroVM", FakeMicroVM)
+    return guest
+
+@pytest.mark.asyncio
+async def test_cold_boot_pauses_only_a_ready_guest(booting_vms):
+    await MicroVMPool(size=1)._boot_vm("sepsis")
+
+    assert booting_vms["calls"] == ["spawn", "boot", "wait_until_ready", "pause"]
+
+@pytest.mark.asyncio
+async def test_guest_that_never_gets_ready_is_discarded(booting_vms):
+    booting_vms["ready"] = False
+
+    with pytest.raises(TimeoutError):
+        await MicroVMPool(size=1)._boot_vm("sepsis")
+
+    assert "pause" not in booting_vms["calls"]
+    booting_vms["vms"][0].destroy.assert_awaited_once()
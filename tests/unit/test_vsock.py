@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from src.services.virtualization import vsock
+from src.services.virtualization.firecracker import FirecrackerVMBackend
+
+async def fake_firecracker(path, handle_frame, refuse_first=0):
+    """
+    Stands in for Firecracker's host-side vsock UDS plus a guest agent on port 5005.
+    The first `refuse_first` connections are dropped, as while the agent is still starting.
+    """
+    attempts = {"count": 0}
+
+    async def on_connect(reader, writer):
+        attempts["count"] += 1
+        line = await reader.readline()
+        if attempts["count"] <= refuse_first or line != b"CONNECT 5005\n":
+            writer.close()
+            return
+        writer.write(b"OK 1073741824\n")
+        request = await vsock.read_frame(reader, 1024 * 1024)
+        reply = await handle_frame(request)
+        if reply is not None:
+            writer.write(reply if isinstance(reply, bytes) else vsock.encode_frame(reply))
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_unix_server(on_connect, path=path)
+    return server, attempts
+
+@pytest.mark.asyncio
+async def test_round_trip_retries_until_the_guest_listens(tmp_path):
+    path = str(tmp_path / "v.sock")
+
+    async def echo(request):
+        return {"result": {"seen": request["job_id"]}}
+
+    server, attempts = await fake_firecracker(path, echo, refuse_first=2)
+    async with server:
+        reply = await vsock.exchange(path, 5005, {"job_id": "job-1"}, timeout=2, max_frame_bytes=1024)
+
+    assert reply == {"result": {"seen": "job-1"}}
+    assert attempts["count"] == 3
+
+@pytest.mark.asyncio
+async def test_silent_guest_times_out(tmp_path):
+    path = str(tmp_path / "v.sock")
+
+    async def hang(request):
+        await asyncio.sleep(5)
+
+    server, _ = await fake_firecracker(path, hang)
+    async with server:
+        with pytest.raises(vsock.VsockError):
+            await vsock.exchange(path, 5005, {"job_id": "job-1"}, timeout=0.2, max_frame_bytes=1024)
+
+@pytest.mark.asyncio
+async def test_guest_that_stops_reading_times_out(tmp_path):
+    path = str(tmp_path / "v.sock")
+
+    async def accept_but_never_read(reader, writer):
+        await reader.readline()
+        writer.write(b"OK 1073741824\n")
+        await asyncio.sleep(5)
+
+    server = await asyncio.start_unix_server(accept_but_never_read, path=path)
+    async with server:
+        # Far more than the socket buffers hold, so drain() blocks
+        big_input = {"job_id": "job-1", "input": "x" * (32 * 1024 * 1024)}
+        with pytest.raises(vsock.VsockError):
+            await asyncio.wait_for(
+                vsock.exchange(path, 5005, big_input, timeout=0.3, max_frame_bytes=1024), timeout=3
+            )
+
+@pytest.mark.asyncio
+async def test_oversized_reply_is_rejected(tmp_path):
+    path = str(tmp_path / "v.sock")
+
+    async def huge(request):
+        return {"result": {"blob": "x" * 4096}}
+
+    server, _ = await fake_firecracker(path, huge)
+    async with server:
+        with pytest.raises(vsock.VsockError, match="exceeds"):
+            await vsock.exchange(path, 5005, {"job_id": "job-1"}, timeout=2, max_frame_bytes=1024)
+
+@pytest.mark.asyncio
+async def test_backend_streams_input_and_returns_guest_result():
+    backend = FirecrackerVMBackend()
+    vm = MagicMock()
+    vm.resume = AsyncMock()
+    vm.exchange = AsyncMock(return_value={"result": {"diagnosis": "POSITIVE"}})
+    backend.pool.acquire = AsyncMock(return_value=vm)
+    backend.pool.release = AsyncMock()
+
+    resource = await backend.prepare_resources("job-1", "sepsis", {"resourceType": "Bundle"})
+    result = await backend.run_inference("job-1", resource)
+    await backend.cleanup("job-1", resource)
+
+    assert result == {"diagnosis": "POSITIVE"}
+    sent = vm.exchange.await_args.args[0]
+    assert sent == {"job_id": "job-1", "model": "sepsis", "input": {"resourceType": "Bundle"}}
+    backend.pool.release.assert_awaited_once_with(vm)
+
+    vm.exchange.return_value = {"error": "model crashed"}
+    resource = await backend.prepare_resources("job-2", "sepsis", {})
+    with pytest.raises(RuntimeError, match="model crashed"):
+        await backend.run_inference("job-2", resource)
@@ -78,4 +78,26 @@ async def test_webhook_retry_logic():
         
         # Check call count. 
         # Tenacity default in our code is stop_after_attempt(3)
-        assert mock_post.call_count == 3
\ No newline at end of file
+        assert mock_post.call_count == 3
+
+@pytest.mark.asyncio
+async def test_webhook_reuses_one_pooled_client():
+    """
+    Deliveries share a single long-lived client instead of opening one per call.
+    """
+    await WebhookService.aclose()
+    mock_post = AsyncMock()
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.raise_for_status = lambda: None
+
+    with patch("httpx.AsyncClient.post", new=mock_post):
+        await WebhookService.send_webhook("http://webhook.test/a", JOB_ID, RESULT)
+        client = WebhookService.get_client()
+        await WebhookService.send_webhook("http://webhook.test/b", JOB_ID, RESULT)
+
+    assert WebhookService.get_client() is client
+    assert mock_post.call_count == 2
+    assert "trace" in mock_post.call_args.kwargs["extensions"]
+
+    await WebhookService.aclose()
+    assert WebhookService._client is None
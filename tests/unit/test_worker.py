@@ -0,0 +1,229 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+import src.worker.main as worker
+from src.services.queue import QueueMessage, build_message
+
+def make_message(job_id: str) -> QueueMessage:
+    return QueueMessage.parse(build_message(job_id))
+
+@pytest.fixture
+def fake_queue(monkeypatch):
+    """
+    Replaces the Redis-backed queue functions the worker loop uses.
+    """
+    pending = [make_message(f"job-{i}") for i in range(4)]
+
+    async def fake_claim_job(queues=None):
+        return pending.pop(0) if pending else None
+
+    async def fake_wait_for_jobs(timeout=1):
+        await asyncio.sleep(0.01)
+
+    async def fake_list_queues():
+        return []
+
+    ack = AsyncMock(return_value=True)
+    monkeypatch.setattr(worker, "list_queues", fake_list_queues)
+    monkeypatch.setattr(worker, "claim_job", fake_claim_job)
+    monkeypatch.setattr(worker, "wait_for_jobs", fake_wait_for_jobs)
+    monkeypatch.setattr(worker, "ack_job", ack)
+    monkeypatch.setattr(worker, "SHUTDOWN_FLAG", False)
+    return ack
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs_concurrently_and_drains(monkeypatch, fake_queue):
+    monkeypatch.setattr(worker.settings, "WORKER_CONCURRENCY", 2)
+
+    running = 0
+    peak = 0
+    finished = []
+    async def fake_process_job(job_id, attempt=1):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        finished.append(job_id)
+        # Stop the loop once the last job is in flight; drain must still finish it
+        if len(finished) == 3:
+            worker.SHUTDOWN_FLAG = True
+    monkeypatch.setattr(worker, "process_job", fake_process_job)
+    listen = AsyncMock()
+    monkeypatch.setattr(worker.model_registry, "listen_for_invalidations", listen)
+
+    await asyncio.wait_for(worker.worker_loop(), timeout=5)
+
+    listen.assert_awaited_once() # Manifest cache follows model upgrades
+    assert peak == 2
+    assert sorted(finished) == [f"job-{i}" for i in range(4)]
+    assert fake_queue.await_count == 4
+
+@pytest.mark.asyncio
+async def test_failed_job_is_not_acked(monkeypatch, fake_queue):
+    async def crashing_process_job(job_id, attempt=1):
+        raise ConnectionError("db went away")
+    monkeypatch.setattr(worker, "process_job", crashing_process_job)
+
+    free_slots = asyncio.Queue()
+    leases = {}
+    await worker.run_in_slot(0, make_message("job-x"), free_slots, leases)
+
+    fake_queue.assert_not_awaited() # Lease will expire -> redelivery
+    assert leases == {}
+    assert free_slots.get_nowait() == 0
+
+@pytest.fixture
+def fake_job_db(monkeypatch):
+    """
+    Session double for process_job: the claim UPDATE returns `claimed` (None = nothing to claim).
+    """
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+
+    session = MagicMock()
+    session.claimed = SimpleNamespace(
+        target_model_key="sepsis",
+        fhir_bundle_input={"resourceType": "Bundle", "type": "collection", "entry": []},
+        webhook_url="http://hospital.test/hook",
+        created_at=None
+    )
+    claim_result = MagicMock()
+    claim_result.first.side_effect = lambda: session.claimed
+    session.execute = AsyncMock(return_value=claim_result)
+    session.commit = AsyncMock()
+
+    class SessionManager:
+        async def __aenter__(self):
+            return session
+        async def __aexit__(self, *exc):
+            pass
+
+    vm = AsyncMock()
+    vm.run_inference.return_value = {"diagnosis": "NEGATIVE"}
+    monkeypatch.setattr(worker, "AsyncSessionLocal", SessionManager)
+    monkeypatch.setattr(worker, "get_vm_backend", lambda: vm)
+    monkeypatch.setattr(worker, "publish_job_status", AsyncMock())
+    monkeypatch.setattr(worker.settings, "FHIR_STRICT_VALIDATION", True)
+    monkeypatch.setattr(worker.settings, "RESULT_CACHE_ENABLED", False)
+    session.vm = vm
+    return session
+
+def statement_params(call) -> dict:
+    return call.args[0].compile().params
+
+@pytest.mark.asyncio
+async def test_process_job_claims_and_finishes_with_two_updates(fake_job_db):
+    await worker.process_job("6f1c7a4e-0000-4000-8000-000000000001")
+
+    claim, finish = fake_job_db.execute.await_args_list
+    assert "RETURNING" in str(claim.args[0])
+    assert set(statement_params(claim).values()) >= {"PROCESSING", "QUEUED"}
+    assert statement_params(finish)["status"] == "COMPLETED"
+    assert fake_job_db.commit.await_count == 2
+    # Outbox row rides in the finishing commit
+    delivery = fake_job_db.add.call_args.args[0]
+    assert delivery.url == "http://hospital.test/hook"
+    assert delivery.payload["result"] == {"diagnosis": "NEGATIVE"}
+
+@pytest.mark.asyncio
+async def test_process_job_skips_unclaimable_job(fake_job_db):
+    fake_job_db.claimed = None # Already finished (or unknown)
+    await worker.process_job("6f1c7a4e-0000-4000-8000-000000000002")
+
+    assert fake_job_db.execute.await_count == 1
+    fake_job_db.vm.prepare_resources.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_redelivery_may_reclaim_a_processing_job(fake_job_db):
+    fake_job_db.claimed = None
+    await worker.process_job("6f1c7a4e-0000-4000-8000-000000000003", attempt=1)
+    await worker.process_job("6f1c7a4e-0000-4000-8000-000000000003", attempt=2)
+
+    first, second = fake_job_db.execute.await_args_list
+    assert list(statement_params(first).values()).count("PROCESSING") == 1 # Only the SET
+    assert list(statement_params(second).values()).count("PROCESSING") == 2 # SET + WHERE
+
+@pytest.mark.asyncio
+async def test_batch_model_claims_more_from_the_same_queue(monkeypatch):
+    from src.services.queue import queue_key
+    queue = queue_key("routine", "screening-clinic", "retinopathy")
+    first, *more = [QueueMessage.parse(build_message(f"job-{i}", queue)) for i in range(3)]
+
+    claimed_from = []
+    async def fake_claim_job(queues=None, include_legacy=True):
+        claimed_from.append((queues, include_legacy))
+        return more.pop(0) if more else None
+
+    batches = []
+    async def fake_process_batch(messages):
+        batches.append([message.job_id for message in messages])
+
+    ack = AsyncMock(return_value=True)
+    monkeypatch.setattr(worker.settings, "WORKER_BATCH_MODELS", ["retinopathy"])
+    monkeypatch.setattr(worker.settings, "WORKER_BATCH_MAX_WAIT_MS", 20)
+    monkeypatch.setattr(worker, "claim_job", fake_claim_job)
+    monkeypatch.setattr(worker, "process_batch", fake_process_batch)
+    monkeypatch.setattr(worker, "ack_job", ack)
+
+    free_slots, leases = asyncio.Queue(), {}
+    await worker.run_in_slot(0, first, free_slots, leases)
+
+    assert batches == [["job-0", "job-1", "job-2"]]
+    # Only the first job's queue is topped up from, never the legacy list
+    assert all(claim == ([queue], False) for claim in claimed_from)
+    assert ack.await_count == 3
+    assert leases == {}
+
+@pytest.mark.asyncio
+async def test_process_batch_runs_one_vm_call_and_fails_jobs_individually(fake_job_db):
+    import uuid
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+
+    ids = [uuid.UUID(f"6f1c7a4e-0000-4000-8000-00000000001{i}") for i in range(3)]
+    rows = [
+        SimpleNamespace(id=job_id, target_model_key="retinopathy", fhir_bundle_input={"n": i},
+                        webhook_url=None, created_at=None)
+        for i, job_id in enumerate(ids)
+    ]
+    claim_result = MagicMock()
+    claim_result.all.return_value = rows
+    fake_job_db.execute = AsyncMock(return_value=claim_result)
+    fake_job_db.vm.run_batch_inference.return_value = {
+        str(ids[0]): {"diagnosis": "NEGATIVE"},
+        str(ids[1]): {"diagnosis": "POSITIVE"},
+        str(ids[2]): RuntimeError("No result for job in batch output"),
+    }
+
+    await worker.process_batch([make_message(str(job_id)) for job_id in ids])
+
+    fake_job_db.vm.run_batch_inference.assert_awaited_once()
+    model_key, inputs = fake_job_db.vm.run_batch_inference.await_args.args
+    assert model_key == "retinopathy" and len(inputs) == 3
+
+    claim, finish = fake_job_db.execute.await_args_list
+    params = finish.args[1]
+    assert [p["b_status"] for p in params] == ["COMPLETED", "COMPLETED", "FAILED"]
+    assert params[2]["b_result"] == {"error": "No result for job in batch output"}
+    assert fake_job_db.commit.await_count == 2
+
+@pytest.mark.asyncio
+async def test_dead_lettered_jobs_fail_with_their_webhook(fake_job_db):
+    import uuid
+    from unittest.mock import MagicMock
+
+    job_id = uuid.UUID("6f1c7a4e-0000-4000-8000-000000000021")
+    failed_result = MagicMock()
+    failed_result.all.return_value = [(job_id, None, "http://hospital.test/hook")]
+    fake_job_db.execute = AsyncMock(return_value=failed_result)
+
+    await worker.fail_dead_lettered_jobs([make_message(str(job_id))])
+
+    # Delivery row rides in the same commit as the FAILED status
+    delivery = fake_job_db.add.call_args.args[0]
+    assert delivery.url == "http://hospital.test/hook"
+    assert delivery.payload["status"] == "FAILED"
+    fake_job_db.commit.assert_awaited_once()
+    worker.publish_job_status.assert_awaited_once()